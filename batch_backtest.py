@@ -0,0 +1,264 @@
+"""
+批量回测模块
+将多只股票的回测分发到进程池并行执行，可脱离Streamlit独立使用
+"""
+
+import datetime
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+
+@dataclass
+class SymbolResult:
+    """单只股票的回测结果"""
+    code: str  # 股票代码
+    summary: Optional[Dict] = None  # 汇总指标（失败时为None）
+    trades: List[Dict] = field(default_factory=list)  # 交易记录（已附加股票代码）
+    error: Optional[str] = None  # 失败原因
+
+
+@dataclass
+class BatchResult:
+    """批量回测结果"""
+    results: List[Dict]  # 成功股票的汇总指标（按输入顺序）
+    trades: List[Dict]  # 所有交易记录
+    failed_codes: List[Tuple[str, str]]  # 失败的股票及原因
+
+
+def load_market_data(code: str, start_date: datetime.date, end_date: datetime.date,
+                     market: str, source_type: str, interval: str = '1d',
+                     token: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    获取单只股票数据（带缓存），参数与 run_main.py 的取数逻辑一致
+    """
+    from cached_data_source import get_cached_stock_data
+
+    if source_type == "yfinance":
+        return get_cached_stock_data(code, start_date, end_date, market=market, source_type=source_type,
+                                     interval=interval, cache_enabled=True)
+    elif source_type == "tushare":
+        return get_cached_stock_data(code, start_date, end_date, market=market, source_type=source_type,
+                                     token=token, cache_enabled=True)
+    else:
+        return get_cached_stock_data(code, start_date, end_date, market=market, source_type=source_type,
+                                     cache_enabled=True)
+
+
+def backtest_symbol(code: str, config: Dict) -> SymbolResult:
+    """
+    回测单只股票（进程池工作函数，必须位于模块顶层以便序列化）
+
+    Args:
+        code: 股票代码
+        config: 回测配置，见 BatchBacktestRunner._build_config
+
+    Returns:
+        SymbolResult
+    """
+    from strategy_backtest import StrategyFactory, BacktestEngine
+    from parameter_sweep import calculate_max_drawdown, calculate_sharpe_ratio
+
+    try:
+        data_loader = config['data_loader'] or load_market_data
+        df = data_loader(code, config['start_date'], config['end_date'], config['market'],
+                         config['source_type'], config['interval'], config['token'])
+
+        if df is None or df.empty:
+            return SymbolResult(code=code, error="无法获取数据")
+
+        strategy = StrategyFactory.create_strategy(config['strategy_name'], config['params'])
+        engine = BacktestEngine(**config['engine_kwargs'])
+        # 只需要汇总指标和交易记录，不保留指标数据
+        result = engine.run(df, strategy, summary_only=True)
+
+        summary = {
+            'code': code,
+            'total_return': result.total_return,
+            'benchmark_return': result.benchmark_return,
+            'win_rate': result.win_rate,
+            'total_trades': result.total_trades,
+            'final_equity': result.final_equity,
+            'max_drawdown': calculate_max_drawdown(result.equity),
+            'sharpe_ratio': calculate_sharpe_ratio(result.equity, result.dates)
+        }
+
+        trades = []
+        for trade in result.trade_log:
+            trade_record = trade.copy()
+            trade_record['股票代码'] = code
+            trades.append(trade_record)
+
+        return SymbolResult(code=code, summary=summary, trades=trades)
+
+    except Exception as e:
+        return SymbolResult(code=code, error=str(e))
+
+
+class BatchBacktestRunner:
+    """
+    批量回测执行器
+
+    Example:
+        runner = BatchBacktestRunner("MACD趋势策略", {'fast': 12, 'slow': 26, 'signal': 9},
+                                     start_date, end_date, market='A股', source_type='tushare',
+                                     token=token, max_workers=8)
+        for done, total, item in runner.iter_results(codes):
+            print(f"{done}/{total} {item.code}")
+    """
+
+    def __init__(self,
+                 strategy_name: str,
+                 params: Dict,
+                 start_date: datetime.date,
+                 end_date: datetime.date,
+                 market: str = 'A股',
+                 source_type: str = 'akshare',
+                 interval: str = '1d',
+                 token: Optional[str] = None,
+                 engine_kwargs: Optional[Dict] = None,
+                 max_workers: Optional[int] = None,
+                 data_loader: Optional[Callable] = None):
+        """
+        初始化批量回测执行器
+
+        Args:
+            strategy_name: 策略名称
+            params: 策略参数
+            start_date: 开始日期
+            end_date: 结束日期
+            market: 市场类型
+            source_type: 数据源类型
+            interval: 时间粒度
+            token: Tushare API Token
+            engine_kwargs: BacktestEngine 参数（initial_cash、手续费等）
+            max_workers: 进程数，None=CPU核数，1=在当前进程串行执行
+            data_loader: 自定义取数函数，签名同 load_market_data（需可被pickle）
+        """
+        self.strategy_name = strategy_name
+        self.params = params
+        self.start_date = start_date
+        self.end_date = end_date
+        self.market = market
+        self.source_type = source_type
+        self.interval = interval
+        self.token = token
+        self.engine_kwargs = engine_kwargs or {}
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.data_loader = data_loader
+
+    def _build_config(self) -> Dict:
+        """构建传给工作进程的配置"""
+        return {
+            'strategy_name': self.strategy_name,
+            'params': self.params,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'market': self.market,
+            'source_type': self.source_type,
+            'interval': self.interval,
+            'token': self.token,
+            'engine_kwargs': self.engine_kwargs,
+            'data_loader': self.data_loader
+        }
+
+    def warm_cache(self, codes: List[str],
+                   progress_callback: Optional[Callable[[int, int, str], None]] = None) -> Optional[Dict]:
+        """
+        回测前预热缓存：一次规划所有缺失的数据并在当前进程中并发获取，之后各工作进程取数全部命中缓存
+
+        Args:
+            codes: 股票代码列表
+            progress_callback: 每完成一个请求调用一次，参数为 (已完成数量, 总数量, 代码)
+
+        Returns:
+            CacheManager.warm 的结果；使用自定义 data_loader 时返回None；
+            缓存目录读写失败、网络错误或数据源依赖未安装时返回 {'error': 原因}（其他异常直接抛出）
+        """
+        if self.data_loader is not None:
+            return None
+
+        from cache_manager import CacheManager
+
+        # 与 load_market_data 一致：只有 yfinance 按时间粒度取数
+        interval = self.interval if self.source_type == 'yfinance' else '1d'
+        try:
+            return CacheManager().warm(codes, self.start_date, self.end_date, interval=interval,
+                                       source=self.source_type, market=self.market,
+                                       progress_callback=progress_callback, token=self.token)
+        except (OSError, ImportError) as e:
+            # 预热失败不影响回测，各工作进程仍会按代码取数
+            logging.getLogger("CacheManager").warning(f"缓存预热失败: {e}", exc_info=True)
+            return {'error': f"{type(e).__name__}: {e}"}
+
+    def iter_results(self, codes: List[str]) -> Iterator[Tuple[int, int, SymbolResult]]:
+        """
+        逐个产出回测结果（按完成顺序），用于驱动进度条
+
+        Yields:
+            (已完成数量, 总数量, SymbolResult)
+        """
+        for done, total, _, item in self._iter_positions(codes):
+            yield done, total, item
+
+    def _iter_positions(self, codes: List[str]) -> Iterator[Tuple[int, int, int, SymbolResult]]:
+        """同 iter_results，额外产出结果在输入列表中的位置（重复的代码各自对应一个位置）"""
+        config = self._build_config()
+        total = len(codes)
+
+        if self.max_workers <= 1 or total <= 1:
+            for idx, code in enumerate(codes):
+                yield idx + 1, total, idx, backtest_symbol(code, config)
+            return
+
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, total)) as executor:
+            futures = {executor.submit(backtest_symbol, code, config): idx for idx, code in enumerate(codes)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                idx = futures[future]
+                try:
+                    item = future.result()
+                except Exception as e:
+                    # 工作进程异常退出等情况
+                    item = SymbolResult(code=codes[idx], error=str(e))
+                yield done, total, idx, item
+
+    def run(self, codes: List[str],
+            progress_callback: Optional[Callable[[int, int, SymbolResult], None]] = None) -> BatchResult:
+        """
+        运行批量回测
+
+        Args:
+            codes: 股票代码列表
+            progress_callback: 每完成一只股票调用一次，参数为 (已完成数量, 总数量, SymbolResult)
+
+        Returns:
+            BatchResult，结果和交易记录按输入顺序排列（重复的代码各占一行）
+        """
+        collected = {}
+        for done, total, idx, item in self._iter_positions(codes):
+            collected[idx] = item
+            if progress_callback is not None:
+                progress_callback(done, total, item)
+
+        return collect_results(codes, collected)
+
+
+def collect_results(codes: List[str], collected: Dict[int, SymbolResult]) -> BatchResult:
+    """按输入顺序整理结果、交易记录和失败列表（collected 以输入列表中的位置为键）"""
+    results = []
+    trades = []
+    failed_codes = []
+    for idx, code in enumerate(codes):
+        item = collected.get(idx)
+        if item is None:
+            continue
+        if item.error is not None:
+            failed_codes.append((code, item.error))
+        else:
+            results.append(item.summary)
+            trades.extend(item.trades)
+    return BatchResult(results=results, trades=trades, failed_codes=failed_codes)
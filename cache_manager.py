@@ -4,14 +4,35 @@
 """
 
 import pandas as pd
+import numpy as np
 import os
 import json
+import atexit
+import weakref
 import hashlib
+import bisect
+import heapq
+import itertools
 from datetime import datetime, timedelta, date
 from typing import Optional, Dict, List, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 
+# 可选依赖：安装 xxhash 后校验和使用 xxh3（更快），否则使用 blake2b
+try:
+    import xxhash
+    CHECKSUM_ALGORITHM = 'xxh3_64'
+except ImportError:
+    xxhash = None
+    CHECKSUM_ALGORITHM = 'blake2b'
+
+# 校验和模式：off 不计算；lazy 保存后在后台计算；verify_on_load 后台计算并在读取时校验
+CHECKSUM_MODES = ('off', 'lazy', 'verify_on_load')
+
 
 class CacheManager:
     """缓存管理器 - 统一的缓存入口"""
@@ -32,7 +53,10 @@ class CacheManager:
         self.config = self._load_config()
         
         # 初始化缓存索引
-        self.index = CacheIndex(self.metadata_dir / "cache_index.json")
+        self.index = self._create_index()
+        
+        # 写入锁：多个进程共享缓存目录时，保存/合并/删除依次进行
+        self._write_lock = get_file_lock(self.metadata_dir / "cache_write.lock")
         
         # 初始化存储层
         self.storage = CacheStorage(self.data_dir, self.config)
@@ -43,6 +67,16 @@ class CacheManager:
         # 初始化日志
         self._setup_logging()
         
+        # 校验和（后台计算）
+        self.checksum_mode = self.config.get("cache_settings", {}).get("checksum_mode", "off")
+        if self.checksum_mode not in CHECKSUM_MODES:
+            self.logger.warning(f"未知的校验和模式: {self.checksum_mode}，使用 off")
+            self.checksum_mode = "off"
+        self._checksum_executor = None
+        self._checksum_jobs = []
+        self._checksum_lock = threading.Lock()
+        self._verified_files = set()  # (路径, 修改时间, 大小, 校验和)
+        
         self.logger.info("缓存管理器初始化完成")
     
     def _load_config(self) -> dict:
@@ -58,17 +92,35 @@ class CacheManager:
             self.logger.error(f"加载配置文件失败: {e}，使用默认配置")
             return self._get_default_config()
     
+    def _create_index(self):
+        """根据配置创建索引（json: 单文件JSON索引，sqlite: SQLite索引）"""
+        json_index_file = self.metadata_dir / "cache_index.json"
+        backend = self.config.get("cache_settings", {}).get("index_backend", "json")
+        if backend == "sqlite":
+            return SQLiteCacheIndex(self.metadata_dir / "cache_index.db", json_index_file=json_index_file)
+        settings = self.config.get("cache_settings", {})
+        return get_cache_index(json_index_file,
+                               flush_interval=settings.get("index_flush_interval_seconds", 30),
+                               flush_every=settings.get("index_flush_every", 100))
+    
     def _get_default_config(self) -> dict:
         """获取默认配置"""
         return {
             "cache_settings": {
                 "enabled": True,
                 "max_size_mb": 1024,
-                "default_ttl_hours": 168
+                "default_ttl_hours": 168,
+                "memory_cache_mb": 256,
+                "index_flush_interval_seconds": 30,
+                "index_flush_every": 100,
+                "checksum_mode": "off"
             },
             "storage_format": {
                 "format": "parquet",
-                "compression": "snappy"
+                "compression": "snappy",
+                "layout": "partitioned",
+                "partition_by": "year",
+                "dtypes": "float64"
             },
             "logging": {
                 "enabled": True,
@@ -136,7 +188,7 @@ class CacheManager:
         self.logger.info(f"查询缓存: {cache_key}")
         
         # 查询缓存
-        cache_result = self._query_cache(cache_key, start_date, end_date)
+        cache_result = self._query_cache(cache_key, data_source, market, code, start_date, end_date, interval)
         
         if cache_result['status'] == 'full_match':
             self.logger.info(f"✅ 缓存命中: {cache_key}")
@@ -145,10 +197,154 @@ class CacheManager:
             self.logger.info(f"❌ 缓存未命中: {cache_key}")
             return None
         else:
-            # partial_match - 暂时不处理，返回None让调用方重新获取
-            self.logger.info(f"⚠️ 缓存部分命中: {cache_key}, 需要重新获取")
+            # partial_match - 数据不完整，返回None；补齐缺口请使用 get_data_with_gaps
+            self.logger.info(f"⚠️ 缓存部分命中: {cache_key}, 缺失区间: {cache_result['missing_ranges']}")
             return None
     
+    def get_data_with_gaps(self,
+                           data_source: str,
+                           market: str,
+                           code: str,
+                           start_date: date,
+                           end_date: date,
+                           interval: str = '1d') -> Tuple[Optional[pd.DataFrame], List[Tuple[date, date]]]:
+        """
+        获取缓存数据及缺失的日期区间（用于只补取缺口）
+        
+        Args:
+            同 get_data
+            
+        Returns:
+            (缓存中已有的数据或None, 缺失区间列表[(开始日期, 结束日期), ...])
+            完全命中时缺失列表为空，完全未命中时为 [(start_date, end_date)]
+        """
+        if not self.config.get("cache_settings", {}).get("enabled", True):
+            return None, [(start_date, end_date)]
+        
+        cache_key = self._generate_cache_key(data_source, market, code, start_date, end_date, interval)
+        cache_result = self._query_cache(cache_key, data_source, market, code, start_date, end_date, interval,
+                                         load_partial=True)
+        
+        if cache_result['status'] == 'full_match':
+            return cache_result['data'], []
+        elif cache_result['status'] == 'partial_match':
+            self.logger.info(f"⚠️ 缓存部分命中: {cache_key}, 缺失区间: {cache_result['missing_ranges']}")
+            return cache_result['data'], cache_result['missing_ranges']
+        return None, [(start_date, end_date)]
+    
+    def get_data_many(self,
+                      data_source: str,
+                      market: str,
+                      codes: List[str],
+                      start_date: date,
+                      end_date: date,
+                      interval: str = '1d') -> Dict[str, pd.DataFrame]:
+        """
+        批量获取数据（带缓存）
+        
+        通过区间索引为每个代码查找能覆盖查询范围的缓存条目，只加载命中的文件
+        
+        Args:
+            data_source: 数据源名称
+            market: 市场类型
+            codes: 股票/资产代码列表
+            start_date: 开始日期
+            end_date: 结束日期
+            interval: 时间粒度
+            
+        Returns:
+            {代码: DataFrame}，只包含缓存命中的代码
+        """
+        if not self.config.get("cache_settings", {}).get("enabled", True):
+            self.logger.info("缓存已禁用")
+            return {}
+        
+        hits = {}
+        for code in codes:
+            if code in hits:
+                continue
+            exact_key = self._generate_cache_key(data_source, market, code, start_date, end_date, interval)
+            result = self._query_cache(exact_key, data_source, market, code, start_date, end_date, interval)
+            if result['status'] == 'full_match':
+                hits[code] = result['data']
+        
+        self.logger.info(f"批量查询缓存: {len(hits)}/{len(set(codes))} 命中")
+        return hits
+    
+    def plan_missing(self,
+                     data_source: str,
+                     market: str,
+                     codes: List[str],
+                     start_date: date,
+                     end_date: date,
+                     interval: str = '1d') -> Dict[str, List[Tuple[date, date]]]:
+        """
+        按索引元数据计算每个代码缺失的日期区间（不读取任何数据文件）
+        
+        Args:
+            同 get_data_many
+            
+        Returns:
+            {代码: 缺失区间列表}，只包含有缺失的代码；完全未缓存的代码为 [(start_date, end_date)]
+        """
+        if not self.config.get("cache_settings", {}).get("enabled", True):
+            return {code: [(start_date, end_date)] for code in dict.fromkeys(codes)}
+        
+        plan = {}
+        for code in dict.fromkeys(codes):
+            covered = [
+                (date.fromisoformat(entry['start_date']), date.fromisoformat(entry['end_date']))
+                for _, entry in self.index.find_overlapping_entries(data_source, market, code, interval,
+                                                                    start_date, end_date)
+                if not self.policy.is_expired(entry)
+            ]
+            missing = self._missing_ranges(start_date, end_date, covered)
+            if missing:
+                plan[code] = missing
+        return plan
+    
+    def warm(self,
+             universe: List[str],
+             start_date: date,
+             end_date: date,
+             interval: str = '1d',
+             source='akshare',
+             market: str = 'A股',
+             max_workers: Optional[int] = None,
+             progress_callback=None,
+             **source_kwargs) -> dict:
+        """
+        预热缓存：先按索引规划整个代码池缺失的 (代码, 日期区间)，再并发获取并写入缓存
+        
+        批量回测前调用，之后的取数全部命中缓存。获取受数据源并发上限和限流约束，
+        详见 CachedDataSourceWrapper.warm。
+        
+        Args:
+            universe: 代码列表
+            start_date: 开始日期
+            end_date: 结束日期
+            interval: 时间粒度
+            source: 数据源名称（'akshare', 'yfinance', 'tushare'）或数据源实例
+            market: 市场类型（中文名称，如 'A股'）
+            max_workers: 线程数，默认使用数据源并发上限
+            progress_callback: 每完成一个请求调用一次，参数为 (已完成数量, 总数量, 代码)
+            **source_kwargs: 按名称创建数据源时的参数（token, points）
+            
+        Returns:
+            {'planned': 请求数, 'cached': 已完整缓存的代码数, 'fetched': [代码], 'failed': {代码: 错误信息},
+             'rows': 获取的行数}
+        """
+        # 延迟导入，避免 cached_data_source -> cache_manager 的循环导入
+        from cached_data_source import CachedDataSourceWrapper
+        
+        if isinstance(source, str):
+            from data_source import DataSourceFactory
+            source = DataSourceFactory.create_data_source(source, **source_kwargs)
+        
+        wrapper = CachedDataSourceWrapper(source, self)
+        return wrapper.warm(universe, start_date, end_date, market=market, interval=interval,
+                            max_workers=max_workers, progress_callback=progress_callback)
+    
     def save_data(self,
                   data: pd.DataFrame,
                   data_source: str,
@@ -179,71 +375,359 @@ class CacheManager:
             self.logger.warning("数据为空，不保存缓存")
             return False
         
-        try:
-            # 生成缓存键
-            cache_key = self._generate_cache_key(data_source, market, code, start_date, end_date, interval)
-            
-            # 🆕 检查是否已有能覆盖此范围的更大缓存
-            # 提取查询的基本信息
-            all_entries = self.index.get_all_entries()
-            for existing_key, existing_entry in all_entries.items():
-                # 检查是否是同一个资产
-                if (existing_entry.get('data_source') == data_source and
-                    existing_entry.get('market') == market and
-                    existing_entry.get('code') == code and
-                    existing_entry.get('interval') == interval):
+        with self._write_lock:
+            try:
+                # 生成缓存键
+                cache_key = self._generate_cache_key(data_source, market, code, start_date, end_date, interval)
+                
+                # 🆕 检查是否已有能覆盖此范围的更大缓存（区间索引查找）
+                covering = self.index.find_covering_entries(data_source, market, code, interval, start_date, end_date)
+                for existing_key, existing_entry in covering:
+                    # 检查是否过期
+                    if not self.policy.is_expired(existing_entry):
+                        self.logger.info(f"⏭️  跳过保存: 已有更大范围的缓存 ({existing_key}) 覆盖此查询")
+                        return True  # 返回True表示不需要保存（已有缓存）
+                
+                if self.storage.layout == 'partitioned':
+                    cache_key, metadata = self._save_partitioned(data, data_source, market, code,
+                                                                 start_date, end_date, interval)
+                    if metadata is None:
+                        return False
+                else:
+                    # 保存数据文件
+                    file_path = self.storage.save(data, data_source, market, code, start_date, end_date, interval)
                     
-                    # 检查现有缓存的日期范围
-                    existing_start = datetime.strptime(existing_entry['start_date'], '%Y-%m-%d').date()
-                    existing_end = datetime.strptime(existing_entry['end_date'], '%Y-%m-%d').date()
+                    if not file_path:
+                        self.logger.error(f"保存数据文件失败: {cache_key}")
+                        return False
                     
-                    # 如果现有缓存完全覆盖要保存的范围
-                    if existing_start <= start_date and existing_end >= end_date:
-                        # 检查是否过期
-                        if not self.policy.is_expired(existing_entry):
-                            self.logger.info(f"⏭️  跳过保存: 已有更大范围的缓存 ({existing_key}) 覆盖此查询")
-                            return True  # 返回True表示不需要保存（已有缓存）
-            
-            # 保存数据文件
-            file_path = self.storage.save(data, data_source, market, code, start_date, end_date, interval)
-            
-            if not file_path:
-                self.logger.error(f"保存数据文件失败: {cache_key}")
+                    metadata = self._build_metadata(
+                        file_path, data_source, market, code, start_date, end_date, interval,
+                        rows=len(data), columns=list(data.columns),
+                        file_size_kb=round(os.path.getsize(file_path) / 1024, 2),
+                        checksum=None
+                    )
+                
+                # 更新索引
+                self.index.add_entry(cache_key, metadata)
+                self._schedule_checksums(cache_key, metadata)
+                
+                self.logger.info(f"✅ 缓存保存成功: {cache_key} ({metadata['file_size_kb']} KB)")
+                
+                # 检查是否需要清理
+                self._check_and_cleanup()
+                
+                return True
+                
+            except Exception as e:
+                self.logger.error(f"保存缓存失败: {e}")
+                import traceback
+                traceback.print_exc()
                 return False
+    
+    def save_many(self,
+                  frames: Dict[str, pd.DataFrame],
+                  data_source: str,
+                  market: str,
+                  start_date: date,
+                  end_date: date,
+                  interval: str = '1d') -> int:
+        """
+        批量保存多个代码的数据（如整个市场的截面数据），索引只写入一次
+        
+        Args:
+            frames: {代码: DataFrame}
+            其余参数同 save_data（所有代码使用相同的日期范围）
             
-            # 更新索引
-            metadata = {
-                'file_path': str(file_path),
-                'data_source': data_source,
-                'market': market,
-                'code': code,
-                'start_date': start_date.strftime('%Y-%m-%d'),
-                'end_date': end_date.strftime('%Y-%m-%d'),
-                'interval': interval,
-                'rows': len(data),
-                'columns': list(data.columns),
-                'created_at': datetime.now().isoformat(),
-                'last_accessed': datetime.now().isoformat(),
-                'access_count': 0,
-                'file_size_kb': round(os.path.getsize(file_path) / 1024, 2),
-                'checksum': self._calculate_checksum(file_path),
-                'is_complete': True
-            }
+        Returns:
+            保存成功的代码数量
+        """
+        saved = 0
+        with self._write_lock, self.index.batch():
+            for code, data in frames.items():
+                if self.save_data(data, data_source, market, code, start_date, end_date, interval):
+                    saved += 1
+        self._check_and_cleanup()
+        self.logger.info(f"✅ 批量缓存保存完成: {saved}/{len(frames)} 个代码")
+        return saved
+    
+    def append_many(self, items: List[Tuple[str, pd.DataFrame, date]]) -> Dict[str, Optional[str]]:
+        """
+        批量追加（增量刷新多个资产），索引只写入一次
+        
+        Args:
+            items: [(缓存键, 新数据, 新的结束日期)]，参数含义同 append_data
+            
+        Returns:
+            {原缓存键: 新缓存键或None}
+        """
+        with self._write_lock, self.index.batch():
+            return {key: self.append_data(key, data, end_date) for key, data, end_date in items}
+    
+    def _build_metadata(self, file_path: Path, data_source: str, market: str, code: str,
+                        start_date: date, end_date: date, interval: str,
+                        rows: int, columns: List[str], file_size_kb: float, checksum: str) -> dict:
+        """构建缓存条目元数据"""
+        return {
+            'file_path': str(file_path),
+            'data_source': data_source,
+            'market': market,
+            'code': code,
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d'),
+            'interval': interval,
+            'rows': rows,
+            'columns': columns,
+            'created_at': datetime.now().isoformat(),
+            'last_accessed': datetime.now().isoformat(),
+            'access_count': 0,
+            'file_size_kb': file_size_kb,
+            'checksum': checksum,
+            'is_complete': True
+        }
+    
+    def _save_partitioned(self, data: pd.DataFrame, data_source: str, market: str, code: str,
+                          start_date: date, end_date: date, interval: str) -> Tuple[str, Optional[dict]]:
+        """
+        写入资产数据集，并将重叠/相邻的缓存条目合并为一个条目
+        
+        旧版按范围存储的文件会并入数据集后删除；过期条目移出索引，并先从数据集中删除其日期范围内的数据
+        （否则这些行会被相邻条目按查询范围读取时带出）
+        
+        Returns:
+            (合并后的缓存键, 元数据)，写入失败时元数据为None
+        """
+        neighbours = self.index.find_overlapping_entries(
+            data_source, market, code, interval,
+            start_date - timedelta(days=1), end_date + timedelta(days=1)
+        )
+        
+        pieces = []
+        merged = []  # (key, 旧版文件路径或None)
+        dataset_spans = []
+        dataset_rows = 0
+        checksums = {}  # 被合并条目已计算的分区校验和
+        expired_partitions = []  # 删除过期数据时重写的分区文件名
+        merged_start, merged_end = start_date, end_date
+        for key, entry in neighbours:
+            entry_path = Path(entry['file_path'])
+            span = (datetime.strptime(entry['start_date'], '%Y-%m-%d').date(),
+                    datetime.strptime(entry['end_date'], '%Y-%m-%d').date())
+            if self.policy.is_expired(entry):
+                self.index.remove_entry(key)
+                if entry_path.is_file():
+                    entry_path.unlink()
+                elif entry_path.is_dir():
+                    expired_partitions += [f.name for f in self.storage.partition_files(entry_path, *span)]
+                    self.storage.delete_range(entry_path, *span)
+                continue
+            
+            if entry_path.is_file():
+                legacy = self.storage.load(entry_path)
+                if legacy is None:
+                    continue
+                pieces.append(legacy)
+                merged.append((key, entry_path))
+            else:
+                dataset_spans.append(span)
+                dataset_rows += entry.get('rows', 0)
+                merged.append((key, None))
+                if isinstance(entry.get('checksum'), dict):
+                    checksums.update(entry['checksum'])
+            merged_start, merged_end = min(merged_start, span[0]), max(merged_end, span[1])
+        
+        pieces.append(data)
+        if len(pieces) > 1:
+            data = pd.concat(pieces)
+            data = data[~data.index.duplicated(keep='last')].sort_index()
+        
+        cache_key = self._generate_cache_key(data_source, market, code, merged_start, merged_end, interval)
+        dataset_dir = self.storage.save(data, data_source, market, code, merged_start, merged_end, interval)
+        if not dataset_dir:
+            self.logger.error(f"保存数据文件失败: {cache_key}")
+            return cache_key, None
+        
+        for key, legacy_path in merged:
+            self.index.remove_entry(key)
+            if legacy_path is not None and legacy_path.exists():
+                legacy_path.unlink()
+        if merged:
+            self.logger.info(f"🧩 合并缓存: {len(merged)} 个旧条目 -> {cache_key}")
+        
+        # 重写过的分区校验和失效（包括同一资产其他条目记录的）
+        written = [f.name for f in self.storage.partition_files(
+            dataset_dir, data.index.min().date(), data.index.max().date())] + expired_partitions
+        for name in written:
+            checksums.pop(name, None)
+        self._invalidate_partition_checksums(data_source, market, code, interval, written)
+        self._refresh_partition_sizes(data_source, market, code, interval, written)
+        
+        # 行数 = 已在数据集中的条目行数 + 新数据中不在这些条目范围内的行数
+        outside = np.ones(len(data), dtype=bool)
+        for span_start, span_end in dataset_spans:
+            outside &= ~_date_range_mask(data.index, span_start, span_end)
+        rows = dataset_rows + int(outside.sum())
+        
+        metadata = self._build_metadata(
+            dataset_dir, data_source, market, code, merged_start, merged_end, interval,
+            rows=rows, columns=list(data.columns),
+            file_size_kb=round(self.storage.range_size(dataset_dir, merged_start, merged_end) / 1024, 2),
+            checksum=checksums
+        )
+        return cache_key, metadata
+    
+    def merge_and_save(self,
+                       data: pd.DataFrame,
+                       data_source: str,
+                       market: str,
+                       code: str,
+                       start_date: date,
+                       end_date: date,
+                       interval: str = '1d') -> bool:
+        """
+        将新获取的数据与重叠/相邻的缓存合并，保存为一个覆盖并集范围的缓存条目，并删除被合并的旧条目
+        
+        Args:
+            data: 新获取的数据（日期范围为 start_date ~ end_date），重复日期以新数据为准
+            其余参数同 save_data
+            
+        Returns:
+            是否保存成功
+        """
+        if not self.config.get("cache_settings", {}).get("enabled", True):
+            return False
+        
+        # 分区存储时 save_data 已按资产合并写入
+        if self.storage.layout == 'partitioned':
+            return self.save_data(data, data_source, market, code, start_date, end_date, interval)
+        
+        with self._write_lock:
+            # 相邻（前后各一天）的条目也一并合并，避免碎片
+            neighbours = self.index.find_overlapping_entries(
+                data_source, market, code, interval,
+                start_date - timedelta(days=1), end_date + timedelta(days=1)
+            )
+            
+            pieces = []
+            merged_keys = []
+            merged_start, merged_end = start_date, end_date
+            for key, entry in neighbours:
+                if self.policy.is_expired(entry):
+                    continue
+                cached = self._load_entry_file(entry, key)
+                if cached is None:
+                    continue
+                pieces.append(cached)
+                merged_keys.append(key)
+                merged_start = min(merged_start, datetime.strptime(entry['start_date'], '%Y-%m-%d').date())
+                merged_end = max(merged_end, datetime.strptime(entry['end_date'], '%Y-%m-%d').date())
             
-            self.index.add_entry(cache_key, metadata)
+            if data is not None and not data.empty:
+                pieces.append(data)
+            if not pieces:
+                return False
             
-            self.logger.info(f"✅ 缓存保存成功: {cache_key} ({metadata['file_size_kb']} KB)")
+            merged = pd.concat(pieces)
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index()
             
-            # 检查是否需要清理
-            self._check_and_cleanup()
+            if not self.save_data(merged, data_source, market, code, merged_start, merged_end, interval):
+                return False
             
+            merged_key = self._generate_cache_key(data_source, market, code, merged_start, merged_end, interval)
+            if self.index.has_entry(merged_key):
+                for key in merged_keys:
+                    if key != merged_key:
+                        self.delete_cache(key)
+                self.logger.info(f"🧩 合并缓存: {len(merged_keys)} 个旧条目 -> {merged_key}")
             return True
+    
+    def append_data(self, cache_key: str, data: pd.DataFrame, end_date: date) -> Optional[str]:
+        """
+        向已有缓存条目追加其结束日期之后的数据，并把条目范围延长到 end_date（增量刷新）
+        
+        只写入条目原结束日期（含，用于替换当天可能不完整的K线）之后的行：分区存储只重写这些行所在的分区，
+        历史分区不变；按范围存储需要重写整个文件。条目是否过期不影响追加，追加后按新的创建时间重新计算TTL，
+        访问记录保留。
+        
+        Args:
+            cache_key: 缓存键
+            data: 新获取的数据（早于原结束日期的行会被忽略）
+            end_date: 新的结束日期
             
-        except Exception as e:
-            self.logger.error(f"保存缓存失败: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+        Returns:
+            新的缓存键（范围变化后键随之变化），条目不存在或写入失败时返回None
+        """
+        with self._write_lock:
+            entry = self.index.get_entry(cache_key)
+            if entry is None:
+                return None
+            
+            data_source, market, code, interval = entry['data_source'], entry['market'], entry['code'], entry['interval']
+            start = date.fromisoformat(entry['start_date'])
+            old_end = date.fromisoformat(entry['end_date'])
+            new_end = max(old_end, end_date)
+            file_path = Path(entry['file_path'])
+            tail = filter_date_range(data, old_end, new_end) if data is not None else None
+            if tail is not None and tail.empty:
+                tail = None
+            
+            written = []
+            try:
+                if file_path.is_dir():
+                    rows = entry.get('rows', 0)
+                    if tail is not None:
+                        last_day = self.storage.load(file_path, old_end, old_end)
+                        rows -= 0 if last_day is None else len(last_day)
+                        self.storage.save(tail, data_source, market, code, old_end, new_end, interval)
+                        rows += len(self.storage.load(file_path, old_end, new_end))
+                        written = [f.name for f in self.storage.partition_files(
+                            file_path, tail.index.min().date(), tail.index.max().date())]
+                    new_path = file_path
+                    size = self.storage.range_size(file_path, start, new_end)
+                    checksum = {name: value for name, value in (entry.get('checksum') or {}).items()
+                                if name not in written}
+                else:
+                    merged = self.storage.load(file_path)
+                    if merged is None:
+                        return None
+                    if tail is not None:
+                        merged = pd.concat([merged, tail])
+                        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+                    new_path = self.storage.save(merged, data_source, market, code, start, new_end, interval)
+                    if not new_path:
+                        return None
+                    if new_path != file_path and file_path.exists():
+                        self.storage.memory.discard(file_path)
+                        file_path.unlink()
+                    rows = len(merged)
+                    size = new_path.stat().st_size
+                    checksum = None
+            except Exception as e:
+                self.logger.error(f"追加缓存失败: {cache_key}: {e}")
+                return None
+            
+            new_key = self._generate_cache_key(data_source, market, code, start, new_end, interval)
+            metadata = self._build_metadata(
+                new_path, data_source, market, code, start, new_end, interval,
+                rows=rows, columns=entry.get('columns', []) if tail is None else list(tail.columns),
+                file_size_kb=round(size / 1024, 2),
+                checksum=checksum
+            )
+            metadata['last_accessed'] = entry.get('last_accessed', metadata['last_accessed'])
+            metadata['access_count'] = entry.get('access_count', 0)
+            
+            with self.index.batch():
+                if new_key != cache_key:
+                    self.index.remove_entry(cache_key)
+                self.index.add_entry(new_key, metadata)
+                if written:
+                    self._invalidate_partition_checksums(data_source, market, code, interval, written)
+                    self._refresh_partition_sizes(data_source, market, code, interval, written)
+            self._schedule_checksums(new_key, metadata)
+            
+            self.logger.info(f"➕ 增量追加: {cache_key} -> {new_key} "
+                             f"({0 if tail is None else len(tail)} 行)")
+            return new_key
     
     def _generate_cache_key(self, data_source: str, market: str, code: str,
                            start_date: date, end_date: date, interval: str) -> str:
@@ -252,10 +736,17 @@ class CacheManager:
         end_str = end_date.strftime('%Y%m%d')
         return f"{data_source}_{market}_{code}_{start_str}_{end_str}_{interval}"
     
-    def _query_cache(self, cache_key: str, start_date: date, end_date: date) -> dict:
+    def _query_cache(self, cache_key: str, data_source: str, market: str, code: str,
+                     start_date: date, end_date: date, interval: str,
+                     load_partial: bool = False) -> dict:
         """
         查询缓存（支持智能日期范围匹配）
         
+        先按元数据通过区间索引筛选覆盖查询范围的条目，只读取候选文件
+        
+        Args:
+            load_partial: 部分命中时是否读取已缓存的部分数据
+        
         Returns:
             {
                 'status': 'full_match' | 'partial_match' | 'no_match',
@@ -264,43 +755,107 @@ class CacheManager:
             }
         """
         # 1. 先尝试精确匹配（最快）
-        if self.index.has_entry(cache_key):
-            entry = self.index.get_entry(cache_key)
+        entry = self.index.get_entry(cache_key)
+        if entry is not None:
             result = self._check_and_load_cache(entry, cache_key, start_date, end_date)
             if result['status'] == 'full_match':
                 return result
         
-        # 2. 精确匹配失败，尝试查找能覆盖查询范围的更大缓存
-        # 提取查询的基本信息（数据源、市场、代码、时间粒度）
-        key_parts = cache_key.split('_')
-        if len(key_parts) >= 6:
-            data_source = key_parts[0]
-            market = key_parts[1]
-            code = key_parts[2]
-            # key_parts[3] = start_date, key_parts[4] = end_date
-            interval = key_parts[5] if len(key_parts) > 5 else '1d'
-            
-            # 遍历所有缓存，查找能覆盖查询范围的缓存
-            all_entries = self.index.get_all_entries()
-            for existing_key, existing_entry in all_entries.items():
-                # 跳过已检查的精确匹配
-                if existing_key == cache_key:
-                    continue
-                
-                # 检查是否是同一个资产（数据源、市场、代码、时间粒度相同）
-                if (existing_entry.get('data_source') == data_source and
-                    existing_entry.get('market') == market and
-                    existing_entry.get('code') == code and
-                    existing_entry.get('interval') == interval):
-                    
-                    # 检查日期范围是否能覆盖查询范围
-                    result = self._check_and_load_cache(existing_entry, existing_key, start_date, end_date)
-                    if result['status'] == 'full_match':
-                        self.logger.info(f"✅ 找到覆盖缓存: {existing_key} (覆盖查询范围)")
-                        return result
+        # 2. 精确匹配失败，查找能覆盖查询范围的更大缓存（日期跨度最小的优先）
+        covering = self.index.find_covering_entries(data_source, market, code, interval, start_date, end_date)
+        for existing_key, existing_entry in covering:
+            # 跳过已检查的精确匹配
+            if existing_key == cache_key:
+                continue
+            
+            result = self._check_and_load_cache(existing_entry, existing_key, start_date, end_date)
+            if result['status'] == 'full_match':
+                self.logger.info(f"✅ 找到覆盖缓存: {existing_key} (覆盖查询范围)")
+                return result
+        
+        # 3. 没有单个缓存能覆盖，合并有交集的缓存并计算缺失区间
+        return self._query_partial(data_source, market, code, start_date, end_date, interval, load_partial)
+    
+    def _query_partial(self, data_source: str, market: str, code: str,
+                       start_date: date, end_date: date, interval: str,
+                       load_partial: bool = False) -> dict:
+        """
+        合并与查询范围有交集的缓存，返回已有数据和缺失区间
+        
+        缺失区间先按元数据计算；有缺失且 load_partial=False 时不读取任何文件
+        
+        Returns:
+            同 _query_cache，partial_match 时额外包含 'missing_ranges'
+        """
+        candidates = []
+        for key, entry in self.index.find_overlapping_entries(data_source, market, code, interval,
+                                                               start_date, end_date):
+            if not self.policy.is_expired(entry):
+                span = (datetime.strptime(entry['start_date'], '%Y-%m-%d').date(),
+                        datetime.strptime(entry['end_date'], '%Y-%m-%d').date())
+                candidates.append((key, entry, span))
         
-        # 3. 未找到任何匹配的缓存
-        return {'status': 'no_match', 'data': None, 'caches': []}
+        if not candidates:
+            return {'status': 'no_match', 'data': None, 'caches': []}
+        
+        missing_ranges = self._missing_ranges(start_date, end_date, [span for _, _, span in candidates])
+        if missing_ranges and not load_partial:
+            return {
+                'status': 'partial_match',
+                'data': None,
+                'caches': [entry for _, entry, _ in candidates],
+                'missing_ranges': missing_ranges
+            }
+        
+        pieces = []
+        caches = []
+        covered = []
+        for key, entry, span in candidates:
+            # 只读取条目自身范围内的数据：分区数据集中与条目相邻的行不属于该条目
+            data = self._load_entry_file(entry, key, max(span[0], start_date), min(span[1], end_date))
+            if data is None:
+                continue
+            pieces.append(data)
+            caches.append(entry)
+            covered.append(span)
+        
+        if not pieces:
+            return {'status': 'no_match', 'data': None, 'caches': []}
+        
+        data = pd.concat(pieces) if len(pieces) > 1 else pieces[0]
+        data = data[~data.index.duplicated(keep='last')].sort_index()
+        data = filter_date_range(data, start_date, end_date)
+        missing_ranges = self._missing_ranges(start_date, end_date, covered)
+        
+        if not missing_ranges and not data.empty:
+            # 多个缓存拼接后完整覆盖
+            self.logger.info(f"✅ 多个缓存拼接覆盖查询范围: {len(caches)} 个")
+            return {'status': 'full_match', 'data': data, 'caches': caches, 'from_larger_cache': True}
+        
+        return {
+            'status': 'partial_match',
+            'data': data if not data.empty else None,
+            'caches': caches,
+            'missing_ranges': missing_ranges or [(start_date, end_date)]
+        }
+    
+    @staticmethod
+    def _missing_ranges(start_date: date, end_date: date,
+                        covered: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+        """计算查询范围中未被已缓存区间覆盖的部分"""
+        missing = []
+        cursor = start_date
+        for cache_start, cache_end in sorted(covered):
+            if cache_start > end_date:
+                break
+            if cache_start > cursor:
+                missing.append((cursor, cache_start - timedelta(days=1)))
+            cursor = max(cursor, cache_end + timedelta(days=1))
+            if cursor > end_date:
+                break
+        if cursor <= end_date:
+            missing.append((cursor, end_date))
+        return missing
     
     def _check_and_load_cache(self, entry: dict, cache_key: str, start_date: date, end_date: date) -> dict:
         """
@@ -315,62 +870,220 @@ class CacheManager:
         Returns:
             查询结果字典
         """
+        # 检查日期范围是否完全包含查询范围（只看元数据，不读文件）
+        cache_start = datetime.strptime(entry['start_date'], '%Y-%m-%d').date()
+        cache_end = datetime.strptime(entry['end_date'], '%Y-%m-%d').date()
+        if cache_start > start_date or cache_end < end_date:
+            return {'status': 'no_match', 'data': None, 'caches': []}
+        
         # 检查是否过期
         if self.policy.is_expired(entry):
             self.logger.info(f"缓存已过期: {cache_key}")
             return {'status': 'no_match', 'data': None, 'caches': []}
         
-        # 检查文件是否存在
+        # 读取数据
+        data = self._load_entry_file(entry, cache_key, start_date, end_date)
+        if data is None:
+            return {'status': 'no_match', 'data': None, 'caches': []}
+        
+        # ✅ 缓存范围完全覆盖查询范围，过滤数据
+        filtered_data = filter_date_range(data, start_date, end_date)
+        
+        if filtered_data.empty:
+            self.logger.warning(f"过滤后数据为空: {cache_key}")
+            return {'status': 'no_match', 'data': None, 'caches': []}
+        
+        # 更新访问记录
+        self.index.update_access(cache_key)
+        
+        self.logger.info(f"✅ 从缓存过滤数据: {len(filtered_data)} 条记录 (原缓存: {len(data)} 条)")
+        
+        return {
+            'status': 'full_match',
+            'data': filtered_data,
+            'caches': [entry],
+            'from_larger_cache': cache_key != f"{entry['data_source']}_{entry['market']}_{entry['code']}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}_{entry['interval']}"
+        }
+    
+    def _load_entry_file(self, entry: dict, cache_key: str, start_date: Optional[date] = None,
+                         end_date: Optional[date] = None) -> Optional[pd.DataFrame]:
+        """读取缓存条目对应的文件（分区存储只读取与日期范围相交的分区），文件丢失时移除索引条目"""
         file_path = Path(entry['file_path'])
         if not file_path.exists():
             self.logger.warning(f"缓存文件不存在: {file_path}")
             self.index.remove_entry(cache_key)
-            return {'status': 'no_match', 'data': None, 'caches': []}
+            return None
         
-        # 读取数据
-        data = self.storage.load(file_path)
+        if self.checksum_mode == 'verify_on_load' and not self._verify_files(entry, cache_key, start_date, end_date):
+            return None
+        
+        data = self.storage.load(file_path, start_date, end_date)
         if data is None:
             self.logger.error(f"读取缓存文件失败: {file_path}")
-            return {'status': 'no_match', 'data': None, 'caches': []}
-        
-        # 检查日期范围是否完全包含查询范围
-        cache_start = datetime.strptime(entry['start_date'], '%Y-%m-%d').date()
-        cache_end = datetime.strptime(entry['end_date'], '%Y-%m-%d').date()
+        return data
+    
+    def _calculate_checksum(self, file_path: Path, algorithm: str = CHECKSUM_ALGORITHM) -> str:
+        """
+        计算文件校验和（1 MB 分块读取）
         
-        if cache_start <= start_date and cache_end >= end_date:
-            # ✅ 缓存范围完全覆盖查询范围，过滤数据
-            filtered_data = data[(data.index.date >= start_date) & (data.index.date <= end_date)]
-            
-            if filtered_data.empty:
-                self.logger.warning(f"过滤后数据为空: {cache_key}")
-                return {'status': 'no_match', 'data': None, 'caches': []}
-            
-            # 更新访问记录
-            self.index.update_access(cache_key)
-            
-            self.logger.info(f"✅ 从缓存过滤数据: {len(filtered_data)} 条记录 (原缓存: {len(data)} 条)")
+        Args:
+            file_path: 文件路径
+            algorithm: xxhash 的算法名（如 xxh3_64）或 hashlib 支持的算法名（如 blake2b、md5）
             
-            return {
-                'status': 'full_match',
-                'data': filtered_data,
-                'caches': [entry],
-                'from_larger_cache': cache_key != f"{entry['data_source']}_{entry['market']}_{entry['code']}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}_{entry['interval']}"
-            }
-        
-        # 日期范围不匹配
-        return {'status': 'no_match', 'data': None, 'caches': []}
-    
-    def _calculate_checksum(self, file_path: Path) -> str:
-        """计算文件校验和"""
+        Returns:
+            "算法:十六进制摘要"
+        """
         try:
-            md5_hash = hashlib.md5()
+            if algorithm.startswith('xxh'):
+                if xxhash is None:
+                    return f"{algorithm}:unknown"
+                hasher = getattr(xxhash, algorithm)()
+            else:
+                hasher = hashlib.new(algorithm)
             with open(file_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    md5_hash.update(chunk)
-            return f"md5:{md5_hash.hexdigest()}"
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    hasher.update(chunk)
+            return f"{algorithm}:{hasher.hexdigest()}"
         except Exception as e:
             self.logger.warning(f"计算校验和失败: {e}")
-            return "md5:unknown"
+            return f"{algorithm}:unknown"
+    
+    def _schedule_checksums(self, cache_key: str, metadata: dict, names: Optional[List[str]] = None):
+        """
+        在后台计算条目文件的校验和并写回索引（checksum_mode 为 off 时不计算）
+        
+        Args:
+            cache_key: 缓存键
+            metadata: 条目元数据
+            names: 分区存储中需要计算的分区文件名，None 表示条目范围内尚无校验和的分区
+        """
+        if self.checksum_mode == 'off':
+            return
+        
+        file_path = Path(metadata['file_path'])
+        if file_path.is_dir():
+            if names is None:
+                start = datetime.strptime(metadata['start_date'], '%Y-%m-%d').date()
+                end = datetime.strptime(metadata['end_date'], '%Y-%m-%d').date()
+                known = metadata.get('checksum') or {}
+                names = [f.name for f in self.storage.partition_files(file_path, start, end) if f.name not in known]
+            files = [file_path / name for name in names]
+        else:
+            files = [file_path]
+        if not files:
+            return
+        
+        with self._checksum_lock:
+            if self._checksum_executor is None:
+                self._checksum_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-checksum")
+            self._checksum_jobs = [job for job in self._checksum_jobs if not job.done()]
+            self._checksum_jobs.append(
+                self._checksum_executor.submit(self._record_checksums, cache_key, metadata['created_at'], files)
+            )
+    
+    def _record_checksums(self, cache_key: str, created_at: str, files: List[Path]):
+        """计算校验和并写回索引（条目已被替换或删除时丢弃）"""
+        checksums = {f.name: self._calculate_checksum(f) for f in files if f.exists()}
+        if not checksums:
+            return
+        
+        with self._write_lock:
+            entry = self.index.get_entry(cache_key)
+            if entry is None or entry.get('created_at') != created_at:
+                return
+            entry = dict(entry)
+            if Path(entry['file_path']).is_dir():
+                entry['checksum'] = dict(entry.get('checksum') or {}, **checksums)
+            else:
+                entry['checksum'] = checksums.get(Path(entry['file_path']).name)
+            self.index.add_entry(cache_key, entry)
+    
+    def wait_for_checksums(self):
+        """等待后台校验和计算完成"""
+        with self._checksum_lock:
+            jobs = list(self._checksum_jobs)
+        wait(jobs)
+    
+    def _invalidate_partition_checksums(self, data_source: str, market: str, code: str,
+                                        interval: str, names: List[str]):
+        """分区文件被重写后，移除同一资产各条目中这些分区的旧校验和，并重新计算"""
+        names = set(names)
+        for key, entry in self.index.find_entries(data_source, market, code, interval).items():
+            checksum = entry.get('checksum')
+            if not isinstance(checksum, dict) or not names & checksum.keys():
+                continue
+            entry = dict(entry, checksum={name: value for name, value in checksum.items() if name not in names})
+            self.index.add_entry(key, entry)
+            self._schedule_checksums(key, entry)
+    
+    def _refresh_partition_sizes(self, data_source: str, market: str, code: str,
+                                 interval: str, names: List[str]):
+        """分区文件被重写后，重新计算同一资产中使用这些分区的条目大小"""
+        names = set(names)
+        for key, entry in self.index.find_entries(data_source, market, code, interval).items():
+            file_path = Path(entry['file_path'])
+            if not file_path.is_dir():
+                continue
+            start, end = date.fromisoformat(entry['start_date']), date.fromisoformat(entry['end_date'])
+            if not names & {f.name for f in self.storage.partition_files(file_path, start, end)}:
+                continue
+            size_kb = round(self.storage.range_size(file_path, start, end) / 1024, 2)
+            if size_kb != entry.get('file_size_kb'):
+                self.index.add_entry(key, dict(entry, file_size_kb=size_kb))
+    
+    def _verify_files(self, entry: dict, cache_key: str, start_date: Optional[date] = None,
+                      end_date: Optional[date] = None) -> bool:
+        """
+        读取前校验文件（每个文件版本只校验一次；尚无校验和的文件跳过）
+        
+        校验失败时删除损坏的文件并移除受影响的索引条目
+        
+        Returns:
+            是否通过校验
+        """
+        file_path = Path(entry['file_path'])
+        checksum = entry.get('checksum')
+        if file_path.is_dir():
+            expected = checksum if isinstance(checksum, dict) else {}
+            files = self.storage.partition_files(file_path, start_date, end_date)
+        else:
+            expected = {file_path.name: checksum} if isinstance(checksum, str) else {}
+            files = [file_path]
+        
+        for f in files:
+            value = expected.get(f.name)
+            if not value or ':' not in value:
+                continue
+            algorithm, digest = value.split(':', 1)
+            if not digest or any(c not in '0123456789abcdef' for c in digest):
+                continue  # 旧版占位值，如 md5:partitioned
+            if algorithm.startswith('xxh') and xxhash is None:
+                continue
+            
+            stat = f.stat()
+            token = (str(f), stat.st_mtime_ns, stat.st_size, value)
+            if token in self._verified_files:
+                continue
+            if self._calculate_checksum(f, algorithm) == value:
+                self._verified_files.add(token)
+                continue
+            
+            self.logger.error(f"❌ 缓存文件校验失败，已删除: {f}")
+            with self._write_lock:
+                self.storage.memory.discard(f)
+                if f.exists():
+                    f.unlink()
+                if file_path.is_dir():
+                    # 分区文件被多个条目共用，移除与该分区相交的所有条目
+                    first_day, last_day = self.storage._partition_span(f.stem)
+                    for key, _ in self.index.find_overlapping_entries(
+                            entry['data_source'], entry['market'], entry['code'], entry['interval'],
+                            first_day, last_day):
+                        self.index.remove_entry(key)
+                else:
+                    self.index.remove_entry(cache_key)
+            return False
+        return True
     
     def _check_and_cleanup(self):
         """检查缓存大小并清理"""
@@ -383,70 +1096,82 @@ class CacheManager:
     
     def cleanup_cache(self, force: bool = False):
         """
-        清理缓存
+        清理缓存：删除过期条目；超过容量（或 force）时按 cleanup_policy.strategy 淘汰到容量的80%
+        
+        待删除条目一次选出，索引在一次写入（事务）中批量删除
         
         Args:
-            force: 是否强制清理（忽略访问记录）
+            force: 是否强制清理（即使未超过容量也淘汰到容量的80%）
         """
-        self.logger.info("开始清理缓存...")
-        
-        entries = self.index.get_all_entries()
-        to_delete = []
-        
-        # 清理过期缓存
-        for key, entry in entries.items():
-            if self.policy.is_expired(entry):
-                to_delete.append(key)
-        
-        # 如果还需要清理更多（超过容量限制）
-        stats = self.index.get_statistics()
-        max_size_mb = self.config.get("cache_settings", {}).get("max_size_mb", 1024)
-        
-        if stats['total_size_mb'] > max_size_mb or force:
-            # LRU策略：删除最久未访问的
-            sorted_entries = sorted(
-                entries.items(),
-                key=lambda x: x[1].get('last_accessed', ''),
-                reverse=False  # 最旧的在前
-            )
+        with self._write_lock:
+            self.logger.info("开始清理缓存...")
             
-            for key, entry in sorted_entries:
-                if key not in to_delete:
-                    to_delete.append(key)
-                    if self.index.get_statistics()['total_size_mb'] <= max_size_mb * 0.8:
-                        break
-        
-        # 执行删除
-        deleted_count = 0
-        for key in to_delete:
-            if self.delete_cache(key):
-                deleted_count += 1
-        
-        self.logger.info(f"清理完成，删除了 {deleted_count} 个缓存")
+            entries = self.index.get_all_entries()
+            to_delete = [key for key, entry in entries.items() if self.policy.is_expired(entry)]
+            
+            expired = set(to_delete)
+            total_kb = sum(entry.get('file_size_kb', 0) for key, entry in entries.items() if key not in expired)
+            max_kb = self.config.get("cache_settings", {}).get("max_size_mb", 1024) * 1024
+            if total_kb > max_kb or force:
+                to_delete += self.policy.select_evictions(entries, total_kb - max_kb * 0.8, exclude=expired)
+            
+            deleted_count = self._delete_entries(to_delete)
+            self.logger.info(f"清理完成，删除了 {deleted_count} 个缓存（策略: {self.policy.strategy}）")
     
     def delete_cache(self, cache_key: str) -> bool:
         """删除指定缓存"""
-        try:
-            entry = self.index.get_entry(cache_key)
-            if entry:
-                file_path = Path(entry['file_path'])
-                if file_path.exists():
-                    file_path.unlink()
-                    self.logger.info(f"删除缓存文件: {file_path}")
+        return self._delete_entries([cache_key]) == 1
+    
+    def _delete_entries(self, keys: List[str]) -> int:
+        """
+        删除多个缓存条目的数据并批量移出索引
+        
+        Returns:
+            删除的条目数
+        """
+        with self._write_lock:
+            entries = self.index.get_all_entries()
+            keys = [key for key in dict.fromkeys(keys) if key in entries]
+            rewritten = {}  # 资产 -> 被重写的分区文件名
+            deleted = []
+            for key in keys:
+                entry = entries[key]
+                try:
+                    file_path = entry['file_path']
+                    if os.path.isdir(file_path):
+                        # 分区存储：只删除该条目日期范围内的数据
+                        start = date.fromisoformat(entry['start_date'])
+                        end = date.fromisoformat(entry['end_date'])
+                        asset = (entry['data_source'], entry['market'], entry['code'], entry['interval'])
+                        rewritten.setdefault(asset, set()).update(
+                            f.name for f in self.storage.partition_files(Path(file_path), start, end))
+                        self.storage.delete_range(Path(file_path), start, end)
+                        self.logger.debug(f"删除缓存数据: {file_path} ({entry['start_date']} ~ {entry['end_date']})")
+                    else:
+                        try:
+                            os.unlink(file_path)
+                            self.logger.debug(f"删除缓存文件: {file_path}")
+                        except FileNotFoundError:
+                            pass
+                    deleted.append(key)
+                except Exception as e:
+                    self.logger.error(f"删除缓存失败: {key}: {e}")
             
-            self.index.remove_entry(cache_key)
-            return True
-        except Exception as e:
-            self.logger.error(f"删除缓存失败: {e}")
-            return False
+            self.index.remove_entries(deleted)
+            if deleted:
+                self.logger.info(f"删除缓存: {len(deleted)} 个条目")
+            for (data_source, market, code, interval), names in rewritten.items():
+                self._invalidate_partition_checksums(data_source, market, code, interval, sorted(names))
+                self._refresh_partition_sizes(data_source, market, code, interval, sorted(names))
+            return len(deleted)
     
     def clear_all_cache(self):
         """清空所有缓存"""
-        self.logger.warning("清空所有缓存...")
-        entries = self.index.get_all_entries()
-        for key in list(entries.keys()):
-            self.delete_cache(key)
-        self.logger.info("所有缓存已清空")
+        with self._write_lock:
+            self.logger.warning("清空所有缓存...")
+            self._delete_entries(list(self.index.get_all_entries().keys()))
+            self.storage.memory.clear()
+            self.logger.info("所有缓存已清空")
     
     def get_statistics(self) -> dict:
         """获取缓存统计信息"""
@@ -454,23 +1179,68 @@ class CacheManager:
 
 
 class CacheIndex:
-    """缓存索引管理器"""
+    """
+    缓存索引管理器
+    
+    条目增删立即写入索引文件；访问记录（last_accessed、access_count）先在内存中累积，
+    达到 flush_every 次、距首次未保存的访问超过 flush_interval 秒或进程退出时再写入。
+    写入先写临时文件再替换，中途崩溃不会留下损坏的索引文件
+    
+    多进程共享：写入时持有锁文件 cache_index.lock，先重新加载其他进程写入的索引再修改；
+    读取时索引文件有变化（修改时间/大小/inode）则重新加载
+    """
     
-    def __init__(self, index_file: Path):
+    def __init__(self, index_file: Path, flush_interval: float = 30, flush_every: int = 100):
         """
         初始化索引管理器
         
         Args:
             index_file: 索引文件路径
+            flush_interval: 访问记录最长延迟写入秒数，0 表示不按时间写入
+            flush_every: 累积多少次访问后写入，1 表示每次访问都写入
         """
         self.index_file = index_file
         self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self._lock = threading.RLock()
+        self._file_lock = get_file_lock(self.index_file.with_suffix('.lock'))
+        self._pending = {}  # key -> (last_accessed, 未写入的访问次数)
+        self._pending_access = 0
+        self._timer = None
+        self._batch_depth = 0
+        self._dirty = False
+        self._token = self._file_token()
         self.data = self._load_index()
+        self._build_intervals()
     
-    def _load_index(self) -> dict:
-        """加载索引文件"""
-        if not self.index_file.exists():
-            return {
+    def _file_token(self) -> Optional[tuple]:
+        """索引文件的 (修改时间, 大小, inode)，不存在时为None"""
+        try:
+            stat = self.index_file.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+    
+    def _refresh(self):
+        """索引文件被其他进程修改过时重新加载，并重新应用本进程未写入的访问记录"""
+        with self._lock:
+            token = self._file_token()
+            if token == self._token:
+                return
+            self._token = token
+            self.data = self._load_index()
+            self._build_intervals()
+            for key, (last_accessed, count) in self._pending.items():
+                entry = self.data['entries'].get(key)
+                if entry is not None:
+                    entry['last_accessed'] = max(entry.get('last_accessed', ''), last_accessed)
+                    entry['access_count'] = entry.get('access_count', 0) + count
+    
+    @staticmethod
+    def _empty_index() -> dict:
+        """空索引"""
+        return {
                 "version": "1.0",
                 "last_update": "",
                 "entries": {},
@@ -481,55 +1251,269 @@ class CacheIndex:
                     "newest_entry": ""
                 }
             }
+    
+    def _load_index(self) -> dict:
+        """加载索引文件"""
+        if not self.index_file.exists():
+            return self._empty_index()
         
         try:
             with open(self.index_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
             print(f"加载索引文件失败: {e}")
-            return self._load_index()  # 返回默认值
+            return self._empty_index()
+    
+    @staticmethod
+    def _asset_of(entry: dict) -> tuple:
+        """条目所属资产 (数据源, 市场, 代码, 时间粒度)"""
+        return (entry.get('data_source'), entry.get('market'), entry.get('code'), entry.get('interval'))
+    
+    def _build_intervals(self):
+        """
+        构建内存区间索引：{资产: [(start_date, end_date, key), ...]}，按开始日期排序
+        
+        日期为 YYYY-MM-DD 字符串，字典序即日期顺序
+        """
+        self._intervals = {}
+        self._max_ends = {}
+        for key, entry in self.data['entries'].items():
+            self._intervals.setdefault(self._asset_of(entry), []).append(
+                (entry.get('start_date', ''), entry.get('end_date', ''), key)
+            )
+        for intervals in self._intervals.values():
+            intervals.sort()
+    
+    def _interval_of(self, key: str, entry: dict) -> tuple:
+        """条目在区间索引中的位置 (资产, (start_date, end_date, key))"""
+        return self._asset_of(entry), (entry.get('start_date', ''), entry.get('end_date', ''), key)
+    
+    def _index_interval(self, key: str, entry: dict):
+        """将条目加入区间索引"""
+        asset, item = self._interval_of(key, entry)
+        bisect.insort(self._intervals.setdefault(asset, []), item)
+        self._max_ends.pop(asset, None)
+    
+    def _unindex_interval(self, key: str, entry: dict):
+        """将条目移出区间索引"""
+        asset, item = self._interval_of(key, entry)
+        self._max_ends.pop(asset, None)
+        intervals = self._intervals.get(asset, [])
+        pos = bisect.bisect_left(intervals, item)
+        if pos < len(intervals) and intervals[pos] == item:
+            del intervals[pos]
+        if not intervals:
+            self._intervals.pop(asset, None)
+    
+    def _max_ends_of(self, asset: tuple, intervals: list) -> List[str]:
+        """资产区间索引的前缀最大结束日期（第i项为前i+1个条目中最晚的结束日期），区间变化后首次查找时重新计算"""
+        max_ends = self._max_ends.get(asset)
+        if max_ends is None:
+            max_ends = list(itertools.accumulate((item[1] for item in intervals), max))
+            self._max_ends[asset] = max_ends
+        return max_ends
     
     def _save_index(self):
-        """保存索引文件"""
-        try:
-            self.data['last_update'] = datetime.now().isoformat()
-            with open(self.index_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"保存索引文件失败: {e}")
+        """保存索引文件（原子替换），同时写入累积的访问记录（调用方需持有文件锁）"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending = {}
+            self._pending_access = 0
+            tmp_file = self.index_file.with_name(
+                f"{self.index_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                self.data['last_update'] = datetime.now().isoformat()
+                # 不缩进：一次性编码走 json 的C实现，数万条目时比逐块缩进写入快一个数量级
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps(self.data, ensure_ascii=False))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.index_file)
+                self._token = self._file_token()
+            except Exception as e:
+                print(f"保存索引文件失败: {e}")
+                if tmp_file.exists():
+                    tmp_file.unlink()
+    
+    def flush(self):
+        """写入内存中累积的访问记录"""
+        if not self._pending_access or not self.index_file.parent.exists():
+            return
+        with self._file_lock, self._lock:
+            self._refresh()
+            if self._pending_access:
+                self._save_index()
+    
+    def _schedule_flush(self):
+        """安排延迟写入（调用方需持有锁）"""
+        _pending_indexes.add(self)
+        if self._timer is not None or self.flush_interval <= 0:
+            return
+        self._timer = threading.Timer(self.flush_interval, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def _commit(self):
+        """条目增删后更新统计信息并写入索引；批量修改期间只做标记，结束时写入一次（调用方需持有锁）"""
+        if self._batch_depth:
+            self._dirty = True
+            return
+        self._update_statistics()
+        self._save_index()
+    
+    @contextmanager
+    def batch(self):
+        """
+        批量修改索引：期间的条目增删在结束时合并为一次索引写入
+        
+        期间持有索引文件锁，其他进程的索引写入会等待批量修改结束
+        """
+        with self._file_lock, self._lock:
+            self._refresh()
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._dirty:
+                    self._dirty = False
+                    self._update_statistics()
+                    self._save_index()
     
     def has_entry(self, key: str) -> bool:
         """检查是否存在指定缓存"""
+        self._refresh()
         return key in self.data['entries']
     
     def get_entry(self, key: str) -> Optional[dict]:
         """获取缓存条目"""
+        self._refresh()
         return self.data['entries'].get(key)
     
     def add_entry(self, key: str, metadata: dict):
         """添加缓存条目"""
-        self.data['entries'][key] = metadata
-        self._update_statistics()
-        self._save_index()
+        with self._file_lock, self._lock:
+            self._refresh()
+            old = self.data['entries'].get(key)
+            same_interval = old is not None and self._interval_of(key, old) == self._interval_of(key, metadata)
+            if old is not None and not same_interval:
+                self._unindex_interval(key, old)
+            self.data['entries'][key] = metadata
+            if not same_interval:
+                self._index_interval(key, metadata)
+            self._commit()
     
     def remove_entry(self, key: str):
         """删除缓存条目"""
-        if key in self.data['entries']:
-            del self.data['entries'][key]
-            self._update_statistics()
-            self._save_index()
+        with self._file_lock, self._lock:
+            self._refresh()
+            if key in self.data['entries']:
+                self._unindex_interval(key, self.data['entries'].pop(key))
+                self._commit()
+    
+    def remove_entries(self, keys: List[str]):
+        """批量删除缓存条目（只写入一次索引文件）"""
+        with self._file_lock, self._lock:
+            self._refresh()
+            removed = False
+            for key in keys:
+                if key in self.data['entries']:
+                    self._unindex_interval(key, self.data['entries'].pop(key))
+                    removed = True
+            if removed:
+                self._commit()
     
     def update_access(self, key: str):
-        """更新访问记录"""
-        if key in self.data['entries']:
-            self.data['entries'][key]['last_accessed'] = datetime.now().isoformat()
-            self.data['entries'][key]['access_count'] = self.data['entries'][key].get('access_count', 0) + 1
-            self._save_index()
+        """更新访问记录（在内存中累积，见类说明）"""
+        with self._lock:
+            entry = self.data['entries'].get(key)
+            if entry is None:
+                return
+            now = datetime.now().isoformat()
+            entry['last_accessed'] = now
+            entry['access_count'] = entry.get('access_count', 0) + 1
+            self._pending[key] = (now, self._pending.get(key, ('', 0))[1] + 1)
+            self._pending_access += 1
+            flush_now = self._pending_access >= self.flush_every
+            if not flush_now:
+                self._schedule_flush()
+        if flush_now:
+            self.flush()
     
     def get_all_entries(self) -> dict:
         """获取所有缓存条目"""
+        self._refresh()
         return self.data['entries']
     
+    def find_entries(self, data_source: str, market: str, code: str, interval: str) -> dict:
+        """获取同一资产（数据源、市场、代码、时间粒度）的所有缓存条目，按开始日期排序"""
+        self._refresh()
+        intervals = self._intervals.get((data_source, market, code, interval), [])
+        return {key: self.data['entries'][key] for _, _, key in intervals}
+    
+    def find_covering_entries(self, data_source: str, market: str, code: str, interval: str,
+                              start_date: date, end_date: date) -> List[Tuple[str, dict]]:
+        """
+        查找日期范围完全覆盖查询范围的缓存条目（只看元数据，不读文件）
+        
+        二分定位开始日期不晚于查询开始日期的条目（O(log n)），再从该位置向前按结束日期筛选；
+        前缀最大结束日期早于查询结束日期时更早的条目都不可能覆盖，扫描提前停止
+        （同一资产的条目互不重叠时，即分区存储合并后的常态，最多检查两个条目）
+        
+        Returns:
+            [(key, entry), ...]，日期跨度最小的在前
+        """
+        self._refresh()
+        asset = (data_source, market, code, interval)
+        intervals = self._intervals.get(asset)
+        if not intervals:
+            return []
+        
+        start_str = start_date.strftime('%Y-%m-%d')
+        end_str = end_date.strftime('%Y-%m-%d')
+        # (start_str, '\uffff') 排在所有开始日期为 start_str 的条目之后
+        stop = bisect.bisect_right(intervals, (start_str, '\uffff'))
+        max_ends = self._max_ends_of(asset, intervals)
+        # 结束日期越早、开始日期越晚，需要读取的数据越少（逆序遍历 + 稳定排序）
+        covering = []
+        for pos in range(stop - 1, -1, -1):
+            if max_ends[pos] < end_str:
+                break
+            if intervals[pos][1] >= end_str:
+                covering.append(intervals[pos])
+        covering.sort(key=lambda item: item[1])
+        return [(key, self.data['entries'][key]) for _, _, key in covering]
+    
+    def find_overlapping_entries(self, data_source: str, market: str, code: str, interval: str,
+                                 start_date: date, end_date: date) -> List[Tuple[str, dict]]:
+        """
+        查找日期范围与查询范围有交集的缓存条目（只看元数据，不读文件）
+        
+        与 find_covering_entries 相同：二分定位后向前扫描，前缀最大结束日期早于查询开始日期时停止
+        
+        Returns:
+            [(key, entry), ...]，按开始日期排序
+        """
+        self._refresh()
+        asset = (data_source, market, code, interval)
+        intervals = self._intervals.get(asset)
+        if not intervals:
+            return []
+        
+        start_str = start_date.strftime('%Y-%m-%d')
+        end_str = end_date.strftime('%Y-%m-%d')
+        stop = bisect.bisect_right(intervals, (end_str, '\uffff'))
+        max_ends = self._max_ends_of(asset, intervals)
+        overlapping = []
+        for pos in range(stop - 1, -1, -1):
+            if max_ends[pos] < start_str:
+                break
+            if intervals[pos][1] >= start_str:
+                overlapping.append(intervals[pos])
+        return [(key, self.data['entries'][key]) for _, _, key in reversed(overlapping)]
+    
     def _update_statistics(self):
         """更新统计信息"""
         entries = self.data['entries']
@@ -555,11 +1539,720 @@ class CacheIndex:
     
     def get_statistics(self) -> dict:
         """获取统计信息"""
+        self._refresh()
         return self.data['statistics']
 
 
+# 有未写入访问记录的JSON索引，进程退出时写入
+_pending_indexes = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_pending_indexes():
+    for index in list(_pending_indexes):
+        index.flush()
+
+
+_cache_indexes: Dict[str, CacheIndex] = {}
+_cache_indexes_lock = threading.Lock()
+
+
+def get_cache_index(index_file: Path, flush_interval: float = 30, flush_every: int = 100) -> CacheIndex:
+    """
+    获取索引文件对应的进程内共享 CacheIndex（写入设置以最近一次配置为准）
+    
+    每个代码各自创建 CacheManager 时，访问记录仍累积在同一个索引中，按 flush_every 次批量写入
+    """
+    path = str(Path(index_file).resolve())
+    with _cache_indexes_lock:
+        index = _cache_indexes.get(path)
+        if index is None:
+            index = _cache_indexes[path] = CacheIndex(Path(path), flush_interval, flush_every)
+        else:
+            index.index_file.parent.mkdir(parents=True, exist_ok=True)
+            index.flush_interval = flush_interval
+            index.flush_every = flush_every
+        return index
+
+
+class SQLiteCacheIndex:
+    """
+    SQLite缓存索引（可选后端）
+    
+    接口与 CacheIndex 一致。条目以 (data_source, market, code, interval) 及日期范围建立索引，
+    单条增删改查为 O(log n)，每次修改在事务中完成，访问记录只更新对应行
+    """
+    
+    _ENTRY_COLUMNS = ('data_source', 'market', 'code', 'interval', 'start_date', 'end_date',
+                      'file_path', 'file_size_kb', 'created_at')
+    
+    def __init__(self, db_file: Path, json_index_file: Optional[Path] = None):
+        """
+        初始化SQLite索引
+        
+        Args:
+            db_file: 数据库文件路径
+            json_index_file: 旧版JSON索引文件，首次创建数据库时自动迁移
+        """
+        self.db_file = db_file
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        import sqlite3  # 默认使用JSON索引，只在启用SQLite后端时导入
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        
+        if json_index_file is not None:
+            self._migrate_from_json(json_index_file)
+    
+    def _create_schema(self):
+        """创建表和索引"""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    data_source TEXT,
+                    market TEXT,
+                    code TEXT,
+                    interval TEXT,
+                    start_date TEXT,
+                    end_date TEXT,
+                    file_path TEXT,
+                    file_size_kb REAL DEFAULT 0,
+                    created_at TEXT,
+                    last_accessed TEXT,
+                    access_count INTEGER DEFAULT 0,
+                    metadata TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_entries_asset
+                ON entries (data_source, market, code, interval, start_date, end_date)
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_start ON entries (start_date)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_end ON entries (end_date)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (last_accessed)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+    
+    def _migrate_from_json(self, json_index_file: Path):
+        """从JSON索引一次性迁移（迁移完成后记录在meta表中，不再重复执行）"""
+        with self._lock:
+            migrated = self._conn.execute(
+                "SELECT value FROM meta WHERE name = 'migrated_from_json'"
+            ).fetchone()
+            if migrated is not None or not json_index_file.exists():
+                return
+            
+            try:
+                with open(json_index_file, 'r', encoding='utf-8') as f:
+                    entries = json.load(f).get('entries', {})
+            except Exception as e:
+                print(f"迁移JSON索引失败: {e}")
+                return
+            
+            with self._conn:
+                self._conn.executemany(self._UPSERT_SQL, [self._to_row(key, entry) for key, entry in entries.items()])
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('migrated_from_json', ?)",
+                    (datetime.now().isoformat(),)
+                )
+            print(f"已从JSON索引迁移 {len(entries)} 个缓存条目")
+    
+    _UPSERT_SQL = """
+        INSERT OR REPLACE INTO entries
+        (key, data_source, market, code, interval, start_date, end_date, file_path,
+         file_size_kb, created_at, last_accessed, access_count, metadata)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    
+    def _to_row(self, key: str, metadata: dict) -> tuple:
+        """缓存条目 -> 数据库行"""
+        return (
+            key,
+            *(metadata.get(col) for col in self._ENTRY_COLUMNS),
+            metadata.get('last_accessed'),
+            metadata.get('access_count', 0),
+            json.dumps(metadata, ensure_ascii=False)
+        )
+    
+    @staticmethod
+    def _to_entry(row: tuple) -> dict:
+        """数据库行 (metadata, last_accessed, access_count) -> 缓存条目"""
+        entry = json.loads(row[0])
+        entry['last_accessed'] = row[1]
+        entry['access_count'] = row[2]
+        return entry
+    
+    def has_entry(self, key: str) -> bool:
+        """检查是否存在指定缓存"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+    
+    def get_entry(self, key: str) -> Optional[dict]:
+        """获取缓存条目"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metadata, last_accessed, access_count FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        return self._to_entry(row) if row else None
+    
+    def add_entry(self, key: str, metadata: dict):
+        """添加缓存条目"""
+        with self._lock, self._conn:
+            self._conn.execute(self._UPSERT_SQL, self._to_row(key, metadata))
+    
+    def remove_entry(self, key: str):
+        """删除缓存条目"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+    
+    @contextmanager
+    def batch(self):
+        """与 CacheIndex 接口一致（每次增删各自提交事务，WAL 模式下提交开销很小）"""
+        with self._lock:
+            yield self
+    
+    def remove_entries(self, keys: List[str]):
+        """批量删除缓存条目（单个事务）"""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+    
+    def update_access(self, key: str):
+        """更新访问记录"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE entries SET last_accessed = ?, access_count = access_count + 1 WHERE key = ?",
+                (datetime.now().isoformat(), key)
+            )
+    
+    def flush(self):
+        """与 CacheIndex 接口一致（访问记录每次在事务中直接更新，无需写入）"""
+    
+    def get_all_entries(self) -> dict:
+        """获取所有缓存条目"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, metadata, last_accessed, access_count FROM entries"
+            ).fetchall()
+        return {row[0]: self._to_entry(row[1:]) for row in rows}
+    
+    def find_entries(self, data_source: str, market: str, code: str, interval: str) -> dict:
+        """获取同一资产（数据源、市场、代码、时间粒度）的所有缓存条目"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT key, metadata, last_accessed, access_count FROM entries
+                WHERE data_source = ? AND market = ? AND code = ? AND interval = ?
+                ORDER BY start_date
+                """,
+                (data_source, market, code, interval)
+            ).fetchall()
+        return {row[0]: self._to_entry(row[1:]) for row in rows}
+    
+    def find_covering_entries(self, data_source: str, market: str, code: str, interval: str,
+                              start_date: date, end_date: date) -> List[Tuple[str, dict]]:
+        """查找日期范围完全覆盖查询范围的缓存条目，日期跨度最小的在前"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT key, metadata, last_accessed, access_count FROM entries
+                WHERE data_source = ? AND market = ? AND code = ? AND interval = ?
+                  AND start_date <= ? AND end_date >= ?
+                ORDER BY end_date ASC, start_date DESC, key DESC
+                """,
+                (data_source, market, code, interval,
+                 start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+            ).fetchall()
+        return [(row[0], self._to_entry(row[1:])) for row in rows]
+    
+    def find_overlapping_entries(self, data_source: str, market: str, code: str, interval: str,
+                                 start_date: date, end_date: date) -> List[Tuple[str, dict]]:
+        """查找日期范围与查询范围有交集的缓存条目，按开始日期排序"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT key, metadata, last_accessed, access_count FROM entries
+                WHERE data_source = ? AND market = ? AND code = ? AND interval = ?
+                  AND start_date <= ? AND end_date >= ?
+                ORDER BY start_date, end_date, key
+                """,
+                (data_source, market, code, interval,
+                 end_date.strftime('%Y-%m-%d'), start_date.strftime('%Y-%m-%d'))
+            ).fetchall()
+        return [(row[0], self._to_entry(row[1:])) for row in rows]
+    
+    def get_statistics(self) -> dict:
+        """获取统计信息"""
+        with self._lock:
+            count, total_kb, oldest, newest = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(file_size_kb), 0), MIN(created_at), MAX(created_at) FROM entries"
+            ).fetchone()
+        return {
+            "total_entries": count,
+            "total_size_mb": round(total_kb / 1024, 2),
+            "oldest_entry": oldest or "",
+            "newest_entry": newest or ""
+        }
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+def _copy_on_write_enabled() -> bool:
+    """pandas 是否启用了写时复制（pandas >= 3.0 始终启用）"""
+    try:
+        if int(pd.__version__.split('.')[0]) >= 3:
+            return True
+        return pd.get_option('mode.copy_on_write') is True
+    except Exception:
+        return False
+
+
+def _date_bounds(tz, start_date: Optional[date] = None,
+                 end_date: Optional[date] = None) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+    """日期范围（含两端）-> 时间戳边界 [下界, 上界)，时区与数据索引一致"""
+    lower = pd.Timestamp(start_date, tz=tz) if start_date is not None else None
+    upper = pd.Timestamp(end_date + timedelta(days=1), tz=tz) if end_date is not None else None
+    return lower, upper
+
+
+def _date_range_mask(index: pd.DatetimeIndex, start_date: Optional[date] = None,
+                     end_date: Optional[date] = None) -> np.ndarray:
+    """索引是否落在日期范围内（在 datetime64 上比较，不构造 Python date 对象）"""
+    lower, upper = _date_bounds(index.tz, start_date, end_date)
+    mask = np.ones(len(index), dtype=bool)
+    if lower is not None:
+        mask &= np.asarray(index >= lower)
+    if upper is not None:
+        mask &= np.asarray(index < upper)
+    return mask
+
+
+def filter_date_range(data: pd.DataFrame, start_date: Optional[date] = None,
+                      end_date: Optional[date] = None) -> pd.DataFrame:
+    """
+    按日期范围过滤数据（含两端）
+
+    索引有序时二分查找切片，否则按布尔掩码过滤
+
+    Args:
+        data: 以DatetimeIndex为索引的数据
+        start_date: 开始日期，None 表示不限
+        end_date: 结束日期，None 表示不限
+
+    Returns:
+        过滤后的DataFrame
+    """
+    index = data.index
+    if not index.is_monotonic_increasing:
+        return data[_date_range_mask(index, start_date, end_date)]
+
+    lower, upper = _date_bounds(index.tz, start_date, end_date)
+    first = index.searchsorted(lower, side='left') if lower is not None else 0
+    last = index.searchsorted(upper, side='left') if upper is not None else len(index)
+    return data.iloc[first:last]
+
+
+# 紧凑数据类型（storage_format.dtypes = "compact"）
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+# 价格列转为 float32 时允许的最大绝对误差（远小于 0.01 最小变动单位的一半），超过时保持 float64
+COMPACT_PRICE_ATOL = 1e-3
+# 价格最小变动单位候选（从大到小）：价格都落在某个单位的整数倍上时，文件中按 int32 tick 数存储
+PRICE_TICKS = (0.01, 0.001, 0.0001)
+# 记录各列 tick 单位的 DataFrame.attrs 键（随 parquet / arrow_ipc 的 pandas 元数据保存）
+COMPACT_TICKS_ATTR = 'compact_ticks'
+
+
+def _compact_price(values: np.ndarray) -> np.ndarray:
+    """价格列：float32 往返误差在 COMPACT_PRICE_ATOL 以内时转为 float32（价格约 16000 以下）"""
+    values = np.asarray(values, dtype=np.float64)
+    as32 = values.astype(np.float32)
+    finite = np.isfinite(values)
+    error = np.abs(as32[finite].astype(np.float64) - values[finite])
+    if np.all(error <= COMPACT_PRICE_ATOL):
+        return as32
+    return values
+
+
+def _compact_volume(values: np.ndarray) -> np.ndarray:
+    """成交量列：非负整数时转为 uint64，否则（有小数、空值或负数）保持 float64"""
+    values = np.asarray(values)
+    if values.dtype.kind == 'u' or (values.dtype.kind == 'i' and (len(values) == 0 or values.min() >= 0)):
+        return values.astype(np.uint64)
+    values = values.astype(np.float64)
+    if len(values) == 0 or (np.all(np.isfinite(values)) and values.min() >= 0 and values.max() < 2 ** 53
+                            and np.all(values == np.floor(values))):
+        return values.astype(np.uint64)
+    return values
+
+
+def compact_ohlcv(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    转换为紧凑的 OHLCV 数据类型
+    
+    只保留 open/high/low/close/volume 列（按此顺序），价格列在精度允许时转为 float32，
+    成交量为非负整数时转为 uint64。内存占用约为 float64/int64 的一半。
+    
+    Args:
+        data: 标准化后的行情数据
+        
+    Returns:
+        新的DataFrame（索引不变）
+    """
+    columns = {}
+    for column in OHLCV_COLUMNS:
+        if column in data.columns:
+            values = data[column].to_numpy()
+            columns[column] = _compact_volume(values) if column == 'volume' else _compact_price(values)
+    compact = pd.DataFrame(columns, index=data.index)
+    compact.attrs = {k: v for k, v in data.attrs.items() if k != COMPACT_TICKS_ATTR}
+    return compact
+
+
+def is_compact(data: pd.DataFrame) -> bool:
+    """是否已是紧凑的 OHLCV 数据类型（只有 OHLCV 列，价格为 float32，成交量为 uint64）"""
+    return (list(data.columns) == [c for c in OHLCV_COLUMNS if c in data.columns]
+            and all(data[c].dtype == (np.uint64 if c == 'volume' else np.float32) for c in data.columns))
+
+
+def encode_price_ticks(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    写入文件前，把落在最小变动单位整数倍上的 float32 价格列转为 int32 tick 数
+    
+    各列的 tick 单位记录在 attrs[COMPACT_TICKS_ATTR]，读取时由 decode_price_ticks 还原
+    """
+    ticks = {}
+    encoded = {}
+    for column in PRICE_COLUMNS:
+        if column not in data.columns or data[column].dtype != np.float32 or data.empty:
+            continue
+        values = data[column].to_numpy(dtype=np.float64)
+        if not np.all(np.isfinite(values)):
+            continue
+        # 容差为 float32 的舍入误差
+        tolerance = np.abs(values) * 2.0 ** -23
+        for tick in PRICE_TICKS:
+            scaled = np.round(values / tick)
+            if np.abs(scaled).max() >= 2 ** 31:
+                break
+            if np.all(np.abs(values - scaled * tick) <= tolerance):
+                ticks[column] = tick
+                encoded[column] = scaled.astype(np.int32)
+                break
+    if not ticks:
+        return data
+    result = data.assign(**encoded)
+    result.attrs = {**data.attrs, COMPACT_TICKS_ATTR: ticks}
+    return result
+
+
+def decode_price_ticks(data: pd.DataFrame) -> pd.DataFrame:
+    """把 encode_price_ticks 写入的 int32 tick 数还原为 float32 价格"""
+    ticks = data.attrs.get(COMPACT_TICKS_ATTR)
+    if not ticks:
+        return data
+    decoded = data.assign(**{
+        column: (data[column].to_numpy(dtype=np.float64) * tick).astype(np.float32)
+        for column, tick in ticks.items() if column in data.columns
+    })
+    decoded.attrs = {k: v for k, v in data.attrs.items() if k != COMPACT_TICKS_ATTR}
+    return decoded
+
+
+class FileLock:
+    """
+    跨进程文件锁（排他、可重入）
+    
+    进程内的线程之间由 RLock 互斥，进程之间由锁文件互斥（POSIX 使用 fcntl.flock，
+    Windows 使用 msvcrt.locking）。同一锁文件在进程内共享一个实例，见 get_file_lock
+    """
+    
+    def __init__(self, lock_file: Path):
+        """
+        初始化文件锁
+        
+        Args:
+            lock_file: 锁文件路径（不存在时自动创建）
+        """
+        self.lock_file = lock_file
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+    
+    def acquire(self):
+        """获取锁（阻塞）"""
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._fd = self._lock_file()
+            except Exception:
+                self._lock.release()
+                raise
+        self._depth += 1
+    
+    def release(self):
+        """释放锁"""
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                if os.name == 'nt':
+                    import msvcrt
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+                else:
+                    import fcntl
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        self._lock.release()
+    
+    def _lock_file(self) -> int:
+        """打开锁文件并加锁，返回文件描述符"""
+        self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.lock_file), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK 重试约10秒后仍未获得锁，继续等待
+            else:
+                import fcntl
+                fcntl.flock(fd, fcntl.LOCK_EX)
+        except Exception:
+            os.close(fd)
+            raise
+        return fd
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc):
+        self.release()
+
+
+_file_locks: Dict[str, FileLock] = {}
+_file_locks_lock = threading.Lock()
+
+
+def get_file_lock(lock_file: Path) -> FileLock:
+    """获取锁文件对应的进程内共享 FileLock"""
+    path = str(Path(lock_file).resolve())
+    with _file_locks_lock:
+        if path not in _file_locks:
+            _file_locks[path] = FileLock(Path(path))
+        return _file_locks[path]
+
+
+class MemoryCache:
+    """
+    进程内内存缓存层 - 位于文件读取之前
+    
+    以文件路径（及读取的日期范围）为键，记录文件的修改时间和大小，文件被重写后自动失效；
+    按DataFrame占用字节数做LRU淘汰。进程内所有 CacheStorage 共享同一实例
+    """
+    
+    def __init__(self, max_bytes: int):
+        """
+        初始化内存缓存
+        
+        Args:
+            max_bytes: 最大占用字节数，0 表示禁用
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # (path, part) -> (mtime_ns, size, DataFrame, nbytes)
+        self._parts = {}  # path -> {part, ...}
+        self._lock = threading.Lock()
+        self._copy_on_write = _copy_on_write_enabled()
+    
+    @staticmethod
+    def _file_key(file_path: Path) -> Tuple[str, int, int]:
+        """文件路径、修改时间、文件大小"""
+        stat = file_path.stat()
+        return str(file_path.resolve()), stat.st_mtime_ns, stat.st_size
+    
+    def _view(self, df: pd.DataFrame) -> pd.DataFrame:
+        """返回调用方可随意修改、不影响缓存的DataFrame"""
+        # 写时复制下浅拷贝即可，修改时才会复制底层数据
+        return df.copy(deep=not self._copy_on_write)
+    
+    def get(self, file_path: Path, part: Optional[tuple] = None) -> Optional[pd.DataFrame]:
+        """
+        获取缓存的DataFrame
+        
+        Args:
+            file_path: 文件路径
+            part: 只读取了部分数据时的日期范围，None 表示整个文件
+        
+        Returns:
+            DataFrame或None（未缓存或文件已变化）
+        """
+        if self.max_bytes <= 0:
+            return None
+        
+        path, mtime_ns, size = self._file_key(file_path)
+        with self._lock:
+            item = self._items.get((path, part))
+            if item is None or item[0] != mtime_ns or item[1] != size:
+                if item is not None:
+                    self._discard(path)
+                self.misses += 1
+                return None
+            self._items.move_to_end((path, part))
+            self.hits += 1
+            df = item[2]
+        return self._view(df)
+    
+    def get_range(self, file_path: Path, part: tuple) -> Optional[pd.DataFrame]:
+        """
+        获取文件中一个日期范围的数据（只计一次命中或未命中）
+        
+        已缓存整个文件时从中过滤，否则使用缓存的该范围读取结果
+        
+        Args:
+            file_path: 文件路径
+            part: 日期范围 (start_date, end_date)
+        
+        Returns:
+            范围内的DataFrame或None（未缓存或文件已变化）
+        """
+        if self.max_bytes <= 0:
+            return None
+        
+        path, mtime_ns, size = self._file_key(file_path)
+        with self._lock:
+            found = None
+            for key in ((path, None), (path, part)):
+                item = self._items.get(key)
+                if item is None:
+                    continue
+                if item[0] != mtime_ns or item[1] != size:
+                    # 文件已变化，该文件的所有缓存项失效
+                    self._discard(path)
+                    break
+                found = key
+                break
+            if found is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(found)
+            self.hits += 1
+            df = item[2]
+        if found[1] is None:
+            return filter_date_range(self._view(df), *part)
+        return self._view(df)
+    
+    def put(self, file_path: Path, df: pd.DataFrame, part: Optional[tuple] = None):
+        """缓存从文件读取的DataFrame（part 同 get）"""
+        if self.max_bytes <= 0:
+            return
+        
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        
+        path, mtime_ns, size = self._file_key(file_path)
+        stored = self._view(df)
+        with self._lock:
+            self._discard_item((path, part))
+            self._items[(path, part)] = (mtime_ns, size, stored, nbytes)
+            self._parts.setdefault(path, set()).add(part)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                self._discard_item(next(iter(self._items)))
+    
+    def discard(self, file_path: Path):
+        """移除指定文件的缓存（包括部分读取的缓存）"""
+        with self._lock:
+            self._discard(str(file_path.resolve()))
+    
+    def _discard(self, path: str):
+        """移除文件的所有缓存项（调用方需持有锁）"""
+        for part in list(self._parts.get(path, ())):
+            self._discard_item((path, part))
+    
+    def _discard_item(self, key: tuple):
+        """移除单个缓存项（调用方需持有锁）"""
+        item = self._items.pop(key, None)
+        if item is None:
+            return
+        self.current_bytes -= item[3]
+        path, part = key
+        parts = self._parts.get(path)
+        if parts is not None:
+            parts.discard(part)
+            if not parts:
+                del self._parts[path]
+    
+    def clear(self):
+        """清空内存缓存"""
+        with self._lock:
+            self._items.clear()
+            self._parts.clear()
+            self.current_bytes = 0
+    
+    def get_statistics(self) -> dict:
+        """获取统计信息"""
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "size_mb": round(self.current_bytes / 1024 / 1024, 2),
+                "max_size_mb": round(self.max_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+_memory_cache: Optional[MemoryCache] = None
+_memory_cache_lock = threading.Lock()
+
+
+def get_memory_cache(max_size_mb: float = 256) -> MemoryCache:
+    """获取进程内共享的内存缓存（容量以最近一次配置为准）"""
+    global _memory_cache
+    with _memory_cache_lock:
+        if _memory_cache is None:
+            _memory_cache = MemoryCache(int(max_size_mb * 1024 * 1024))
+        else:
+            _memory_cache.max_bytes = int(max_size_mb * 1024 * 1024)
+        return _memory_cache
+
+
 class CacheStorage:
-    """缓存存储层 - 负责文件读写"""
+    """
+    缓存存储层 - 负责文件读写
+    
+    文件格式（storage_format.format）：parquet、csv、arrow_ipc（Arrow IPC/Feather 文件，
+    不压缩，读取时内存映射，数值列零拷贝转换为DataFrame）
+    
+    两种布局（storage_format.layout）：
+    - partitioned: 每个资产一个数据集目录 data/{数据源}/{市场}/{代码}/{时间粒度}/，
+      按年或月（storage_format.partition_by）分区，新数据按时间戳合并写入对应分区
+    - range: 每个查询范围一个文件 data/{数据源}/{市场}/{代码}_{开始}_{结束}.parquet（旧版布局）
+    
+    parquet 行组和 arrow_ipc 记录批次按时间切分（日内数据按月、日线按年），
+    按日期范围读取时根据每组的时间戳最小/最大值跳过范围外的数据
+    
+    数据类型（storage_format.dtypes）：
+    - float64: 按原样保存（默认）
+    - compact: 写入时转为紧凑的 OHLCV 列（见 compact_ohlcv），parquet / arrow_ipc 文件中
+      落在最小变动单位上的价格按 int32 tick 数存储，读取时还原为 float32 价格、uint64 成交量
+    """
+    
+    # 存储格式 -> 文件扩展名
+    EXTENSIONS = {'parquet': 'parquet', 'csv': 'csv', 'arrow_ipc': 'arrow'}
     
     def __init__(self, data_dir: Path, config: dict):
         """
@@ -573,6 +2266,11 @@ class CacheStorage:
         self.config = config
         self.format = config.get('storage_format', {}).get('format', 'parquet')
         self.compression = config.get('storage_format', {}).get('compression', 'snappy')
+        self.extension = self.EXTENSIONS.get(self.format, self.format)
+        self.layout = config.get('storage_format', {}).get('layout', 'range')
+        self.partition_by = config.get('storage_format', {}).get('partition_by', 'year')
+        self.dtypes = config.get('storage_format', {}).get('dtypes', 'float64')
+        self.memory = get_memory_cache(config.get('cache_settings', {}).get('memory_cache_mb', 256))
     
     def save(self, data: pd.DataFrame, data_source: str, market: str, code: str,
              start_date: date, end_date: date, interval: str) -> Optional[Path]:
@@ -580,9 +2278,12 @@ class CacheStorage:
         保存数据到文件
         
         Returns:
-            文件路径或None
+            文件路径（partitioned 布局为数据集目录）或None
         """
         try:
+            if self.layout == 'partitioned':
+                return self._save_partitioned(data, self.dataset_dir(data_source, market, code, interval))
+            
             # 构建文件路径
             subdir = self.data_dir / data_source / market
             subdir.mkdir(parents=True, exist_ok=True)
@@ -592,19 +2293,14 @@ class CacheStorage:
             end_str = end_date.strftime('%Y%m%d')
             
             if interval == '1d':
-                filename = f"{code}_{start_str}_{end_str}.{self.format}"
+                filename = f"{code}_{start_str}_{end_str}.{self.extension}"
             else:
-                filename = f"{code}_{start_str}_{end_str}_{interval}.{self.format}"
+                filename = f"{code}_{start_str}_{end_str}_{interval}.{self.extension}"
             
             file_path = subdir / filename
             
             # 保存文件
-            if self.format == 'parquet':
-                data.to_parquet(file_path, compression=self.compression)
-            elif self.format == 'csv':
-                data.to_csv(file_path)
-            else:
-                raise ValueError(f"不支持的存储格式: {self.format}")
+            self._write_file(data, file_path)
             
             return file_path
             
@@ -614,35 +2310,368 @@ class CacheStorage:
             traceback.print_exc()
             return None
     
-    def load(self, file_path: Path) -> Optional[pd.DataFrame]:
+    def load(self, file_path: Path, start_date: Optional[date] = None,
+             end_date: Optional[date] = None) -> Optional[pd.DataFrame]:
         """
-        从文件加载数据
+        从文件加载数据（优先使用内存缓存，文件未变化时不读磁盘）
         
         Args:
-            file_path: 文件路径
+            file_path: 文件路径或数据集目录
+            start_date: 开始日期，数据集目录只读取与日期范围相交的分区，
+                        文件内只读取与日期范围相交的行组
+            end_date: 结束日期
             
         Returns:
-            DataFrame或None
+            DataFrame或None（指定日期范围时只包含范围内的数据）
         """
         try:
             if not file_path.exists():
                 return None
             
-            if file_path.suffix == '.parquet':
-                return pd.read_parquet(file_path)
-            elif file_path.suffix == '.csv':
-                df = pd.read_csv(file_path, index_col=0, parse_dates=True)
-                return df
-            else:
-                raise ValueError(f"不支持的文件格式: {file_path.suffix}")
+            if file_path.is_dir():
+                frames = []
+                for f in self.partition_files(file_path, start_date, end_date):
+                    first_day, last_day = self._partition_span(f.stem)
+                    if ((start_date is None or first_day >= start_date) and
+                            (end_date is None or last_day <= end_date)):
+                        # 整个分区都在范围内
+                        frames.append(self._read_file(f))
+                    else:
+                        frames.append(self._read_file(f, start_date, end_date))
+                frames = [df for df in frames if df is not None]
+                if not frames:
+                    return None
+                return pd.concat(frames) if len(frames) > 1 else frames[0]
+            
+            return self._read_file(file_path, start_date, end_date)
                 
         except Exception as e:
             print(f"加载文件失败: {e}")
             return None
+    
+    def dataset_dir(self, data_source: str, market: str, code: str, interval: str) -> Path:
+        """资产的数据集目录"""
+        return self.data_dir / data_source / market / code / interval
+    
+    def partition_files(self, dataset_dir: Path, start_date: Optional[date] = None,
+                        end_date: Optional[date] = None) -> List[Path]:
+        """
+        数据集目录下与日期范围相交的分区文件（按时间排序）
+        
+        分区文件名为 YYYY 或 YYYY-MM
+        """
+        files = []
+        for file_path in sorted(dataset_dir.iterdir()):
+            if file_path.suffix.lstrip('.') not in self.EXTENSIONS.values():
+                continue
+            first_day, last_day = self._partition_span(file_path.stem)
+            if start_date is not None and last_day < start_date:
+                continue
+            if end_date is not None and first_day > end_date:
+                continue
+            files.append(file_path)
+        return files
+    
+    def range_size(self, dataset_dir: Path, start_date: date, end_date: date) -> float:
+        """
+        数据集中日期范围内的数据占用的磁盘大小（字节）
+        
+        完全在范围内的分区计整个文件；部分相交的分区可能被多个条目共用，按范围内行数的占比计算，
+        使各条目记录的大小之和不重复计算共用的分区
+        """
+        total = 0.0
+        for file_path in self.partition_files(dataset_dir, start_date, end_date):
+            size = file_path.stat().st_size
+            first_day, last_day = self._partition_span(file_path.stem)
+            if first_day < start_date or last_day > end_date:
+                # 直接读取（不放入内存缓存），最多只有首尾两个分区
+                df = self._read_whole(file_path)
+                if df is None or df.empty:
+                    continue
+                size *= np.count_nonzero(_date_range_mask(df.index, start_date, end_date)) / len(df)
+            total += size
+        return total
+    
+    def delete_range(self, dataset_dir: Path, start_date: date, end_date: date):
+        """删除数据集中日期范围内的数据，空分区和空目录一并删除"""
+        for file_path in self.partition_files(dataset_dir, start_date, end_date):
+            df = self._read_file(file_path)
+            self.memory.discard(file_path)
+            if df is not None:
+                df = df[~_date_range_mask(df.index, start_date, end_date)]
+            if df is None or df.empty:
+                file_path.unlink()
+            else:
+                self._write_file(df, file_path)
+        
+        if dataset_dir.exists() and not any(dataset_dir.iterdir()):
+            dataset_dir.rmdir()
+    
+    def _save_partitioned(self, data: pd.DataFrame, dataset_dir: Path) -> Path:
+        """按分区合并写入数据集，时间戳重复时以新数据为准"""
+        dataset_dir.mkdir(parents=True, exist_ok=True)
+        
+        if self.partition_by == 'month':
+            keys = data.index.strftime('%Y-%m')
+        else:
+            keys = data.index.strftime('%Y')
+        
+        for key, part in data.groupby(keys, sort=True):
+            file_path = dataset_dir / f"{key}.{self.extension}"
+            # 同一分区可能以其他格式存在（修改了 storage_format.format），一并合并
+            existing_files = [dataset_dir / f"{key}.{ext}" for ext in self.EXTENSIONS.values()]
+            existing_files = [f for f in existing_files if f.exists()]
+            existing = [self._read_file(f) for f in existing_files]
+            existing = [df for df in existing if df is not None and not df.empty]
+            if existing:
+                part = pd.concat(existing + [part])
+                part = part[~part.index.duplicated(keep='last')].sort_index()
+            self._write_file(part, file_path)
+            for old_path in existing_files:
+                if old_path != file_path:
+                    self.memory.discard(old_path)
+                    old_path.unlink()
+        
+        return dataset_dir
+    
+    @staticmethod
+    def _partition_span(stem: str) -> Tuple[date, date]:
+        """分区覆盖的日期范围"""
+        if len(stem) == 7:
+            first_day = datetime.strptime(stem, '%Y-%m').date()
+            next_month = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1)
+            return first_day, next_month - timedelta(days=1)
+        year = int(stem)
+        return date(year, 1, 1), date(year, 12, 31)
+    
+    def _write_file(self, data: pd.DataFrame, file_path: Path):
+        """
+        写入单个文件
+        
+        先写临时文件再替换：已被内存映射的旧文件保持不变，正在使用它的DataFrame不受影响
+        """
+        self.memory.discard(file_path)
+        if self.dtypes == 'compact':
+            data = compact_ohlcv(data)
+            if self.format in ('parquet', 'arrow_ipc'):
+                data = encode_price_ticks(data)
+        # 临时文件名包含进程和线程ID，多个写入者互不覆盖
+        tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            if self.format == 'parquet':
+                self._write_parquet(data, tmp_path, self.compression)
+            elif self.format == 'csv':
+                data.to_csv(tmp_path)
+            elif self.format == 'arrow_ipc':
+                self._write_arrow_ipc(data, tmp_path)
+            else:
+                raise ValueError(f"不支持的存储格式: {self.format}")
+            os.replace(tmp_path, file_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+    
+    @staticmethod
+    def _row_group_bounds(index: pd.Index) -> List[int]:
+        """
+        行组切分位置：日内数据每月一组，日线及以上每年一组
+        
+        Returns:
+            切分位置列表 [0, ..., len(index)]，相邻两项为一组
+        """
+        if (not isinstance(index, pd.DatetimeIndex) or len(index) < 2
+                or not index.is_monotonic_increasing):
+            return [0, len(index)]
+        
+        if (index[1:] - index[:-1]).median() < pd.Timedelta(days=1):
+            keys = np.asarray(index.year * 100 + index.month)
+        else:
+            keys = np.asarray(index.year)
+        cuts = np.flatnonzero(np.diff(keys)) + 1
+        return [0, *cuts.tolist(), len(index)]
+    
+    @classmethod
+    def _write_parquet(cls, data: pd.DataFrame, file_path: Path, compression: Optional[str]):
+        """写入 parquet 文件，按时间切分行组"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        table = pa.Table.from_pandas(data)
+        bounds = cls._row_group_bounds(data.index)
+        with pq.ParquetWriter(str(file_path), table.schema, compression=compression) as writer:
+            if len(bounds) == 2:
+                writer.write_table(table)
+                return
+            for first, last in zip(bounds[:-1], bounds[1:]):
+                writer.write_table(table.slice(first, last - first))
+    
+    @classmethod
+    def _write_arrow_ipc(cls, data: pd.DataFrame, file_path: Path):
+        """写入 Arrow IPC 文件（不压缩，便于内存映射零拷贝读取），按时间切分记录批次"""
+        import pyarrow as pa
+        import pyarrow.ipc
+        
+        table = pa.Table.from_pandas(data, preserve_index=True)
+        bounds = cls._row_group_bounds(data.index)
+        with pa.OSFile(str(file_path), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                for first, last in zip(bounds[:-1], bounds[1:]):
+                    writer.write_table(table.slice(first, last - first))
+    
+    @staticmethod
+    def _open_arrow_ipc(file_path: Path):
+        """
+        打开 Arrow IPC 文件
+        
+        非Windows系统使用内存映射，无空值的数值列直接引用映射内存（零拷贝）；
+        Windows 下被映射的文件无法替换，改为读入内存
+        """
+        import pyarrow as pa
+        import pyarrow.ipc
+        
+        if os.name == 'nt':
+            with pa.OSFile(str(file_path), 'rb') as source:
+                return pa.ipc.open_file(pa.BufferReader(source.read_buffer()))
+        return pa.ipc.open_file(pa.memory_map(str(file_path), 'r'))
+    
+    @classmethod
+    def _read_arrow_ipc(cls, file_path: Path) -> pd.DataFrame:
+        """读取整个 Arrow IPC 文件"""
+        return cls._open_arrow_ipc(file_path).read_all().to_pandas(split_blocks=True)
+    
+    @staticmethod
+    def _index_column(schema) -> Optional[str]:
+        """pandas 写入的时间索引列名（没有则返回None）"""
+        import pyarrow as pa
+        
+        index_columns = (schema.pandas_metadata or {}).get('index_columns', [])
+        if len(index_columns) != 1 or not isinstance(index_columns[0], str):
+            return None
+        name = index_columns[0]
+        if schema.get_field_index(name) < 0 or not pa.types.is_timestamp(schema.field(name).type):
+            return None
+        return name
+    
+    @staticmethod
+    def _overlaps(lower: Optional[pd.Timestamp], upper: Optional[pd.Timestamp], min_value, max_value) -> bool:
+        """时间戳区间 [min_value, max_value] 是否与 [lower, upper) 相交（缺少统计信息时视为相交）"""
+        if min_value is None or max_value is None:
+            return True
+        if lower is not None and pd.Timestamp(max_value) < lower:
+            return False
+        if upper is not None and pd.Timestamp(min_value) >= upper:
+            return False
+        return True
+    
+    def _read_range(self, file_path: Path, start_date: Optional[date],
+                    end_date: Optional[date]) -> Optional[pd.DataFrame]:
+        """
+        只读取与日期范围相交的行组/记录批次
+        
+        Returns:
+            DataFrame（可能包含范围边界外的行）；无法跳过任何行组时返回None，由调用方读取整个文件
+        """
+        if file_path.suffix == '.parquet':
+            import pyarrow.parquet as pq
+            
+            parquet_file = pq.ParquetFile(file_path)
+            column = self._index_column(parquet_file.schema_arrow)
+            if column is None or parquet_file.num_row_groups < 2:
+                return None
+            lower, upper = _date_bounds(parquet_file.schema_arrow.field(column).type.tz, start_date, end_date)
+            column_index = parquet_file.metadata.schema.names.index(column)
+            row_groups = []
+            for i in range(parquet_file.num_row_groups):
+                stats = parquet_file.metadata.row_group(i).column(column_index).statistics
+                has_stats = stats is not None and stats.has_min_max
+                if self._overlaps(lower, upper, stats.min if has_stats else None, stats.max if has_stats else None):
+                    row_groups.append(i)
+            if len(row_groups) == parquet_file.num_row_groups:
+                return None
+            return self._decode(parquet_file.read_row_groups(row_groups).to_pandas())
+        
+        if file_path.suffix == '.arrow':
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            
+            reader = self._open_arrow_ipc(file_path)
+            column = self._index_column(reader.schema)
+            if column is None or reader.num_record_batches < 2:
+                return None
+            lower, upper = _date_bounds(reader.schema.field(column).type.tz, start_date, end_date)
+            batches = []
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                min_max = pc.min_max(batch.column(column))
+                if self._overlaps(lower, upper, min_max['min'].as_py(), min_max['max'].as_py()):
+                    batches.append(batch)
+            if len(batches) == reader.num_record_batches:
+                return None
+            return self._decode(pa.Table.from_batches(batches, schema=reader.schema).to_pandas(split_blocks=True))
+        
+        return None
+    
+    def _read_file(self, file_path: Path, start_date: Optional[date] = None,
+                   end_date: Optional[date] = None) -> Optional[pd.DataFrame]:
+        """
+        读取单个文件（先查内存缓存）
+        
+        指定日期范围时只读取相交的行组，并缓存该范围的结果；返回的数据只包含范围内的行
+        """
+        if start_date is None and end_date is None:
+            df = self.memory.get(file_path)
+            if df is not None:
+                return df
+            df = self._read_whole(file_path)
+            self.memory.put(file_path, df)
+            return df
+        
+        part = (start_date, end_date)
+        df = self.memory.get_range(file_path, part)
+        if df is not None:
+            return df
+        
+        df = self._read_range(file_path, start_date, end_date)
+        if df is None:
+            # 所有行组都与范围相交，读取并缓存整个文件
+            df = self._read_whole(file_path)
+            self.memory.put(file_path, df)
+            return filter_date_range(df, start_date, end_date)
+        
+        df = filter_date_range(df, start_date, end_date)
+        self.memory.put(file_path, df, part)
+        return df
+    
+    def _read_whole(self, file_path: Path) -> pd.DataFrame:
+        """读取整个文件"""
+        if file_path.suffix == '.parquet':
+            return self._decode(pd.read_parquet(file_path))
+        elif file_path.suffix == '.csv':
+            return self._decode(pd.read_csv(file_path, index_col=0, parse_dates=True))
+        elif file_path.suffix == '.arrow':
+            return self._decode(self._read_arrow_ipc(file_path))
+        raise ValueError(f"不支持的文件格式: {file_path.suffix}")
+    
+    def _decode(self, df: pd.DataFrame) -> pd.DataFrame:
+        """还原文件中的 tick 编码；compact 模式下 csv 等不保存数据类型的文件读取后重新转换"""
+        df = decode_price_ticks(df)
+        if self.dtypes == 'compact' and not is_compact(df):
+            return compact_ohlcv(df)
+        return df
 
 
 class CachePolicy:
-    """缓存策略管理器 - 负责TTL和清理策略"""
+    """
+    缓存策略管理器 - 负责TTL和清理策略
+    
+    清理策略（cleanup_policy.strategy）：
+    - lru: 最久未访问的先淘汰
+    - lfu: 访问次数最少的先淘汰，次数相同时最久未访问的先淘汰
+    - hybrid: 先淘汰冷数据（超过 unused_days_threshold 天未访问且访问次数少于 min_access_count），
+      其余按 LRU
+    """
+    
+    STRATEGIES = ('lru', 'lfu', 'hybrid')
     
     def __init__(self, config: dict):
         """
@@ -652,6 +2681,57 @@ class CachePolicy:
             config: 配置字典
         """
         self.config = config
+        cleanup_policy = config.get('cleanup_policy', {})
+        self.strategy = cleanup_policy.get('strategy', 'lru')
+        if self.strategy not in self.STRATEGIES:
+            print(f"未知的清理策略: {self.strategy}，使用 lru")
+            self.strategy = 'lru'
+        self.unused_days_threshold = cleanup_policy.get('unused_days_threshold', 30)
+        self.min_access_count = cleanup_policy.get('min_access_count', 3)
+    
+    def select_evictions(self, entries: dict, kb_to_free: float, exclude: Optional[set] = None) -> List[str]:
+        """
+        按清理策略选出需要淘汰的条目
+        
+        对所有条目建小顶堆（O(n)），依次弹出优先级最低的条目（每次 O(log n)），
+        累计释放的大小达到 kb_to_free 即停止
+        
+        Args:
+            entries: {key: entry}
+            kb_to_free: 需要释放的大小（KB）
+            exclude: 不参与淘汰的键（如已过期、会被单独删除的条目）
+            
+        Returns:
+            淘汰顺序的键列表
+        """
+        if kb_to_free <= 0:
+            return []
+        
+        exclude = exclude or set()
+        cutoff = (datetime.now() - timedelta(days=self.unused_days_threshold)).isoformat()
+        heap = []
+        for key, entry in entries.items():
+            if key in exclude:
+                continue
+            last_accessed = entry.get('last_accessed') or entry.get('created_at') or ''
+            access_count = entry.get('access_count', 0)
+            if self.strategy == 'lfu':
+                priority = (access_count, last_accessed)
+            elif self.strategy == 'hybrid':
+                cold = last_accessed < cutoff and access_count < self.min_access_count
+                priority = (not cold, last_accessed)
+            else:
+                priority = (last_accessed,)
+            heap.append((priority, key))
+        heapq.heapify(heap)
+        
+        selected = []
+        freed_kb = 0.0
+        while heap and freed_kb < kb_to_free:
+            _, key = heapq.heappop(heap)
+            selected.append(key)
+            freed_kb += entries[key].get('file_size_kb', 0)
+        return selected
     
     def is_expired(self, entry: dict) -> bool:
         """
@@ -669,7 +2749,7 @@ class CachePolicy:
             if not end_date_str:
                 return True
             
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+            end_date = date.fromisoformat(end_date_str)
             today = date.today()
             days_diff = (today - end_date).days
             
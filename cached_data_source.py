@@ -4,9 +4,36 @@
 """
 
 import pandas as pd
-from typing import Optional
+from typing import Callable, Optional, Dict, List, Tuple
 import datetime
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from cache_manager import CacheManager
+from rate_limiter import SOURCE_CONCURRENCY
+
+
+# 缓存目录中的市场名称 -> 数据源接口使用的市场名称（增量刷新时使用）
+MARKET_NAMES = {
+    'a_stock': 'A股',
+    'hk_stock': '港股',
+    'us_stock': '美股',
+    'convertible_bond': '可转债',
+    'crypto': '加密货币',
+    'stock_1d': 'stock'
+}
+
+_source_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+def _get_source_semaphore(source_type: str) -> threading.BoundedSemaphore:
+    """获取数据源的并发信号量"""
+    with _semaphores_lock:
+        if source_type not in _source_semaphores:
+            limit = SOURCE_CONCURRENCY.get(source_type, SOURCE_CONCURRENCY['unknown'])
+            _source_semaphores[source_type] = threading.BoundedSemaphore(limit)
+        return _source_semaphores[source_type]
 
 
 class CachedDataSourceWrapper:
@@ -49,7 +76,8 @@ class CachedDataSourceWrapper:
         查询流程：
         1. 先查缓存
         2. 缓存命中 -> 返回缓存数据
-        3. 缓存未命中 -> 调用原始数据源获取数据 -> 保存到缓存 -> 返回数据
+        3. 缓存部分命中 -> 只从原始数据源获取缺失区间 -> 与缓存合并保存 -> 返回拼接后的数据
+        4. 缓存未命中 -> 调用原始数据源获取数据 -> 保存到缓存 -> 返回数据
         
         Args:
             code: 股票/资产代码
@@ -68,7 +96,7 @@ class CachedDataSourceWrapper:
         market_normalized = self._normalize_market_name(market)
         
         # 1. 先查缓存
-        cached_data = self.cache_manager.get_data(
+        cached_data, missing_ranges = self.cache_manager.get_data_with_gaps(
             data_source=self.source_type,
             market=market_normalized,
             code=code,
@@ -78,14 +106,18 @@ class CachedDataSourceWrapper:
         )
         
         if cached_data is not None and not cached_data.empty:
-            print(f"🎯 使用缓存数据: {code} ({len(cached_data)} 条记录)")
-            return cached_data
+            if not missing_ranges:
+                print(f"🎯 使用缓存数据: {code} ({len(cached_data)} 条记录)")
+                return cached_data
+            
+            # 2. 部分命中，只获取缺失区间
+            return self._fill_gaps(code, cached_data, missing_ranges, market_normalized, interval, **kwargs)
         
-        # 2. 缓存未命中，调用原始数据源
+        # 3. 缓存未命中，调用原始数据源
         print(f"🌐 从API获取数据: {code}")
         data = self.data_source.fetch_data(code, start_date, end_date, **kwargs)
         
-        # 3. 保存到缓存
+        # 4. 保存到缓存
         if data is not None and not data.empty:
             success = self.cache_manager.save_data(
                 data=data,
@@ -102,22 +134,404 @@ class CachedDataSourceWrapper:
         
         return data
     
+    def _fill_gaps(self, code: str, cached_data: pd.DataFrame, missing_ranges: List[Tuple[datetime.date, datetime.date]],
+                   market_normalized: str, interval: str, **kwargs) -> pd.DataFrame:
+        """
+        只从原始数据源获取缺失区间，与缓存数据拼接并合并保存
+        
+        Args:
+            code: 股票/资产代码
+            cached_data: 缓存中已有的数据
+            missing_ranges: 缺失区间列表
+            market_normalized: 标准化后的市场名称
+            interval: 时间粒度
+            **kwargs: 传给原始数据源的参数
+            
+        Returns:
+            拼接后的DataFrame
+        """
+        print(f"🧩 缓存部分命中: {code}，补取 {len(missing_ranges)} 个缺失区间")
+        pieces = [cached_data]
+        for gap_start, gap_end in missing_ranges:
+            print(f"🌐 从API获取数据: {code} ({gap_start} ~ {gap_end})")
+            gap_data = self.data_source.fetch_data(code, gap_start, gap_end, **kwargs)
+            
+            # 没有数据的区间（如节假日）不写入缓存，下次仍会补取
+            if gap_data is None or gap_data.empty:
+                continue
+            
+            pieces.append(gap_data)
+            if self.cache_manager.merge_and_save(
+                data=gap_data,
+                data_source=self.source_type,
+                market=market_normalized,
+                code=code,
+                start_date=gap_start,
+                end_date=gap_end,
+                interval=interval
+            ):
+                print(f"💾 数据已缓存: {code} ({gap_start} ~ {gap_end})")
+        
+        data = pd.concat(pieces)
+        return data[~data.index.duplicated(keep='last')].sort_index()
+    
+    def fetch_many(self, codes: List[str], start_date: datetime.date, end_date: datetime.date,
+                   max_workers: Optional[int] = None,
+                   **kwargs) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        """
+        批量获取数据（带缓存，并发请求API）
+        
+        查询流程：
+        1. 一次遍历缓存索引，取出所有命中的代码
+        2. 未命中的代码提交到线程池并发请求原始数据源（受数据源并发上限约束）
+        3. 在调用线程中依次保存到缓存（避免并发写索引）
+        
+        Args:
+            codes: 股票/资产代码列表
+            start_date: 开始日期
+            end_date: 结束日期
+            max_workers: 线程数，默认使用数据源并发上限
+            **kwargs: 其他参数（market, interval等）
+            
+        Returns:
+            ({代码: DataFrame}, {代码: 错误信息})
+        """
+        market = kwargs.get('market', 'A股')
+        interval = kwargs.get('interval', '1d')
+        market_normalized = self._normalize_market_name(market)
+        
+        # 去重并保持顺序
+        codes = list(dict.fromkeys(codes))
+        
+        # 1. 一次性查询缓存
+        results = self.cache_manager.get_data_many(
+            data_source=self.source_type,
+            market=market_normalized,
+            codes=codes,
+            start_date=start_date,
+            end_date=end_date,
+            interval=interval
+        )
+        results = {code: data for code, data in results.items() if data is not None and not data.empty}
+        errors = {}
+        
+        misses = [code for code in codes if code not in results]
+        if results:
+            print(f"🎯 使用缓存数据: {len(results)} 个代码")
+        if not misses:
+            return results, errors
+        
+        # 2. 并发请求未命中的代码
+        print(f"🌐 从API获取数据: {len(misses)} 个代码")
+        semaphore = _get_source_semaphore(self.source_type)
+        limit = SOURCE_CONCURRENCY.get(self.source_type, SOURCE_CONCURRENCY['unknown'])
+        workers = min(max_workers or limit, len(misses))
+        
+        def fetch_one(code):
+            with semaphore:
+                return self.data_source.fetch_data(code, start_date, end_date, **kwargs)
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(fetch_one, code): code for code in misses}
+            for future in as_completed(futures):
+                code = futures[future]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    errors[code] = str(e)
+                    continue
+                
+                if data is None or data.empty:
+                    errors[code] = "无法获取数据"
+                    continue
+                
+                results[code] = data
+                
+                # 3. 保存到缓存
+                if self.cache_manager.save_data(
+                    data=data,
+                    data_source=self.source_type,
+                    market=market_normalized,
+                    code=code,
+                    start_date=start_date,
+                    end_date=end_date,
+                    interval=interval
+                ):
+                    print(f"💾 数据已缓存: {code}")
+        
+        # 按输入顺序返回
+        return {code: results[code] for code in codes if code in results}, errors
+    
+    def ingest_market(self, start_date: datetime.date, end_date: datetime.date, market: str = 'A股',
+                      codes: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """
+        按交易日截面批量获取整个市场的日线，并一次性写入缓存
+        
+        需要原始数据源支持截面模式（TushareDataSource.fetch_market_daily）。
+        请求次数只与交易日数量有关；写入缓存时索引只写入一次。
+        
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+            market: 市场类型 ('A股', '可转债')
+            codes: 只保留这些代码，None 表示全市场
+            
+        Returns:
+            {代码: DataFrame}
+        """
+        fetch_market_daily = getattr(self.data_source, 'fetch_market_daily', None)
+        if fetch_market_daily is None:
+            raise NotImplementedError(f"数据源 {self.source_type} 不支持按交易日截面获取")
+        
+        frames = fetch_market_daily(start_date, end_date, market=market, codes=codes)
+        if frames:
+            saved = self.cache_manager.save_many(
+                frames,
+                data_source=self.source_type,
+                market=self._normalize_market_name(market),
+                start_date=start_date,
+                end_date=end_date,
+                interval='1d'
+            )
+            print(f"💾 截面数据已缓存: {saved} 个代码")
+        return frames
+    
+    def warm(self, codes: List[str], start_date: datetime.date, end_date: datetime.date,
+             market: str = 'A股', interval: str = '1d', max_workers: Optional[int] = None,
+             progress_callback: Optional[Callable[[int, int, str], None]] = None) -> dict:
+        """
+        预热缓存：先按索引规划所有缺失的 (代码, 日期区间)，再并发获取并写入缓存
+        
+        与 fetch_many 不同，规划阶段只看索引元数据，不读取缓存文件；部分命中的代码只获取缺失区间。
+        请求在线程池中并发执行（受数据源并发上限和限流约束），在调用线程中依次保存到缓存。
+        
+        Args:
+            codes: 代码列表
+            start_date: 开始日期
+            end_date: 结束日期
+            market: 市场类型
+            interval: 时间粒度
+            max_workers: 线程数，默认使用数据源并发上限
+            progress_callback: 每完成一个请求调用一次，参数为 (已完成数量, 总数量, 代码)
+            
+        Returns:
+            {'planned': 请求数, 'cached': 已完整缓存的代码数, 'fetched': [代码], 'failed': {代码: 错误信息},
+             'rows': 获取的行数}
+        """
+        market_normalized = self._normalize_market_name(market)
+        codes = list(dict.fromkeys(codes))
+        plan = self.cache_manager.plan_missing(self.source_type, market_normalized, codes,
+                                               start_date, end_date, interval)
+        tasks = [(code, gap_start, gap_end) for code, gaps in plan.items() for gap_start, gap_end in gaps]
+        summary = {'planned': len(tasks), 'cached': len(codes) - len(plan), 'fetched': [], 'failed': {}, 'rows': 0}
+        
+        print(f"🔥 缓存预热: {len(codes)} 个代码，{summary['cached']} 个已缓存，"
+              f"{len(plan)} 个需要获取（{len(tasks)} 个区间）")
+        if not tasks:
+            return summary
+        
+        t0 = time.perf_counter()
+        semaphore = _get_source_semaphore(self.source_type)
+        limit = SOURCE_CONCURRENCY.get(self.source_type, SOURCE_CONCURRENCY['unknown'])
+        workers = min(max_workers or limit, len(tasks))
+        report_every = max(1, len(tasks) // 10)
+        
+        def fetch_one(code, gap_start, gap_end):
+            with semaphore:
+                return self.data_source.fetch_data(code, gap_start, gap_end, market=market, interval=interval)
+        
+        fetched = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(fetch_one, *task): task for task in tasks}
+            for done, future in enumerate(as_completed(futures), start=1):
+                code, gap_start, gap_end = futures[future]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    summary['failed'][code] = str(e)
+                    data = None
+                
+                if data is not None and not data.empty:
+                    # 完全未缓存的代码直接保存，部分命中的与已有缓存合并
+                    save = (self.cache_manager.save_data if plan[code] == [(start_date, end_date)]
+                            else self.cache_manager.merge_and_save)
+                    if save(data=data, data_source=self.source_type, market=market_normalized, code=code,
+                            start_date=gap_start, end_date=gap_end, interval=interval):
+                        fetched.add(code)
+                        summary['rows'] += len(data)
+                    else:
+                        summary['failed'][code] = "写入缓存失败"
+                elif code not in summary['failed'] and plan[code] == [(start_date, end_date)]:
+                    # 部分命中时缺失区间没有数据（如节假日）不算失败
+                    summary['failed'][code] = "无法获取数据"
+                
+                if progress_callback is not None:
+                    progress_callback(done, len(tasks), code)
+                if done % report_every == 0 or done == len(tasks):
+                    print(f"📥 预热进度: {done}/{len(tasks)}")
+        
+        summary['fetched'] = [code for code in codes if code in fetched and code not in summary['failed']]
+        print(f"✅ 缓存预热完成: 获取 {len(summary['fetched'])} 个代码 {summary['rows']} 行，"
+              f"{len(summary['failed'])} 个失败，耗时 {time.perf_counter() - t0:.1f} 秒")
+        return summary
+    
+    def refresh(self, end_date: Optional[datetime.date] = None, codes: Optional[List[str]] = None,
+                max_workers: Optional[int] = None, dry_run: bool = False) -> dict:
+        """
+        增量刷新缓存：对本数据源缓存的每个资产，只获取最新条目结束日期之后的K线并追加
+        
+        每个资产（市场、代码、时间粒度）取结束日期最晚的条目，从其结束日期（含，替换可能不完整的当日K线）
+        获取到 end_date，追加后条目范围延长、历史分区不重写。结束日期已到 end_date 且未过期的资产跳过。
+        数据源支持截面模式（TushareDataSource.fetch_market_daily）且资产数多于天数时按交易日批量获取，
+        否则按代码并发获取（受数据源并发上限和限流约束）。所有追加在一次索引写入中完成。
+        
+        Args:
+            end_date: 刷新到的日期，默认今天
+            codes: 只刷新这些代码，None 表示全部
+            max_workers: 按代码获取时的线程数，默认使用数据源并发上限
+            dry_run: 只返回待刷新的代码，不请求数据
+            
+        Returns:
+            {'refreshed': [代码], 'up_to_date': 跳过的资产数, 'no_data': [代码], 'failed': {代码: 错误信息},
+             'rows': 追加的行数}（dry_run 时为 {'pending': [代码], 'up_to_date': 跳过的资产数}）
+        """
+        end_date = end_date or datetime.date.today()
+        targets, up_to_date = self._refresh_targets(end_date, codes)
+        if dry_run:
+            return {'pending': [entry['code'] for _, entry in targets], 'up_to_date': up_to_date}
+        
+        summary = {'refreshed': [], 'up_to_date': up_to_date, 'no_data': [], 'failed': {}, 'rows': 0}
+        if not targets:
+            print(f"✅ 缓存已是最新（{up_to_date} 个资产）")
+            return summary
+        
+        t0 = time.perf_counter()
+        print(f"🔄 增量刷新 {len(targets)} 个资产（{up_to_date} 个已是最新）")
+        tails = self._fetch_tails(targets, end_date, max_workers, summary['failed'])
+        
+        items = []
+        for key, entry in targets:
+            data = tails.get(key)
+            if entry['code'] in summary['failed']:
+                continue
+            if data is None or data.empty:
+                summary['no_data'].append(entry['code'])
+                continue
+            items.append((key, data, end_date))
+        
+        # 所有追加一次写入索引
+        new_keys = self.cache_manager.append_many(items)
+        entries = dict(targets)
+        for key, data, _ in items:
+            code = entries[key]['code']
+            if new_keys[key] is None:
+                summary['failed'][code] = "写入缓存失败"
+                continue
+            summary['refreshed'].append(code)
+            summary['rows'] += len(data)
+        
+        print(f"✅ 增量刷新完成: {len(summary['refreshed'])} 个资产，获取 {summary['rows']} 行，"
+              f"{len(summary['no_data'])} 个无新数据，{len(summary['failed'])} 个失败，"
+              f"耗时 {time.perf_counter() - t0:.1f} 秒")
+        return summary
+    
+    def _refresh_targets(self, end_date: datetime.date,
+                         codes: Optional[List[str]] = None) -> Tuple[List[Tuple[str, dict]], int]:
+        """
+        找出需要增量刷新的缓存条目：每个资产取结束日期最晚的条目
+        
+        Returns:
+            ([(缓存键, 条目)], 已是最新的资产数)
+        """
+        wanted = set(codes) if codes is not None else None
+        latest = {}
+        for key, entry in self.cache_manager.index.get_all_entries().items():
+            if entry['data_source'] != self.source_type:
+                continue
+            if wanted is not None and entry['code'] not in wanted:
+                continue
+            asset = (entry['market'], entry['code'], entry['interval'])
+            if asset not in latest or entry['end_date'] > latest[asset][1]['end_date']:
+                latest[asset] = (key, entry)
+        
+        targets = []
+        up_to_date = 0
+        for key, entry in latest.values():
+            if (datetime.date.fromisoformat(entry['end_date']) >= end_date
+                    and not self.cache_manager.policy.is_expired(entry)):
+                up_to_date += 1
+            else:
+                targets.append((key, entry))
+        return targets, up_to_date
+    
+    def _fetch_tails(self, targets: List[Tuple[str, dict]], end_date: datetime.date,
+                     max_workers: Optional[int], errors: Dict[str, str]) -> Dict[str, pd.DataFrame]:
+        """
+        获取每个待刷新条目从其结束日期到 end_date 的数据
+        
+        日线A股/可转债在数据源支持截面模式且资产数多于天数时按交易日批量获取，其余按代码并发获取。
+        
+        Returns:
+            {缓存键: DataFrame}，失败的代码记录到 errors
+        """
+        tails = {}
+        groups = {}
+        for key, entry in targets:
+            groups.setdefault((entry['market'], entry['interval']), []).append((key, entry))
+        
+        per_code = []
+        fetch_market_daily = getattr(self.data_source, 'fetch_market_daily', None)
+        for (market, interval), group in groups.items():
+            start = min(datetime.date.fromisoformat(entry['end_date']) for _, entry in group)
+            days = (end_date - start).days + 1
+            if (fetch_market_daily is None or interval != '1d'
+                    or market not in ('a_stock', 'convertible_bond') or len(group) <= days):
+                per_code.extend(group)
+                continue
+            
+            print(f"📅 按交易日截面获取 {MARKET_NAMES[market]} {start} ~ {end_date}（{len(group)} 个代码）")
+            try:
+                frames = fetch_market_daily(start, end_date, market=MARKET_NAMES[market],
+                                            codes=[entry['code'] for _, entry in group])
+            except Exception as e:
+                for _, entry in group:
+                    errors[entry['code']] = str(e)
+                continue
+            for key, entry in group:
+                if entry['code'] in frames:
+                    tails[key] = frames[entry['code']]
+        
+        if not per_code:
+            return tails
+        
+        semaphore = _get_source_semaphore(self.source_type)
+        limit = SOURCE_CONCURRENCY.get(self.source_type, SOURCE_CONCURRENCY['unknown'])
+        workers = min(max_workers or limit, len(per_code))
+        
+        def fetch_one(entry):
+            with semaphore:
+                return self.data_source.fetch_data(
+                    entry['code'], datetime.date.fromisoformat(entry['end_date']), end_date,
+                    market=MARKET_NAMES.get(entry['market'], entry['market']), interval=entry['interval']
+                )
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(fetch_one, entry): (key, entry) for key, entry in per_code}
+            for future in as_completed(futures):
+                key, entry = futures[future]
+                try:
+                    tails[key] = future.result()
+                except Exception as e:
+                    errors[entry['code']] = str(e)
+        return tails
+    
     def _normalize_market_name(self, market: str) -> str:
         """
         标准化市场名称（用于目录结构）
         
         将中文市场名称转换为英文目录名
         """
-        market_map = {
-            'A股': 'a_stock',
-            '港股': 'hk_stock',
-            '美股': 'us_stock',
-            '可转债': 'convertible_bond',
-            '加密货币': 'crypto',
-            'stock': 'stock_1d',
-            'crypto': 'crypto'
-        }
-        
+        market_map = {name: market for market, name in MARKET_NAMES.items()}
         return market_map.get(market, market.lower().replace(' ', '_'))
     
     # 代理其他方法（如果有）
@@ -6,14 +6,116 @@
 import pandas as pd
 import numpy as np
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from functools import wraps
 import datetime
-import streamlit as st
+import threading
+import time
+from rate_limiter import call_with_retry, configure_rate_limit, tushare_requests_per_minute, MAX_RETRIES
+
+
+class TTLMemoCache:
+    """
+    进程内的记忆化缓存（线程安全）
+
+    条目超过 ttl 秒后失效，条目数超过 maxsize 时淘汰最久未使用的条目。
+    不依赖 Streamlit，脚本、工作进程和 Streamlit 应用中行为一致。
+    自定义缓存后端只需实现相同的 get / set / clear 方法。
+    """
+
+    MISSING = object()
+
+    def __init__(self, ttl: float = 3600, maxsize: int = 128):
+        """
+        Args:
+            ttl: 条目有效期（秒），None 表示不过期
+            maxsize: 最大条目数
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items = OrderedDict()  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """读取条目，未命中或已过期时返回 TTLMemoCache.MISSING"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or (item[0] is not None and item[0] <= time.monotonic()):
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return self.MISSING
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        """写入条目"""
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+def memoize(ttl: float = 3600, maxsize: int = 128, cache=None):
+    """
+    数据源方法的记忆化装饰器（替代 st.cache_data）
+
+    缓存键为除 self 外的全部参数，同一方法的所有实例共享缓存；参数不可哈希时直接调用。
+    返回 None（获取失败）时不缓存；DataFrame 结果以副本返回，调用方修改不会影响缓存。
+    被装饰的方法带有 cache 属性（可替换为自定义后端）和 cache_clear() 方法。
+
+    Args:
+        ttl: 条目有效期（秒）
+        maxsize: 最大条目数
+        cache: 缓存后端，默认为 TTLMemoCache(ttl, maxsize)
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return func(self, *args, **kwargs)
+
+            value = wrapper.cache.get(key)
+            if value is TTLMemoCache.MISSING:
+                value = func(self, *args, **kwargs)
+                if value is None:
+                    return None
+                wrapper.cache.set(key, value)
+            return value.copy() if isinstance(value, pd.DataFrame) else value
+
+        wrapper.cache = cache if cache is not None else TTLMemoCache(ttl, maxsize)
+        wrapper.cache_clear = lambda: wrapper.cache.clear()
+        return wrapper
+    return decorator
 
 
 class DataSource(ABC):
     """数据源抽象基类"""
     
+    # 限流器名称，同名数据源共享请求速率（见 rate_limiter）
+    provider = 'unknown'
+    
+    def _request(self, func, *args, **kwargs):
+        """经限流和重试调用数据源接口"""
+        return call_with_retry(self.provider, func, *args, **kwargs)
+    
     @abstractmethod
     def fetch_data(self, code: str, start_date: datetime.date, end_date: datetime.date, **kwargs) -> Optional[pd.DataFrame]:
         """
@@ -54,14 +156,16 @@ class DataSource(ABC):
 class AKShareDataSource(DataSource):
     """AKShare数据源实现"""
     
+    provider = 'akshare'
+    
     def __init__(self):
         """初始化AKShare数据源"""
         # 延迟导入，在实际使用时才导入
         self.ak = None
         self.yf = None
     
-    @st.cache_data(ttl=3600)
-    def fetch_data(_self, code: str, start_date: datetime.date, end_date: datetime.date, market: str = 'A股', **kwargs) -> Optional[pd.DataFrame]:
+    @memoize(ttl=3600, maxsize=128)
+    def fetch_data(self, code: str, start_date: datetime.date, end_date: datetime.date, market: str = 'A股', **kwargs) -> Optional[pd.DataFrame]:
         """
         从AKShare获取股票数据
         
@@ -77,13 +181,13 @@ class AKShareDataSource(DataSource):
         """
         try:
             if market == 'A股':
-                return _self._fetch_a_stock(code, start_date, end_date)
+                return self._fetch_a_stock(code, start_date, end_date)
             elif market == '港股':
-                return _self._fetch_hk_stock(code, start_date, end_date)
+                return self._fetch_hk_stock(code, start_date, end_date)
             elif market == '美股':
-                return _self._fetch_us_stock(code, start_date, end_date)
+                return self._fetch_us_stock(code, start_date, end_date)
             elif market == '可转债':
-                return _self._fetch_convertible_bond(code, start_date, end_date)
+                return self._fetch_convertible_bond(code, start_date, end_date)
             else:
                 return None
         except Exception as e:
@@ -112,72 +216,52 @@ class AKShareDataSource(DataSource):
         start_str = start_date.strftime("%Y%m%d")
         end_str = end_date.strftime("%Y%m%d")
         
-        # 添加重试机制
-        max_retries = 3
-        retry_delay = 2  # 秒
+        # 限流并在网络故障时按指数退避重试（见 rate_limiter）
+        try:
+            df = self._request(
+                self.ak.stock_zh_a_hist,
+                symbol=code, 
+                period="daily", 
+                start_date=start_str, 
+                end_date=end_str, 
+                adjust="qfq"
+            )
+        except Exception as e:
+            error_msg = str(e)
+            
+            # 判断错误类型
+            if "RemoteDisconnected" in error_msg or "Connection" in error_msg:
+                print(f"❌ AKShare 网络连接失败（已重试 {MAX_RETRIES} 次）")
+                print(f"💡 建议：")
+                print(f"   1. 检查网络连接")
+                print(f"   2. 切换到 Tushare 数据源（更稳定）")
+                print(f"   3. 稍后再试")
+            elif "502" in error_msg or "Bad Gateway" in error_msg:
+                print(f"❌ AKShare API 服务器错误（502 Bad Gateway）")
+                print(f"💡 建议：切换到 Tushare 数据源")
+            else:
+                print(f"❌ 数据获取失败: {e}")
+            return None
         
-        for attempt in range(max_retries):
-            try:
-                df = self.ak.stock_zh_a_hist(
-                    symbol=code, 
-                    period="daily", 
-                    start_date=start_str, 
-                    end_date=end_str, 
-                    adjust="qfq"
-                )
-                
-                if df.empty:
-                    print(f"⚠️  股票代码 {code} 返回空数据")
-                    print(f"💡 可能原因：")
-                    print(f"   1. 股票代码不正确或已退市")
-                    print(f"   2. 日期范围内没有交易数据")
-                    print(f"   3. 尝试使用其他代码，如：000001（平安银行）、600519（贵州茅台）")
-                    return None
-                
-                # 标准化列名
-                df.rename(columns={
-                    '日期': 'date', 
-                    '收盘': 'close', 
-                    '最高': 'high', 
-                    '最低': 'low', 
-                    '开盘': 'open', 
-                    '成交量': 'volume'
-                }, inplace=True)
-                
-                return self._standardize_dataframe(df)
-                
-            except Exception as e:
-                error_msg = str(e)
-                
-                # 判断错误类型
-                if "RemoteDisconnected" in error_msg or "Connection" in error_msg:
-                    if attempt < max_retries - 1:
-                        print(f"⚠️  网络连接失败（尝试 {attempt + 1}/{max_retries}），{retry_delay}秒后重试...")
-                        import time
-                        time.sleep(retry_delay)
-                        continue
-                    else:
-                        print(f"❌ AKShare 网络连接失败（已重试 {max_retries} 次）")
-                        print(f"💡 建议：")
-                        print(f"   1. 检查网络连接")
-                        print(f"   2. 切换到 Tushare 数据源（更稳定）")
-                        print(f"   3. 稍后再试")
-                        return None
-                elif "502" in error_msg or "Bad Gateway" in error_msg:
-                    print(f"❌ AKShare API 服务器错误（502 Bad Gateway）")
-                    print(f"💡 建议：切换到 Tushare 数据源")
-                    return None
-                else:
-                    # 其他错误
-                    print(f"❌ 数据获取失败: {e}")
-                    if attempt < max_retries - 1:
-                        print(f"   {retry_delay}秒后重试...")
-                        import time
-                        time.sleep(retry_delay)
-                        continue
-                    return None
+        if df.empty:
+            print(f"⚠️  股票代码 {code} 返回空数据")
+            print(f"💡 可能原因：")
+            print(f"   1. 股票代码不正确或已退市")
+            print(f"   2. 日期范围内没有交易数据")
+            print(f"   3. 尝试使用其他代码，如：000001（平安银行）、600519（贵州茅台）")
+            return None
+        
+        # 标准化列名
+        df.rename(columns={
+            '日期': 'date', 
+            '收盘': 'close', 
+            '最高': 'high', 
+            '最低': 'low', 
+            '开盘': 'open', 
+            '成交量': 'volume'
+        }, inplace=True)
         
-        return None
+        return self._standardize_dataframe(df)
     
     def _fetch_hk_stock(self, code: str, start_date: datetime.date, end_date: datetime.date) -> Optional[pd.DataFrame]:
         """获取港股数据"""
@@ -193,7 +277,8 @@ class AKShareDataSource(DataSource):
         start_str = start_date.strftime("%Y%m%d")
         end_str = end_date.strftime("%Y%m%d")
         
-        df = self.ak.stock_hk_hist(
+        df = self._request(
+            self.ak.stock_hk_hist,
             symbol=code, 
             period="daily", 
             start_date=start_str, 
@@ -228,7 +313,7 @@ class AKShareDataSource(DataSource):
                 return None
         
         ticker = self.yf.Ticker(code)
-        df = ticker.history(start=start_date, end=end_date)
+        df = call_with_retry('yfinance', ticker.history, start=start_date, end=end_date)
         
         if df.empty:
             return None
@@ -278,7 +363,7 @@ class AKShareDataSource(DataSource):
             
             # 方法1：尝试 bond_zh_hs_cov_daily
             try:
-                df = self.ak.bond_zh_hs_cov_daily(symbol=code)
+                df = self._request(self.ak.bond_zh_hs_cov_daily, symbol=code)
             except AttributeError:
                 pass
             
@@ -286,7 +371,7 @@ class AKShareDataSource(DataSource):
             if df is None or df.empty:
                 try:
                     # 使用集思录接口获取所有可转债，然后筛选
-                    all_bonds = self.ak.bond_cov_jsl()
+                    all_bonds = self._request(self.ak.bond_cov_jsl)
                     if code in all_bonds['代码'].values:
                         # 只能获取实时数据，无法获取历史数据
                         print(f"⚠️  AKShare暂不支持可转债 {code} 的历史数据")
@@ -383,6 +468,8 @@ class AKShareDataSource(DataSource):
 class YFinanceDataSource(DataSource):
     """YFinance数据源 - 支持美股、港股、加密货币"""
     
+    provider = 'yfinance'
+    
     def __init__(self):
         """初始化YFinance数据源"""
         self.yf = None
@@ -426,7 +513,8 @@ class YFinanceDataSource(DataSource):
             # 处理4小时线：从1小时数据聚合而来
             if interval == '4h':
                 # 获取1小时数据
-                df = ticker.history(
+                df = self._request(
+                    ticker.history,
                     start=start_date, 
                     end=end_date,
                     interval='1h'
@@ -452,7 +540,8 @@ class YFinanceDataSource(DataSource):
                 return self._standardize_dataframe(df_4h)
             else:
                 # 其他时间周期：直接获取
-                df = ticker.history(
+                df = self._request(
+                    ticker.history,
                     start=start_date, 
                     end=end_date,
                     interval=interval
@@ -570,7 +659,7 @@ class YFinanceDataSource(DataSource):
         
         try:
             ticker = self.yf.Ticker(code)
-            info = ticker.info
+            info = self._request(lambda: ticker.info)
             
             # 提取关键信息
             result = {
@@ -589,16 +678,21 @@ class YFinanceDataSource(DataSource):
 class TushareDataSource(DataSource):
     """Tushare数据源 - 专业金融数据接口"""
     
-    def __init__(self, token: str = None):
+    provider = 'tushare'
+    
+    def __init__(self, token: str = None, points: Optional[int] = None):
         """
         初始化Tushare数据源
         
         Args:
             token: Tushare API Token
+            points: 账户积分，用于设置每分钟请求上限（默认读取环境变量 TUSHARE_POINTS，未设置时按120积分）
         """
         self.ts = None
         self.pro = None
         self.token = token
+        if points is not None:
+            configure_rate_limit(self.provider, tushare_requests_per_minute(points))
     
     def _init_tushare(self):
         """延迟初始化Tushare"""
@@ -625,8 +719,8 @@ class TushareDataSource(DataSource):
                 return False
         return True
     
-    @st.cache_data(ttl=3600)
-    def fetch_data(_self, code: str, start_date: datetime.date, end_date: datetime.date, market: str = 'A股', **kwargs) -> Optional[pd.DataFrame]:
+    @memoize(ttl=3600, maxsize=128)
+    def fetch_data(self, code: str, start_date: datetime.date, end_date: datetime.date, market: str = 'A股', **kwargs) -> Optional[pd.DataFrame]:
         """
         从Tushare获取数据
         
@@ -639,14 +733,14 @@ class TushareDataSource(DataSource):
         Returns:
             标准化的DataFrame
         """
-        if not _self._init_tushare():
+        if not self._init_tushare():
             return None
         
         try:
             if market == 'A股':
-                return _self._fetch_stock(code, start_date, end_date)
+                return self._fetch_stock(code, start_date, end_date)
             elif market == '可转债':
-                return _self._fetch_convertible_bond(code, start_date, end_date)
+                return self._fetch_convertible_bond(code, start_date, end_date)
             else:
                 print(f"⚠️ Tushare暂不支持市场类型: {market}")
                 return None
@@ -667,19 +761,21 @@ class TushareDataSource(DataSource):
             end_str = end_date.strftime("%Y%m%d")
             
             # 获取日线数据（前复权）
-            df = self.pro.daily(ts_code=ts_code, start_date=start_str, end_date=end_str)
+            df = self._request(self.pro.daily, ts_code=ts_code, start_date=start_str, end_date=end_str)
             
             if df is None or df.empty:
                 print(f"⚠️ 未获取到 {code} 的数据")
                 return None
             
             # 获取复权因子
-            adj_factor = self.pro.adj_factor(ts_code=ts_code, start_date=start_str, end_date=end_str)
+            adj_factor = self._request(self.pro.adj_factor, ts_code=ts_code, start_date=start_str, end_date=end_str)
             
             if adj_factor is not None and not adj_factor.empty:
                 # 合并复权因子
                 df = df.merge(adj_factor[['trade_date', 'adj_factor']], on='trade_date', how='left')
-                df['adj_factor'].fillna(method='ffill', inplace=True)
+                # Tushare按日期倒序返回，按时间顺序沿用前一交易日的因子，仍缺失时使用原始价格
+                df = df.sort_values('trade_date')
+                df['adj_factor'] = df['adj_factor'].ffill().fillna(1.0)
                 
                 # 前复权计算
                 df['open'] = df['open'] * df['adj_factor']
@@ -719,7 +815,7 @@ class TushareDataSource(DataSource):
             end_str = end_date.strftime("%Y%m%d")
             
             # 获取可转债日线数据
-            df = self.pro.cb_daily(ts_code=ts_code, start_date=start_str, end_date=end_str)
+            df = self._request(self.pro.cb_daily, ts_code=ts_code, start_date=start_str, end_date=end_str)
             
             if df is None or df.empty:
                 print(f"⚠️ 未获取到可转债 {code} 的数据")
@@ -757,6 +853,96 @@ class TushareDataSource(DataSource):
             traceback.print_exc()
             return None
     
+    def fetch_market_daily(self, start_date: datetime.date, end_date: datetime.date, market: str = 'A股',
+                           codes: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """
+        按交易日批量获取全市场日线（截面模式），整理为按代码的时间序列
+        
+        每个交易日调用一次 daily（A股另加一次 adj_factor），与代码数量无关；
+        5000个代码一年的数据约需 250~500 次请求，逐个代码获取则需要 10000 次。
+        复权方式与 fetch_data 一致。
+        
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+            market: 市场类型 ('A股', '可转债')
+            codes: 只保留这些代码（6位代码），None 表示全市场
+            
+        Returns:
+            {代码: 标准化的DataFrame}，获取失败时返回空字典
+        """
+        if market not in ('A股', '可转债'):
+            print(f"⚠️ Tushare截面模式暂不支持市场类型: {market}")
+            return {}
+        if not self._init_tushare():
+            return {}
+        
+        try:
+            trade_dates = self._trade_dates(start_date, end_date)
+            if not trade_dates:
+                print(f"⚠️ {start_date} 至 {end_date} 内没有交易日")
+                return {}
+            
+            wanted = None
+            if codes is not None:
+                format_code = self._format_stock_code if market == 'A股' else self._format_bond_code
+                wanted = {format_code(code) for code in codes}
+            
+            bars, factors = [], []
+            for i, trade_date in enumerate(trade_dates, 1):
+                if market == 'A股':
+                    df = self._request(self.pro.daily, trade_date=trade_date)
+                    adj = self._request(self.pro.adj_factor, trade_date=trade_date)
+                    if adj is not None and not adj.empty:
+                        factors.append(adj[['ts_code', 'trade_date', 'adj_factor']])
+                else:
+                    df = self._request(self.pro.cb_daily, trade_date=trade_date)
+                if df is not None and not df.empty:
+                    bars.append(df[['ts_code', 'trade_date', 'open', 'high', 'low', 'close', 'vol']])
+                if i % 20 == 0 or i == len(trade_dates):
+                    print(f"📥 Tushare截面数据: {i}/{len(trade_dates)} 个交易日")
+            
+            if not bars:
+                print(f"⚠️ 未获取到 {start_date} 至 {end_date} 的截面数据")
+                return {}
+            
+            df = pd.concat(bars, ignore_index=True)
+            if wanted is not None:
+                df = df[df['ts_code'].isin(wanted)]
+            df = df.sort_values(['ts_code', 'trade_date'], kind='stable')
+            
+            price_cols = ['open', 'high', 'low', 'close']
+            if factors:
+                df = df.merge(pd.concat(factors, ignore_index=True), on=['ts_code', 'trade_date'], how='left')
+                # 缺失的复权因子沿用该代码前一交易日的值，仍缺失时使用原始价格（同 fetch_data）
+                factor = df.groupby('ts_code', sort=False)['adj_factor'].ffill().fillna(1.0)
+                df[price_cols] = df[price_cols].mul(factor, axis=0)
+            
+            df['date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
+            # Tushare的成交量单位是手，转换为股（可转债为张）
+            df['volume'] = df['vol'] * 100
+            
+            result = {}
+            for ts_code, group in df.groupby('ts_code', sort=False):
+                result[ts_code.split('.')[0]] = self._standardize_dataframe(
+                    group[['date'] + price_cols + ['volume']].reset_index(drop=True))
+            print(f"✅ Tushare截面数据整理完成: {len(result)} 个代码，{len(trade_dates)} 个交易日")
+            return result
+            
+        except Exception as e:
+            print(f"❌ 截面数据获取失败: {e}")
+            import traceback
+            traceback.print_exc()
+            return {}
+    
+    def _trade_dates(self, start_date: datetime.date, end_date: datetime.date) -> List[str]:
+        """获取区间内的交易日（YYYYMMDD，升序）"""
+        cal = self._request(self.pro.trade_cal, exchange='SSE', start_date=start_date.strftime("%Y%m%d"),
+                            end_date=end_date.strftime("%Y%m%d"), is_open='1')
+        if cal is None or cal.empty:
+            return []
+        return sorted(cal['cal_date'].astype(str).tolist())
+    
     def _format_stock_code(self, code: str) -> str:
         """格式化A股代码为Tushare格式"""
         # 去除可能的后缀
@@ -921,6 +1107,7 @@ class DataSourceFactory:
             source_type: 数据源类型 ('akshare', 'yfinance', 'tushare', 'csv', 'database')
             **kwargs: 数据源特定的参数
                 - token: Tushare API Token
+                - points: Tushare 账户积分（决定每分钟请求上限）
             
         Returns:
             DataSource实例
@@ -931,7 +1118,7 @@ class DataSourceFactory:
             return YFinanceDataSource()
         elif source_type == 'tushare':
             token = kwargs.get('token', None)
-            return TushareDataSource(token=token)
+            return TushareDataSource(token=token, points=kwargs.get('points'))
         elif source_type == 'csv':
             csv_dir = kwargs.get('csv_dir', './data')
             return CSVDataSource(csv_dir)
@@ -0,0 +1,257 @@
+"""
+参数扫描模块
+对策略参数网格批量回测，共享指标只计算一次
+"""
+
+import itertools
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+import pandas as pd
+
+from strategy_backtest import BacktestEngine, StrategyFactory
+
+
+def calculate_max_drawdown(equity: np.ndarray) -> float:
+    """
+    计算最大回撤
+
+    Args:
+        equity: 净值数组
+
+    Returns:
+        最大回撤（负数，如-0.25表示回撤25%）
+    """
+    if len(equity) == 0:
+        return 0.0
+    running_max = np.fmax.accumulate(equity)
+    drawdown = equity / running_max - 1
+    return float(np.nanmin(drawdown)) if not np.isnan(drawdown).all() else 0.0
+
+
+def calculate_sharpe_ratio(equity: np.ndarray, dates: pd.Index) -> float:
+    """
+    计算年化夏普比率（无风险利率按0计）
+
+    每年的K线数量按回测区间的K线数量和自然日跨度估算，日线、周线、小时线都适用
+
+    Args:
+        equity: 净值数组
+        dates: K线时间索引（与 equity 等长）
+
+    Returns:
+        夏普比率，K线不足或净值无波动时为0
+    """
+    if len(equity) < 3:
+        return 0.0
+    years = (dates[-1] - dates[0]).total_seconds() / (365.25 * 86400)
+    returns = np.diff(equity) / equity[:-1]
+    std = returns.std(ddof=1)
+    if years <= 0 or not std > 0:
+        return 0.0
+    return float(returns.mean() / std * np.sqrt((len(equity) - 1) / years))
+
+
+class IndicatorCache:
+    """
+    指标缓存
+
+    同一组行情上，每个EMA周期、均线窗口、RSI周期只计算一次，
+    计算方式与各策略的 calculate_signals 完全相同
+    """
+
+    def __init__(self, close: pd.Series):
+        """
+        初始化指标缓存
+
+        Args:
+            close: 收盘价序列
+        """
+        self.close = close
+        self._cache: Dict[tuple, pd.Series] = {}
+
+    def _get(self, key: tuple, compute) -> pd.Series:
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def ema(self, span: int) -> pd.Series:
+        return self._get(('ema', span), lambda: self.close.ewm(span=span, adjust=False).mean())
+
+    def sma(self, window: int) -> pd.Series:
+        return self._get(('sma', window), lambda: self.close.rolling(window=window).mean())
+
+    def std(self, window: int) -> pd.Series:
+        return self._get(('std', window), lambda: self.close.rolling(window=window).std())
+
+    def macd_dif(self, fast: int, slow: int) -> pd.Series:
+        return self._get(('dif', fast, slow), lambda: self.ema(fast) - self.ema(slow))
+
+    def macd_dea(self, fast: int, slow: int, signal: int) -> pd.Series:
+        return self._get(('dea', fast, slow, signal),
+                         lambda: self.macd_dif(fast, slow).ewm(span=signal, adjust=False).mean())
+
+    def rsi(self, period: int) -> pd.Series:
+        def compute():
+            delta = self.close.diff()
+            gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+            loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+            rs = gain / loss
+            return 100 - (100 / (1 + rs))
+        return self._get(('rsi', period), compute)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+def _shift(values: np.ndarray) -> np.ndarray:
+    """数组后移一位（与 Series.shift(1) 一致）"""
+    return np.concatenate(([np.nan], values[:-1]))
+
+
+def _cross_signals(fast: np.ndarray, slow: np.ndarray) -> np.ndarray:
+    """上穿为1，下穿为-1"""
+    prev_fast = _shift(fast)
+    prev_slow = _shift(slow)
+    signal = np.zeros(len(fast), dtype=np.int64)
+    signal[(prev_fast < prev_slow) & (fast > slow)] = 1
+    signal[(prev_fast > prev_slow) & (fast < slow)] = -1
+    return signal
+
+
+def _band_signals(values: np.ndarray, lower, upper) -> np.ndarray:
+    """低于下轨为1，高于上轨为-1"""
+    signal = np.zeros(len(values), dtype=np.int64)
+    signal[values < lower] = 1
+    signal[values > upper] = -1
+    return signal
+
+
+def _macd_signals(cache: IndicatorCache, params: Dict) -> np.ndarray:
+    dif = cache.macd_dif(params['fast'], params['slow']).to_numpy()
+    dea = cache.macd_dea(params['fast'], params['slow'], params['signal']).to_numpy()
+    return _cross_signals(dif, dea)
+
+
+def _sma_signals(cache: IndicatorCache, params: Dict) -> np.ndarray:
+    return _cross_signals(cache.sma(params['short']).to_numpy(), cache.sma(params['long']).to_numpy())
+
+
+def _rsi_signals(cache: IndicatorCache, params: Dict) -> np.ndarray:
+    return _band_signals(cache.rsi(params['period']).to_numpy(), params['lower'], params['upper'])
+
+
+def _bollinger_signals(cache: IndicatorCache, params: Dict) -> np.ndarray:
+    ma = cache.sma(params['period'])
+    std = cache.std(params['period'])
+    upper = (ma + (std * params['std'])).to_numpy()
+    lower = (ma - (std * params['std'])).to_numpy()
+    return _band_signals(cache.close.to_numpy(), lower, upper)
+
+
+# 支持共享指标的策略：信号函数与 calculate_signals 结果一致
+SIGNAL_BUILDERS = {
+    "MACD趋势策略": _macd_signals,
+    "双均线策略(SMA)": _sma_signals,
+    "RSI超买超卖": _rsi_signals,
+    "布林带突破": _bollinger_signals,
+}
+
+# 与界面一致的参数约束，不满足的组合直接跳过
+PARAM_CONSTRAINTS = {
+    "MACD趋势策略": lambda p: p['fast'] < p['slow'],
+    "双均线策略(SMA)": lambda p: p['short'] < p['long'],
+    "RSI超买超卖": lambda p: p['lower'] < p['upper'],
+    "多重底入场策略": lambda p: p['fast'] < p['slow'],
+}
+
+
+class ParameterSweep:
+    """
+    参数扫描（网格搜索）
+
+    Example:
+        sweep = ParameterSweep("双均线策略(SMA)", {'short': range(2, 30), 'long': range(10, 120)}, df)
+        results = sweep.run()
+        print(results.sort_values('total_return', ascending=False).head())
+    """
+
+    def __init__(self, strategy_name: str, param_grid: Dict[str, List[Any]], df: pd.DataFrame,
+                 engine: Optional[BacktestEngine] = None):
+        """
+        初始化参数扫描
+
+        Args:
+            strategy_name: 策略名称（与 StrategyFactory 一致）
+            param_grid: 参数网格，如 {'fast': [8, 12], 'slow': [26, 30], 'signal': [9]}
+            df: 包含OHLCV数据的DataFrame
+            engine: 回测引擎（提供资金和手续费设置），默认使用 BacktestEngine()
+        """
+        # 提前校验策略名称
+        StrategyFactory.create_strategy(strategy_name, {})
+
+        self.strategy_name = strategy_name
+        self.param_grid = {name: list(values) for name, values in param_grid.items()}
+        self.df = df
+        self.engine = engine or BacktestEngine()
+        self.indicators = IndicatorCache(df['close'])
+
+    def combinations(self) -> List[Dict]:
+        """展开参数网格，过滤掉不满足约束的组合"""
+        names = list(self.param_grid.keys())
+        constraint = PARAM_CONSTRAINTS.get(self.strategy_name)
+        combos = []
+        for values in itertools.product(*self.param_grid.values()):
+            params = dict(zip(names, values))
+            if constraint is not None and not constraint(params):
+                continue
+            combos.append(params)
+        return combos
+
+    def run(self, sort_by: Optional[str] = None) -> pd.DataFrame:
+        """
+        运行参数扫描
+
+        Args:
+            sort_by: 按指定指标降序排序（如 'total_return'），None 保持网格顺序
+
+        Returns:
+            每个参数组合一行的结果表，包含参数列和
+            total_return, benchmark_return, win_rate, total_trades, max_drawdown, final_equity
+        """
+        engine = self.engine
+        close = self.df['close']
+        closes = close.to_numpy(dtype=np.float64)
+        initial_cash = engine.initial_cash
+        benchmark = initial_cash * (closes[-1] / closes[0])
+        benchmark_return = (benchmark - initial_cash) / initial_cash
+        signal_builder = SIGNAL_BUILDERS.get(self.strategy_name)
+
+        rows = []
+        for params in self.combinations():
+            if signal_builder is not None:
+                signals = signal_builder(self.indicators, params)
+                equity, _, win_rate, total_trades = engine.simulate_signals(closes, signals)
+            else:
+                # 波段、多重底等策略没有可共享的指标，走完整回测
+                strategy = StrategyFactory.create_strategy(self.strategy_name, params)
+                result = engine.run(self.df, strategy, summary_only=True)
+                equity, win_rate, total_trades = result.equity, result.win_rate, result.total_trades
+
+            final_equity = float(equity[-1]) if len(equity) else float(initial_cash)
+            rows.append({
+                **params,
+                'total_return': (final_equity - initial_cash) / initial_cash,
+                'benchmark_return': benchmark_return,
+                'win_rate': win_rate,
+                'total_trades': total_trades,
+                'max_drawdown': calculate_max_drawdown(equity),
+                'final_equity': final_equity
+            })
+
+        results = pd.DataFrame(rows, columns=list(self.param_grid.keys()) + [
+            'total_return', 'benchmark_return', 'win_rate', 'total_trades', 'max_drawdown', 'final_equity'
+        ])
+        if sort_by is not None:
+            results = results.sort_values(sort_by, ascending=False, ignore_index=True)
+        return results
@@ -0,0 +1,223 @@
+"""
+数据源请求限流与重试
+每个数据源共享一个令牌桶（按每分钟请求数限流），请求失败时按指数退避加随机抖动重试。
+同一进程内的所有线程共享限流器；多进程批量任务中每个进程各自限流。
+"""
+
+import os
+import time
+import random
+import threading
+from typing import Callable, Dict, Optional
+
+
+# 各数据源默认每分钟请求数
+RATE_LIMITS = {
+    'akshare': 60,
+    'yfinance': 60,
+    'unknown': 60
+}
+
+# 各数据源的最大并发请求数（同一进程内所有批量请求共享），也是限流器默认的突发请求数
+SOURCE_CONCURRENCY = {
+    'akshare': 4,
+    'yfinance': 8,
+    'tushare': 4,
+    'unknown': 4
+}
+
+# Tushare 每分钟请求上限与账户积分的对应关系（积分下限, 每分钟请求数），按积分从高到低排列
+TUSHARE_POINT_LIMITS = [
+    (5000, 500),
+    (2000, 200),
+    (120, 50),
+    (0, 10)
+]
+
+# 重试参数
+MAX_RETRIES = 3
+BASE_DELAY = 1.0    # 首次重试的最大等待秒数，之后每次翻倍
+MAX_DELAY = 30.0    # 单次等待上限（秒）
+
+# 错误信息中出现以下内容时视为被限流（所有线程暂停一段时间）
+THROTTLE_MARKERS = ('429', 'Too Many Requests', 'Rate limit', 'rate limit', 'Rate Limit',
+                    '每分钟最多访问', '访问频率', '频繁')
+# 错误信息中出现以下内容时视为临时故障，可以重试
+TRANSIENT_MARKERS = ('RemoteDisconnected', 'Connection', 'connection', 'timed out', 'Timeout', 'timeout',
+                     '502', '503', '504', 'Bad Gateway', 'Service Unavailable', 'Gateway Time-out')
+
+
+def tushare_requests_per_minute(points: int) -> int:
+    """
+    根据 Tushare 积分计算每分钟请求上限
+
+    Args:
+        points: 账户积分
+
+    Returns:
+        每分钟请求数
+    """
+    for min_points, limit in TUSHARE_POINT_LIMITS:
+        if points >= min_points:
+            return limit
+    return TUSHARE_POINT_LIMITS[-1][1]
+
+
+class TokenBucket:
+    """
+    令牌桶限流器（线程安全）
+
+    令牌以 requests_per_minute / 60 每秒的速度补充，最多积累 burst 个；
+    每次请求取走一个令牌，没有令牌时等待。被限流时调用 pause() 让所有线程一起暂停。
+    """
+
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None):
+        """
+        Args:
+            requests_per_minute: 每分钟请求数
+            burst: 允许的突发请求数，默认为每秒请求数（至少1）
+        """
+        self._lock = threading.Lock()
+        self.configure(requests_per_minute, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def configure(self, requests_per_minute: float, burst: Optional[int] = None):
+        """调整限流速率"""
+        with self._lock:
+            self.requests_per_minute = requests_per_minute
+            self.rate = requests_per_minute / 60.0
+            self.burst = burst if burst is not None else max(1, int(self.rate))
+            if hasattr(self, '_tokens'):
+                self._tokens = min(self._tokens, float(self.burst))
+
+    def _refill(self, now: float):
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """
+        取走一个令牌，必要时等待
+
+        Returns:
+            等待的秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """暂停发放令牌（被数据源限流时调用），暂停结束后从空桶开始补充"""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def _default_requests_per_minute(provider: str) -> float:
+    if provider == 'tushare':
+        return tushare_requests_per_minute(int(os.environ.get('TUSHARE_POINTS', 120)))
+    return RATE_LIMITS.get(provider, RATE_LIMITS['unknown'])
+
+
+def _default_burst(provider: str, requests_per_minute: float) -> int:
+    # 并发上限内的请求可以同时发出，不会被按每秒速率逐个放行
+    concurrency = SOURCE_CONCURRENCY.get(provider, SOURCE_CONCURRENCY['unknown'])
+    return max(concurrency, int(requests_per_minute / 60.0))
+
+
+def get_rate_limiter(provider: str) -> TokenBucket:
+    """获取数据源共享的限流器（突发请求数默认为该数据源的并发上限）"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            requests_per_minute = _default_requests_per_minute(provider)
+            _limiters[provider] = TokenBucket(requests_per_minute, _default_burst(provider, requests_per_minute))
+        return _limiters[provider]
+
+
+def configure_rate_limit(provider: str, requests_per_minute: float, burst: Optional[int] = None) -> TokenBucket:
+    """
+    设置数据源的每分钟请求数
+
+    Args:
+        provider: 数据源名称 ('akshare', 'yfinance', 'tushare')
+        requests_per_minute: 每分钟请求数
+        burst: 允许的突发请求数，默认为该数据源的并发上限与每秒请求数中较大者
+
+    Returns:
+        该数据源的限流器
+    """
+    limiter = get_rate_limiter(provider)
+    if burst is None:
+        burst = _default_burst(provider, requests_per_minute)
+    limiter.configure(requests_per_minute, burst)
+    return limiter
+
+
+def is_throttled(error: Exception) -> bool:
+    """错误是否表示请求被限流"""
+    message = f"{type(error).__name__}: {error}"
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+
+def is_retryable(error: Exception) -> bool:
+    """错误是否可以重试（限流、网络故障、网关错误）"""
+    if isinstance(error, (ConnectionError, TimeoutError)) or is_throttled(error):
+        return True
+    message = f"{type(error).__name__}: {error}"
+    return any(marker in message for marker in TRANSIENT_MARKERS)
+
+
+def backoff_delay(attempt: int, base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY) -> float:
+    """第 attempt 次重试（从0开始）的等待秒数：指数退避，在上限的一半到全部之间随机抖动"""
+    cap = min(max_delay, base_delay * (2 ** attempt))
+    return cap / 2 + random.uniform(0, cap / 2)
+
+
+def call_with_retry(provider: str, func: Callable, *args, **kwargs):
+    """
+    限流后调用数据源接口，临时故障时按指数退避重试
+
+    每次尝试前从数据源的令牌桶取令牌；被限流时暂停该数据源的所有请求，其他线程同样等待。
+    不可重试的错误和重试耗尽后的最后一个错误会直接抛出。
+
+    Args:
+        provider: 数据源名称
+        func: 接口函数
+        *args, **kwargs: 接口参数
+
+    Returns:
+        接口返回值
+    """
+    limiter = get_rate_limiter(provider)
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, BASE_DELAY, MAX_DELAY)
+            if is_throttled(e):
+                limiter.pause(delay)
+                print(f"⚠️  {provider} 请求被限流（尝试 {attempt + 1}/{MAX_RETRIES + 1}），暂停 {delay:.1f} 秒")
+            else:
+                print(f"⚠️  {provider} 请求失败（尝试 {attempt + 1}/{MAX_RETRIES + 1}）: {e}，{delay:.1f} 秒后重试")
+                time.sleep(delay)
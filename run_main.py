@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import datetime
+import os
 
 # SSL 配置（解决证书验证问题）
 try:
@@ -12,10 +12,10 @@ try:
 except ImportError:
     pass  # 如果没有 ssl_config.py，继续正常运行
 
-# 导入自定义模块
-from data_source import get_stock_data
+# 导入自定义模块（数据源依赖 akshare/yfinance/tushare 在首次获取数据时才导入）
 from cached_data_source import get_cached_stock_data  # 带缓存的数据获取
 from strategy_backtest import StrategyFactory, BacktestEngine
+from batch_backtest import BatchBacktestRunner  # 批量回测（多进程）
 
 # ===========================
 # 0. 全局配置
@@ -26,9 +26,15 @@ st.set_page_config(
     layout="wide"
 )
 
-# 绘图字体适配（解决中文乱码）
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS'] 
-plt.rcParams['axes.unicode_minus'] = False
+
+def get_pyplot():
+    """首次绘图时才导入 matplotlib（导入耗时较长，页面先渲染控制面板）"""
+    import matplotlib.pyplot as plt
+    # 绘图字体适配（解决中文乱码）
+    plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS'] 
+    plt.rcParams['axes.unicode_minus'] = False
+    return plt
+
 
 # ===========================
 # 1. 侧边栏：控制面板
@@ -149,6 +155,17 @@ else:
         st.sidebar.success(f"✅ 已输入 {len(stock_codes)} 只股票")
     else:
         st.sidebar.error("❌ 请输入至少一个股票代码")
+    
+    # 并行进程数（单核机器直接串行）
+    cpu_count = os.cpu_count() or 1
+    if cpu_count > 1:
+        batch_workers = st.sidebar.slider(
+            "⚙️ 并行进程数",
+            1, cpu_count, min(4, cpu_count),
+            help="批量回测时同时运行的进程数，1=串行执行"
+        )
+    else:
+        batch_workers = 1
 
 # 默认回测最近3年（需要先定义，供后续使用）
 default_start = datetime.date.today() - datetime.timedelta(days=365*3)
@@ -319,67 +336,47 @@ if run_btn:
         st.title("📊 批量回测报告")
         st.caption(f"数据源：{data_source_name} | 市场：{market_type} | 策略：{selected_strategy}")
         
-        # 创建结果容器
-        results = []
-        failed_codes = []
-        all_trades = []  # 存储所有交易记录
-        
         # 进度条
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        # 逐个股票回测
-        for idx, stock_code in enumerate(stock_codes):
-            try:
-                status_text.text(f"正在回测 {stock_code} ({idx+1}/{len(stock_codes)})...")
-                
-                # 获取数据
-                if source_type == "yfinance":
-                    df = get_cached_stock_data(stock_code, start_date, end_date, market=market_type, source_type=source_type, interval=interval, cache_enabled=True)
-                elif source_type == "tushare":
-                    df = get_cached_stock_data(stock_code, start_date, end_date, market=market_type, source_type=source_type, token=tushare_token, cache_enabled=True)
-                else:
-                    df = get_cached_stock_data(stock_code, start_date, end_date, market=market_type, source_type=source_type, cache_enabled=True)
-                
-                if df is None or df.empty:
-                    failed_codes.append((stock_code, "无法获取数据"))
-                    continue
-                
-                # 执行回测
-                strategy = StrategyFactory.create_strategy(selected_strategy, params)
-                engine = BacktestEngine(
-                    initial_cash=initial_cash, 
-                    buy_commission=buy_commission,
-                    sell_commission=sell_commission,
-                    allow_fractional=True,
-                    min_trade_value=0
-                )
-                result = engine.run(df, strategy)
-                
-                # 记录结果
-                results.append({
-                    'code': stock_code,
-                    'total_return': result.total_return,
-                    'benchmark_return': result.benchmark_return,
-                    'win_rate': result.win_rate,
-                    'total_trades': result.total_trades,
-                    'final_equity': result.df['equity'].iloc[-1],
-                    'max_drawdown': result.max_drawdown if hasattr(result, 'max_drawdown') else 0,
-                    'sharpe_ratio': result.sharpe_ratio if hasattr(result, 'sharpe_ratio') else 0
-                })
-                
-                # 收集交易记录
-                if result.trade_log:
-                    for trade in result.trade_log:
-                        trade_record = trade.copy()
-                        trade_record['股票代码'] = stock_code
-                        all_trades.append(trade_record)
-                
-            except Exception as e:
-                failed_codes.append((stock_code, str(e)))
-            
-            # 更新进度
-            progress_bar.progress((idx + 1) / len(stock_codes))
+        # 多进程并行回测，每完成一只股票更新一次进度
+        runner = BatchBacktestRunner(
+            strategy_name=selected_strategy,
+            params=params,
+            start_date=start_date,
+            end_date=end_date,
+            market=market_type,
+            source_type=source_type,
+            interval=interval,
+            token=tushare_token,
+            engine_kwargs={
+                'initial_cash': initial_cash,
+                'buy_commission': buy_commission,
+                'sell_commission': sell_commission,
+                'allow_fractional': True,
+                'min_trade_value': 0
+            },
+            max_workers=batch_workers
+        )
+        
+        # 先并发预热缓存，回测阶段取数全部命中缓存
+        def update_warm_progress(done, total, code):
+            status_text.text(f"正在获取数据 {code} ({done}/{total})...")
+            progress_bar.progress(done / total)
+        
+        warm_result = runner.warm_cache(stock_codes, progress_callback=update_warm_progress)
+        if warm_result and 'error' in warm_result:
+            st.warning(f"⚠️ 缓存预热失败（{warm_result['error']}），将在回测时逐只获取数据")
+        
+        def update_progress(done, total, item):
+            status_text.text(f"已完成 {item.code} ({done}/{total})...")
+            progress_bar.progress(done / total)
+        
+        batch_result = runner.run(stock_codes, progress_callback=update_progress)
+        results = batch_result.results
+        all_trades = batch_result.trades  # 存储所有交易记录
+        failed_codes = batch_result.failed_codes
         
         status_text.empty()
         progress_bar.empty()
@@ -466,6 +463,7 @@ if run_btn:
             st.subheader("📈 资金曲线与技术指标")
         
             # 根据策略类型决定子图数量
+            plt = get_pyplot()
             if selected_strategy == "多重底入场策略":
                 fig = plt.figure(figsize=(12, 14))
                 # 主图：股价 + 买卖点
@@ -7,20 +7,89 @@ import pandas as pd
 import numpy as np
 from abc import ABC, abstractmethod
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+
+# 交易事件的结构化数组类型
+TRADE_DTYPE = np.dtype([
+    ('bar', np.int64),         # 成交K线的位置
+    ('side', np.int8),         # 1=买入/加仓，-1=卖出/止盈
+    ('action', np.int16),      # 操作名称在 BacktestResult.actions 中的编号
+    ('price', np.float64),     # 成交价格
+    ('quantity', np.float64),  # 成交数量（卖出为NaN，交易日志中不含数量）
+    ('asset', np.float64)      # 成交后的总资产
+])
 
 
 @dataclass
 class BacktestResult:
-    """回测结果数据类"""
-    df: pd.DataFrame  # 包含equity, signal等的完整数据
-    trade_log: List[Dict]  # 交易日志
+    """
+    回测结果数据类（列式存储）
+    
+    净值、持仓和交易事件保存为NumPy数组，汇总指标在回测结束时计算；
+    完整数据 df 和中文键的交易日志 trade_log 在首次访问时构建。
+    summary_only 回测只保留净值、持仓和交易事件，不能访问 df。
+    """
+    dates: pd.Index  # K线时间索引
+    closes: Optional[np.ndarray]  # 收盘价（summary_only 时为None）
+    signals: Optional[np.ndarray]  # 信号 (1=买入, -1=卖出, 0=持有)（summary_only 时为None）
+    equity: np.ndarray  # 每根K线的净值
+    positions: np.ndarray  # 每根K线收盘时的持仓数量
+    trades: np.ndarray  # 交易事件（TRADE_DTYPE 结构化数组）
+    actions: Tuple[str, ...]  # 交易事件的操作名称
     total_return: float  # 总收益率
     benchmark_return: float  # 基准收益率
     win_rate: float  # 胜率
     total_trades: int  # 交易次数
     initial_cash: float  # 初始资金
     final_equity: float  # 最终资产
+    whole_shares: bool = False  # 是否只能整股交易（交易日志中的数量为整数）
+    frame: Optional[pd.DataFrame] = field(default=None, repr=False, compare=False)  # 含指标列的信号数据（summary_only 时为None）
+    _df: Optional[pd.DataFrame] = field(default=None, init=False, repr=False, compare=False)
+    _trade_log: Optional[List[Dict]] = field(default=None, init=False, repr=False, compare=False)
+    
+    @property
+    def summary_only(self) -> bool:
+        """是否为只保留汇总的回测结果"""
+        return self.closes is None
+    
+    @property
+    def benchmark(self) -> np.ndarray:
+        """基准净值（买入持有）"""
+        if self.summary_only:
+            raise ValueError("summary_only 回测结果不包含收盘价")
+        return self.initial_cash * (self.closes / self.closes[0])
+    
+    @property
+    def df(self) -> pd.DataFrame:
+        """包含equity, benchmark, signal等的完整数据（首次访问时构建）"""
+        if self._df is None:
+            if self.summary_only:
+                raise ValueError("summary_only 回测结果不包含完整数据，请使用 equity / positions / trades")
+            df = self.frame
+            if df is None:
+                df = pd.DataFrame({'close': self.closes, 'signal': self.signals}, index=self.dates)
+            df['equity'] = self.equity
+            df['benchmark'] = self.benchmark
+            self._df = df
+            self.frame = None
+        return self._df
+    
+    @property
+    def trade_log(self) -> List[Dict]:
+        """交易日志（首次访问时由交易事件构建）"""
+        if self._trade_log is None:
+            trade_log = []
+            dates = self.dates[self.trades['bar']]
+            for trade, trade_date in zip(self.trades.tolist(), dates):
+                _, _, action, price, quantity, asset = trade
+                record = {'日期': trade_date, '操作': self.actions[action], '价格': price}
+                if quantity == quantity:
+                    record['数量'] = int(quantity) if self.whole_shares else quantity
+                record['资产'] = asset
+                trade_log.append(record)
+            self._trade_log = trade_log
+        return self._trade_log
 
 
 class Strategy(ABC):
@@ -171,6 +240,48 @@ class WaveStrategy(Strategy):
         return "波段策略"
 
 
+def _build_sparse_table(values: np.ndarray, func=np.fmax) -> List[np.ndarray]:
+    """
+    构建区间最值稀疏表
+    
+    table[k][i] 为 values[i : i + 2**k] 的最值，构建 O(n log n)，查询 O(1)
+    
+    Args:
+        values: 一维数组
+        func: 二元最值函数（np.fmax 会跳过NaN，与 pandas.Series.max 一致）
+    """
+    table = [values]
+    width = 1
+    while width * 2 <= len(values):
+        prev = table[-1]
+        table.append(func(prev[:-width], prev[width:]))
+        width *= 2
+    return table
+
+
+def _range_max(table: List[np.ndarray], left: int, right: int) -> float:
+    """查询闭区间 [left, right] 的最大值"""
+    k = int(right - left + 1).bit_length() - 1
+    return np.fmax(table[k][left], table[k][right - (1 << k) + 1])
+
+
+def _first_at_least(table: List[np.ndarray], values: np.ndarray, start: int, target: float) -> int:
+    """
+    查找 start 及之后第一个 values[j] >= target 的位置（稀疏表二分跳跃，O(log n)）
+    
+    Returns:
+        位置索引，不存在时返回 -1
+    """
+    n = len(values)
+    pos = start
+    for k in range(len(table) - 1, -1, -1):
+        if pos + (1 << k) <= n and table[k][pos] < target:
+            pos += 1 << k
+    if pos < n and values[pos] >= target:
+        return pos
+    return -1
+
+
 class MultipleDivergenceStrategy(Strategy):
     """多重底入场策略"""
     
@@ -185,65 +296,72 @@ class MultipleDivergenceStrategy(Strategy):
         df['dea'] = df['dif'].ewm(span=self.params['signal'], adjust=False).mean()
         df['macd_hist'] = (df['dif'] - df['dea']) * 2
         
-        # 识别MACD柱的局部低点
-        df['is_macd_trough'] = False
-        for i in range(2, len(df) - 2):
-            if (df['macd_hist'].iloc[i] < df['macd_hist'].iloc[i-1] and 
-                df['macd_hist'].iloc[i] < df['macd_hist'].iloc[i-2] and
-                df['macd_hist'].iloc[i] < df['macd_hist'].iloc[i+1] and
-                df['macd_hist'].iloc[i] < df['macd_hist'].iloc[i+2] and
-                df['macd_hist'].iloc[i] < 0):
-                df.loc[df.index[i], 'is_macd_trough'] = True
+        n = len(df)
+        close = df['close'].to_numpy(dtype=np.float64)
+        hist = df['macd_hist'].to_numpy(dtype=np.float64)
+        
+        # 识别MACD柱的局部低点：比前后各两根都低且位于0轴下方
+        is_trough = np.zeros(n, dtype=bool)
+        if n >= 5:
+            center = hist[2:n - 2]
+            is_trough[2:n - 2] = (
+                (center < hist[1:n - 3]) & (center < hist[0:n - 4]) &
+                (center < hist[3:n - 1]) & (center < hist[4:n]) &
+                (center < 0)
+            )
+        df['is_macd_trough'] = is_trough
         
         # 查找多重底信号
         lookback = self.params['lookback']
         divergence_count = self.params['divergence_count']
         zero_threshold = self.params['zero_threshold']
-        
-        for i in range(lookback, len(df)):
-            if df['is_macd_trough'].iloc[i]:
-                # 查找前面的MACD低点
-                previous_troughs = []
-                for j in range(i - 5, max(i - lookback, 0), -1):
-                    if df['is_macd_trough'].iloc[j]:
-                        previous_troughs.append(j)
-                        if len(previous_troughs) >= divergence_count - 1:
-                            break
+        profit_ratio = 1 + self.params['profit_pct'] / 100
+        
+        signal = np.zeros(n, dtype=np.int64)
+        trough_idx = np.flatnonzero(is_trough)
+        if len(trough_idx) == 0:
+            return df
+        
+        hist_table = _build_sparse_table(hist, np.fmax)
+        close_table = _build_sparse_table(np.where(np.isnan(close), -np.inf, close), np.maximum)
+        
+        # 前序低点只在 (i - lookback, i - 5] 内查找，最多取 divergence_count - 1 个（至少取1个）
+        required = divergence_count - 1
+        take_max = max(required, 1)
+        hi = np.searchsorted(trough_idx, trough_idx - 5, side='right')
+        lo = np.searchsorted(trough_idx, np.maximum(trough_idx - lookback, 0), side='right')
+        
+        for t, i in enumerate(trough_idx.tolist()):
+            if i < lookback:
+                continue
+            available = max(int(hi[t] - lo[t]), 0)
+            if available < required:
+                continue
+            take = min(available, take_max)
+            all_indices = trough_idx[hi[t] - take:hi[t]].tolist() + [i]
+            
+            valid_divergence = True
+            for idx1, idx2 in zip(all_indices, all_indices[1:]):
+                # 价格创新低但MACD不创新低
+                if close[idx2] >= close[idx1] or hist[idx2] <= hist[idx1]:
+                    valid_divergence = False
+                    break
                 
-                if len(previous_troughs) >= divergence_count - 1:
-                    valid_divergence = True
-                    all_indices = previous_troughs[::-1] + [i]
-                    
-                    for k in range(len(all_indices) - 1):
-                        idx1 = all_indices[k]
-                        idx2 = all_indices[k + 1]
-                        
-                        price1 = df['close'].iloc[idx1]
-                        price2 = df['close'].iloc[idx2]
-                        macd1 = df['macd_hist'].iloc[idx1]
-                        macd2 = df['macd_hist'].iloc[idx2]
-                        
-                        # 价格创新低但MACD不创新低
-                        if price2 >= price1 or macd2 <= macd1:
-                            valid_divergence = False
-                            break
-                        
-                        # 两底之间MACD要回到接近0轴
-                        between_max = df['macd_hist'].iloc[idx1:idx2+1].max()
-                        if between_max < -zero_threshold:
-                            valid_divergence = False
-                            break
-                    
-                    if valid_divergence:
-                        df.loc[df.index[i], 'signal'] = 1
-                        
-                        # 止盈
-                        entry_price = df['close'].iloc[i]
-                        target_price = entry_price * (1 + self.params['profit_pct'] / 100)
-                        for j in range(i + 1, len(df)):
-                            if df['close'].iloc[j] >= target_price:
-                                df.loc[df.index[j], 'signal'] = -1
-                                break
+                # 两底之间MACD要回到接近0轴
+                if _range_max(hist_table, idx1, idx2) < -zero_threshold:
+                    valid_divergence = False
+                    break
+            
+            if valid_divergence:
+                signal[i] = 1
+                
+                # 止盈：之后第一根收盘价达到目标价的K线
+                target_price = close[i] * profit_ratio
+                j = _first_at_least(close_table, close, i + 1, target_price)
+                if j >= 0:
+                    signal[j] = -1
+        
+        df['signal'] = signal
         
         return df
     
@@ -254,11 +372,15 @@ class MultipleDivergenceStrategy(Strategy):
 class BacktestEngine:
     """回测引擎"""
     
+    # 标准策略的交易操作名称（TRADE_DTYPE 中 action 字段的编号顺序）
+    STANDARD_ACTIONS = ('买入', '卖出')
+    
     def __init__(self, initial_cash: float = 100000, 
                  buy_commission: float = 0.0003, 
                  sell_commission: float = 0.0003,
                  allow_fractional: bool = True, 
-                 min_trade_value: float = 0):
+                 min_trade_value: float = 0,
+                 vectorized: bool = True):
         """
         初始化回测引擎
         
@@ -268,20 +390,24 @@ class BacktestEngine:
             sell_commission: 卖出手续费率（如0.0003表示万三）
             allow_fractional: 是否允许小数股交易（True=支持小数，False=只能整股）
             min_trade_value: 最小交易金额（0=无限制）
+            vectorized: 是否使用数组执行路径（信号只包含1/-1/0时生效，结果与逐行回测一致）
         """
         self.initial_cash = initial_cash
         self.buy_commission = buy_commission
         self.sell_commission = sell_commission
         self.allow_fractional = allow_fractional
         self.min_trade_value = min_trade_value
+        self.vectorized = vectorized
     
-    def run(self, df: pd.DataFrame, strategy: Strategy) -> BacktestResult:
+    def run(self, df: pd.DataFrame, strategy: Strategy, summary_only: bool = False) -> BacktestResult:
         """
         运行回测
         
         Args:
             df: 包含OHLCV数据的DataFrame
             strategy: 策略实例
+            summary_only: 只保留汇总指标、净值/持仓数组和交易事件，不保留收盘价、信号和策略计算的指标数据，
+                          之后不能访问 df（批量回测只需要汇总指标时使用，每只股票的内存占用从MB级降到KB级）
             
         Returns:
             BacktestResult对象
@@ -291,18 +417,131 @@ class BacktestEngine:
         
         # 根据策略类型选择回测逻辑
         if isinstance(strategy, WaveStrategy):
-            return self._run_wave_backtest(df, strategy)
+            return self._run_wave_backtest(df, strategy, summary_only)
         else:
-            return self._run_standard_backtest(df, strategy)
+            return self._run_standard_backtest(df, strategy, summary_only)
     
-    def _run_standard_backtest(self, df: pd.DataFrame, strategy: Strategy) -> BacktestResult:
+    def _run_standard_backtest(self, df: pd.DataFrame, strategy: Strategy,
+                               summary_only: bool = False) -> BacktestResult:
         """标准回测逻辑（适用于大多数策略）"""
+        if self.vectorized and self._is_standard_signal(df['signal']):
+            return self._run_standard_backtest_array(df, summary_only)
+        return self._run_standard_backtest_rows(df, summary_only)
+    
+    @staticmethod
+    def _is_standard_signal(signal: pd.Series) -> bool:
+        """判断信号列是否只包含 1/-1/0（标准信号约定）"""
+        values = signal.to_numpy()
+        if values.dtype.kind not in 'iuf':
+            return False
+        return bool(np.isin(values, (1, -1, 0)).all())
+    
+    def _run_standard_backtest_array(self, df: pd.DataFrame, summary_only: bool = False) -> BacktestResult:
+        """
+        标准回测逻辑（数组版本）
+        
+        直接在close/signal的NumPy数组上运行状态机，避免iterrows逐行构造Series，
+        交易规则与 _run_standard_backtest_rows 完全一致
+        """
+        equity_curve, positions, trades = self._simulate_standard(
+            df['close'].to_numpy(dtype=np.float64),
+            df['signal'].to_numpy()
+        )
+        
+        return self._calculate_result(df, equity_curve, positions, trades, self.STANDARD_ACTIONS, summary_only)
+    
+    def simulate_signals(self, closes: np.ndarray,
+                         signals: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float, int]:
+        """
+        在收盘价和标准信号数组上回测，不构建 BacktestResult
+        
+        供参数扫描等在同一组行情上反复回测的场景使用，交易规则与 run 的标准回测完全一致
+        
+        Args:
+            closes: 收盘价数组
+            signals: 信号数组 (1=买入, -1=卖出, 0=持有)
+            
+        Returns:
+            (净值数组, 交易事件数组（TRADE_DTYPE）, 胜率, 卖出次数)
+        """
+        equity, _, trades = self._simulate_standard(np.asarray(closes, dtype=np.float64), np.asarray(signals))
+        win_rate, total_trades = self._calculate_win_rate(trades)
+        return equity, trades, win_rate, total_trades
+    
+    def _simulate_standard(self, closes: np.ndarray,
+                           signals: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        在数组上运行标准买卖状态机
+        
+        只在信号非0的K线上推进状态，其余K线的现金和持仓保持不变，
+        净值曲线按"最近一次状态"整体向量化计算
+        
+        Args:
+            closes: 收盘价数组
+            signals: 信号数组 (1=买入, -1=卖出, 0=持有)
+            
+        Returns:
+            (净值数组, 持仓数组, 交易事件数组)
+        """
+        buy_rate = 1 + self.buy_commission
+        sell_rate = 1 - self.sell_commission
+        allow_fractional = self.allow_fractional
+        min_trade_value = self.min_trade_value
+        
+        cash = self.initial_cash
+        position = 0
+        trades = []
+        
+        event_idx = np.flatnonzero(signals)
+        event_cash = np.empty(len(event_idx), dtype=np.float64)
+        event_position = np.empty(len(event_idx), dtype=np.float64)
+        event_prices = closes[event_idx].tolist()
+        event_signals = signals[event_idx].tolist()
+        
+        for k, i in enumerate(event_idx.tolist()):
+            price = event_prices[k]
+            sig = event_signals[k]
+            
+            # 买入
+            if sig == 1 and position == 0:
+                cost = price * buy_rate
+                if allow_fractional:
+                    # 与逐行版本一致使用 np.round（Python round 的结果可能相差1个ULP）
+                    position = np.round(cash / cost, 8)
+                else:
+                    position = int(cash / cost)
+                
+                trade_value = position * price
+                if position > 0 and trade_value >= min_trade_value:
+                    cash -= position * cost
+                    trades.append((i, 1, 0, price, position, cash + position * price))
+            
+            # 卖出
+            elif sig == -1 and position > 0:
+                cash += price * position * sell_rate
+                position = 0
+                trades.append((i, -1, 1, price, np.nan, cash))
+            
+            event_cash[k] = cash
+            event_position[k] = position
+        
+        # 每根K线对应的最近一次状态（第一次信号之前为初始状态）
+        event_cash = np.concatenate(([self.initial_cash], event_cash))
+        event_position = np.concatenate(([0.0], event_position))
+        state = np.searchsorted(event_idx, np.arange(len(closes)), side='right')
+        positions = event_position[state]
+        
+        return event_cash[state] + positions * closes, positions, np.array(trades, dtype=TRADE_DTYPE)
+    
+    def _run_standard_backtest_rows(self, df: pd.DataFrame, summary_only: bool = False) -> BacktestResult:
+        """标准回测逻辑（逐行版本，用于非标准信号）"""
         cash = self.initial_cash
         position = 0
         equity_curve = []
-        trade_log = []
+        positions = []
+        trades = []
         
-        for date, row in df.iterrows():
+        for i, (_, row) in enumerate(df.iterrows()):
             price = row['close']
             sig = row['signal']
             
@@ -324,113 +563,117 @@ class BacktestEngine:
                 if position > 0 and trade_value >= self.min_trade_value:
                     actual_cost = position * cost
                     cash -= actual_cost
-                    trade_log.append({
-                        '日期': date, 
-                        '操作': '买入', 
-                        '价格': price,
-                        '数量': position,
-                        '资产': cash + position * price
-                    })
+                    trades.append((i, 1, 0, price, position, cash + position * price))
             
             # 卖出
             elif sig == -1 and position > 0:
                 revenue = price * position * (1 - self.sell_commission)
                 cash += revenue
                 position = 0
-                trade_log.append({
-                    '日期': date, 
-                    '操作': '卖出', 
-                    '价格': price, 
-                    '资产': cash
-                })
+                trades.append((i, -1, 1, price, np.nan, cash))
             
-            # 记录每日净值
+            # 记录每日净值和持仓
             equity_curve.append(cash + position * price)
+            positions.append(position)
         
-        df['equity'] = equity_curve
-        
-        return self._calculate_result(df, trade_log)
+        return self._calculate_result(df, np.array(equity_curve, dtype=np.float64),
+                                      np.array(positions, dtype=np.float64),
+                                      np.array(trades, dtype=TRADE_DTYPE), self.STANDARD_ACTIONS, summary_only)
     
-    def _run_wave_backtest(self, df: pd.DataFrame, strategy: WaveStrategy) -> BacktestResult:
-        """波段策略专用回测逻辑"""
+    def _run_wave_backtest(self, df: pd.DataFrame, strategy: WaveStrategy,
+                           summary_only: bool = False) -> BacktestResult:
+        """
+        波段策略专用回测逻辑
+        
+        前一根K线的收盘价和均线在循环前一次性计算为数组，
+        建仓/加仓/止盈/重新入场的状态机直接在数组上运行
+        """
+        params = strategy.params
+        
+        closes = df['close'].to_numpy(dtype=np.float64)
+        prev_closes = np.concatenate(([np.nan], closes[:-1])).tolist()
+        ma_values = {}
+        prev_ma_values = {}
+        for col in ('first_profit_ma', 'reentry_ma', 'subsequent_profit_ma'):
+            values = df[col].to_numpy(dtype=np.float64)
+            ma_values[col] = values.tolist()
+            prev_ma_values[col] = np.concatenate(([np.nan], values[:-1])).tolist()
+        closes = closes.tolist()
+        
+        reentry_ma = ma_values['reentry_ma']
+        prev_reentry_ma = prev_ma_values['reentry_ma']
+        
+        buy_rate = 1 + self.buy_commission
+        sell_rate = 1 - self.sell_commission
+        allow_fractional = self.allow_fractional
+        
+        first_position_ratio = params['first_position'] / 100
+        subsequent_position_ratio = params['subsequent_position'] / 100
+        first_buy_label = f'首次买入{params["first_position"]}%'
+        reentry_label = f'突破MA{params["reentry_ma"]}买入{params["subsequent_position"]}%'
+        
         cash = self.initial_cash
         position = 0
-        equity_curve = []
-        trade_log = []
+        equity_curve = np.empty(len(closes), dtype=np.float64)
+        positions = np.empty(len(closes), dtype=np.float64)
+        trades = []
+        # 操作名称 -> TRADE_DTYPE 中的 action 编号
+        actions = {}
         
         # 波段策略专用变量
         has_added = False
-        start_price = df['close'].iloc[0]
-        current_start_price = start_price
+        current_start_price = closes[0] if closes else np.nan
         waiting_for_reentry = False
         is_first_band = True
         
-        params = strategy.params
-        
-        for date, row in df.iterrows():
-            price = row['close']
-            
+        for i, price in enumerate(closes):
             # 第一个波段：第一天买入首批仓位
             if position == 0 and not waiting_for_reentry and is_first_band:
-                position_ratio = params['first_position'] / 100
-                cost = price * (1 + self.buy_commission)
-                buy_cash = cash * position_ratio
+                cost = price * buy_rate
+                buy_cash = cash * first_position_ratio
                 
-                # 计算可购买数量（支持小数股）
-                if self.allow_fractional:
-                    max_shares = buy_cash / cost
-                    shares_to_buy = round(max_shares, 8)
+                # 计算可购买数量（支持小数股，与逐行版本一致使用 np.round）
+                if allow_fractional:
+                    shares_to_buy = np.round(buy_cash / cost, 8)
                 else:
                     shares_to_buy = int(buy_cash / cost)
                 
                 if shares_to_buy > 0:
                     position = shares_to_buy
-                    actual_cost = position * cost
-                    cash -= actual_cost
+                    cash -= position * cost
                     current_start_price = price
-                    trade_log.append({
-                        '日期': date, 
-                        '操作': f'首次买入{params["first_position"]}%', 
-                        '价格': price,
-                        '数量': position,
-                        '资产': cash + position * price
-                    })
+                    trades.append((i, 1, actions.setdefault(first_buy_label, len(actions)),
+                                   price, position, cash + position * price))
             
             # 等待重新入场
             elif position == 0 and waiting_for_reentry:
-                reentry_ma_value = row['reentry_ma']
-                prev_close = df['close'].shift(1).loc[date]
-                prev_reentry_ma = df['reentry_ma'].shift(1).loc[date]
+                reentry_ma_value = reentry_ma[i]
+                prev_close = prev_closes[i]
+                prev_reentry_ma_value = prev_reentry_ma[i]
                 
-                if not pd.isna(reentry_ma_value) and not pd.isna(prev_close) and not pd.isna(prev_reentry_ma):
-                    cross_above_ma = (prev_close < prev_reentry_ma) and (price > reentry_ma_value)
+                # NaN != NaN，用于替代 pd.isna 的逐值判断
+                if (reentry_ma_value == reentry_ma_value and prev_close == prev_close
+                        and prev_reentry_ma_value == prev_reentry_ma_value):
+                    cross_above_ma = (prev_close < prev_reentry_ma_value) and (price > reentry_ma_value)
                     if cross_above_ma:
-                        position_ratio = params['subsequent_position'] / 100
-                        cost = price * (1 + self.buy_commission)
-                        buy_cash = cash * position_ratio
+                        cost = price * buy_rate
+                        buy_cash = cash * subsequent_position_ratio
                         
                         # 计算可购买数量（支持小数股）
-                        if self.allow_fractional:
-                            max_shares = buy_cash / cost
-                            shares_to_buy = round(max_shares, 8)
+                        if allow_fractional:
+                            shares_to_buy = np.round(buy_cash / cost, 8)
                         else:
                             shares_to_buy = int(buy_cash / cost)
                         
                         if shares_to_buy > 0:
                             position = shares_to_buy
-                            actual_cost = position * cost
-                            cash -= actual_cost
+                            cash -= position * cost
                             current_start_price = price
                             has_added = False
                             waiting_for_reentry = False
                             is_first_band = False
-                            trade_log.append({
-                                '日期': date, 
-                                '操作': f'突破MA{params["reentry_ma"]}买入{params["subsequent_position"]}%', 
-                                '价格': price,
-                                '数量': position,
-                                '资产': cash + position * price
-                            })
+                            trades.append((i, 1, actions.setdefault(reentry_label, len(actions)),
+                                           price, position, cash + position * price))
             
             # 持仓中：判断加仓或止盈
             elif position > 0:
@@ -438,100 +681,113 @@ class BacktestEngine:
                     add_drop_pct = params['first_add_drop']
                     profit_target_pct = params['first_profit_target']
                     profit_ma_col = 'first_profit_ma'
-                    position_ratio = params['first_position'] / 100
+                    position_ratio = first_position_ratio
                 else:
                     add_drop_pct = params['subsequent_add_drop']
                     profit_target_pct = params['subsequent_profit_target']
                     profit_ma_col = 'subsequent_profit_ma'
-                    position_ratio = params['subsequent_position'] / 100
+                    position_ratio = subsequent_position_ratio
                 
                 # 加仓
                 drop_threshold = current_start_price * (1 - add_drop_pct / 100)
                 if price <= drop_threshold and not has_added:
-                    cost = price * (1 + self.buy_commission)
+                    cost = price * buy_rate
                     
                     # 计算可购买数量（支持小数股）
-                    if self.allow_fractional:
-                        max_shares = cash / cost
-                        add_shares = round(max_shares, 8)
+                    if allow_fractional:
+                        add_shares = np.round(cash / cost, 8)
                     else:
                         add_shares = int(cash / cost)
                     
                     if add_shares > 0:
-                        actual_cost = add_shares * cost
-                        cash -= actual_cost
+                        cash -= add_shares * cost
                         position += add_shares
                         has_added = True
                         add_ratio = int((1 - position_ratio) * 100)
-                        trade_log.append({
-                            '日期': date, 
-                            '操作': f'加仓{add_ratio}%', 
-                            '价格': price,
-                            '数量': add_shares,
-                            '资产': cash + position * price
-                        })
+                        trades.append((i, 1, actions.setdefault(f'加仓{add_ratio}%', len(actions)),
+                                       price, add_shares, cash + position * price))
                 
                 # 止盈
                 profit_threshold = current_start_price * (1 + profit_target_pct / 100)
-                profit_ma_value = row[profit_ma_col]
-                prev_close = df['close'].shift(1).loc[date]
+                profit_ma_value = ma_values[profit_ma_col][i]
+                prev_close = prev_closes[i]
+                prev_profit_ma = prev_ma_values[profit_ma_col][i]
                 
-                if not pd.isna(profit_ma_value) and not pd.isna(prev_close):
-                    prev_profit_ma = df[profit_ma_col].shift(1).loc[date]
-                    if not pd.isna(prev_profit_ma):
-                        cross_below_ma = (prev_close >= prev_profit_ma) and (price < profit_ma_value)
-                        if price >= profit_threshold and cross_below_ma:
-                            revenue = price * position * (1 - self.sell_commission)
-                            cash += revenue
-                            position = 0
-                            has_added = False
-                            waiting_for_reentry = True
-                            trade_log.append({
-                                '日期': date, 
-                                '操作': '止盈', 
-                                '价格': price, 
-                                '资产': cash
-                            })
+                if (profit_ma_value == profit_ma_value and prev_close == prev_close
+                        and prev_profit_ma == prev_profit_ma):
+                    cross_below_ma = (prev_close >= prev_profit_ma) and (price < profit_ma_value)
+                    if price >= profit_threshold and cross_below_ma:
+                        cash += price * position * sell_rate
+                        position = 0
+                        has_added = False
+                        waiting_for_reentry = True
+                        trades.append((i, -1, actions.setdefault('止盈', len(actions)), price, np.nan, cash))
             
-            equity_curve.append(cash + position * price)
-        
-        df['equity'] = equity_curve
+            equity_curve[i] = cash + position * price
+            positions[i] = position
         
-        return self._calculate_result(df, trade_log)
+        return self._calculate_result(df, equity_curve, positions, np.array(trades, dtype=TRADE_DTYPE),
+                                      tuple(actions), summary_only)
     
-    def _calculate_result(self, df: pd.DataFrame, trade_log: List[Dict]) -> BacktestResult:
-        """计算回测结果"""
-        # 基准收益（买入持有）
-        df['benchmark'] = self.initial_cash * (df['close'] / df['close'].iloc[0])
-        
-        # 总收益率
-        total_return = (df['equity'].iloc[-1] - self.initial_cash) / self.initial_cash
-        benchmark_return = (df['benchmark'].iloc[-1] - self.initial_cash) / self.initial_cash
+    def _calculate_result(self, df: pd.DataFrame, equity: np.ndarray, positions: np.ndarray,
+                          trades: np.ndarray, actions: Tuple[str, ...], summary_only: bool = False) -> BacktestResult:
+        """
+        计算回测结果
         
-        # 胜率计算
-        win_count = 0
-        sell_count = 0
-        last_asset = self.initial_cash
+        Args:
+            df: 策略计算信号后的数据
+            equity: 每根K线的净值
+            positions: 每根K线的持仓数量
+            trades: 交易事件（TRADE_DTYPE 结构化数组）
+            actions: 交易事件的操作名称
+            summary_only: 只保留净值、持仓和交易事件
+        """
+        closes = df['close'].to_numpy(dtype=np.float64)
         
-        for trade in trade_log:
-            if trade['操作'] in ['卖出', '止盈']:
-                sell_count += 1
-                if trade['资产'] > last_asset:
-                    win_count += 1
-                last_asset = trade['资产']
+        # 总收益率与基准收益（买入持有）
+        final_equity = equity[-1]
+        total_return = (final_equity - self.initial_cash) / self.initial_cash
+        benchmark_return = (self.initial_cash * (closes[-1] / closes[0]) - self.initial_cash) / self.initial_cash
         
-        win_rate = win_count / sell_count if sell_count > 0 else 0
+        # 胜率计算
+        win_rate, sell_count = self._calculate_win_rate(trades)
         
         return BacktestResult(
-            df=df,
-            trade_log=trade_log,
+            dates=df.index,
+            closes=None if summary_only else closes,
+            signals=None if summary_only else df['signal'].to_numpy(),
+            equity=equity,
+            positions=positions,
+            trades=trades,
+            actions=actions,
             total_return=total_return,
             benchmark_return=benchmark_return,
             win_rate=win_rate,
             total_trades=sell_count,
             initial_cash=self.initial_cash,
-            final_equity=df['equity'].iloc[-1]
+            final_equity=final_equity,
+            whole_shares=not self.allow_fractional,
+            frame=None if summary_only else df
         )
+    
+    def _calculate_win_rate(self, trades: np.ndarray) -> Tuple[float, int]:
+        """
+        计算胜率：卖出后资产高于上一次卖出（首次为初始资金）即为盈利
+        
+        Args:
+            trades: 交易事件（TRADE_DTYPE 结构化数组）
+        
+        Returns:
+            (胜率, 卖出次数)
+        """
+        sell_assets = trades['asset'][trades['side'] == -1]
+        sell_count = len(sell_assets)
+        if sell_count == 0:
+            return 0, 0
+        
+        last_assets = np.concatenate(([self.initial_cash], sell_assets[:-1]))
+        win_count = int(np.count_nonzero(sell_assets > last_assets))
+        return win_count / sell_count, sell_count
 
 
 class StrategyFactory:
@@ -0,0 +1,148 @@
+"""
+测试 Arrow IPC 存储格式
+验证读写一致、内存映射零拷贝读取、重写文件不影响已加载数据、切换格式后分区不重复（离线）
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import CacheManager, CacheStorage
+from test_backtest_engine import make_ohlcv
+from test_fetch_many import make_cache_manager
+from test_partitioned_storage import slice_dates
+from test_cache_lookup import d
+
+
+def test_roundtrip():
+    """测试1: 两种布局下读写一致"""
+    print("=" * 80)
+    print("测试1: Arrow IPC 读写一致")
+    print("=" * 80)
+
+    df = make_ohlcv(n=1200, seed=12)
+    start, end = df.index[0].date(), df.index[-1].date()
+    for layout in ('partitioned', 'range'):
+        manager = make_cache_manager(format='arrow_ipc', layout=layout)
+        try:
+            assert manager.save_data(df, 'akshare', 'a_stock', '000001', start, end)
+            files = [f for f in manager.data_dir.rglob('*') if f.is_file()]
+            assert files and all(f.suffix == '.arrow' for f in files)
+
+            manager.storage.memory.clear()
+            data = manager.get_data('akshare', 'a_stock', '000001', start, end)
+            pd.testing.assert_frame_equal(data, df, check_freq=False)
+            print(f"✅ {layout}: {len(files)} 个 .arrow 文件，读取结果一致")
+        finally:
+            shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_zero_copy_load():
+    """测试2: 内存映射零拷贝读取"""
+    print("=" * 80)
+    print("测试2: 零拷贝读取")
+    print("=" * 80)
+
+    manager = make_cache_manager(format='arrow_ipc', layout='range')
+    try:
+        df = make_ohlcv(n=200000, seed=13, freq='min')
+        start, end = df.index[0].date(), df.index[-1].date()
+        manager.save_data(df, 'yfinance', 'crypto', 'BTC-USD', start, end, '1m')
+        arrow_file = next(manager.data_dir.rglob('*.arrow'))
+        parquet_file = arrow_file.with_suffix('.parquet')
+        df.to_parquet(parquet_file)
+
+        tracemalloc.start()
+        loaded = CacheStorage._read_arrow_ipc(arrow_file)
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        data_bytes = df.memory_usage(index=True).sum()
+        pd.testing.assert_frame_equal(loaded, df, check_freq=False)
+        if os.name != 'nt':
+            assert allocated < data_bytes * 0.1, (allocated, data_bytes)
+        print(f"   数据 {data_bytes / 1e6:.1f} MB，读取新分配 {allocated / 1e6:.2f} MB")
+
+        t0 = time.perf_counter()
+        for _ in range(10):
+            CacheStorage._read_arrow_ipc(arrow_file)
+        t1 = time.perf_counter()
+        for _ in range(10):
+            pd.read_parquet(parquet_file)
+        t2 = time.perf_counter()
+        print(f"   读取耗时: arrow_ipc {(t1 - t0) * 100:.2f} ms，parquet {(t2 - t1) * 100:.2f} ms")
+        print("✅ 零拷贝读取")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_rewrite_and_format_switch():
+    """测试3: 重写已映射的文件、切换存储格式"""
+    print("=" * 80)
+    print("测试3: 重写文件与切换格式")
+    print("=" * 80)
+
+    manager = make_cache_manager(format='arrow_ipc', layout='partitioned')
+    try:
+        df = make_ohlcv(n=800, seed=14)
+        manager.save_data(slice_dates(df, '2020-01-01', '2020-06-30'), 'akshare', 'a_stock', '000001',
+                          d('2020-01-01'), d('2020-06-30'))
+        before = manager.get_data('akshare', 'a_stock', '000001', d('2020-01-01'), d('2020-06-30'))
+        snapshot = before.copy()
+
+        # 重写同一分区（数值不同），已加载的DataFrame不变
+        changed = slice_dates(df, '2020-01-01', '2020-12-31') * 2
+        manager.save_data(changed, 'akshare', 'a_stock', '000001', d('2020-01-01'), d('2020-12-31'))
+        pd.testing.assert_frame_equal(before, snapshot)
+        after = manager.get_data('akshare', 'a_stock', '000001', d('2020-01-01'), d('2020-06-30'))
+        pd.testing.assert_frame_equal(after, slice_dates(changed, '2020-01-01', '2020-06-30'), check_freq=False)
+        print("✅ 重写分区后已加载的数据不受影响，新查询读取新数据")
+
+        # 改回 parquet 后写入同一分区：旧格式文件合并后删除
+        config = dict(manager.config, storage_format=dict(manager.config['storage_format'], format='parquet'))
+        (manager.cache_root / "config.json").write_text(json.dumps(config), encoding='utf-8')
+        manager = CacheManager(str(manager.cache_root))
+        manager.save_data(slice_dates(df, '2021-01-01', '2021-03-31'), 'akshare', 'a_stock', '000001',
+                          d('2021-01-01'), d('2021-03-31'))
+        dataset_dir = manager.storage.dataset_dir('akshare', 'a_stock', '000001', '1d')
+        assert sorted(f.name for f in dataset_dir.iterdir()) == ['2020.arrow', '2021.parquet']
+        manager.save_data(slice_dates(df, '2020-07-01', '2021-06-30'), 'akshare', 'a_stock', '000001',
+                          d('2020-07-01'), d('2021-06-30'))
+        assert sorted(f.name for f in dataset_dir.iterdir()) == ['2020.parquet', '2021.parquet']
+        data = manager.get_data('akshare', 'a_stock', '000001', d('2020-01-01'), d('2021-06-30'))
+        assert not data.index.duplicated().any()
+        print("✅ 切换格式后同一分区只保留一个文件")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试 Arrow IPC 存储格式...\n")
+
+    test_roundtrip()
+    test_zero_copy_load()
+    test_rewrite_and_format_switch()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
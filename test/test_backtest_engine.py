@@ -0,0 +1,243 @@
+"""
+测试回测引擎
+验证数组执行路径与逐行回测结果完全一致、波段策略状态机（离线，使用随机行情）
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from strategy_backtest import StrategyFactory, BacktestEngine, _build_sparse_table, _range_max, _first_at_least
+
+
+def make_ohlcv(n: int = 2000, seed: int = 7, freq: str = 'D') -> pd.DataFrame:
+    """生成随机游走行情"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    index = pd.date_range('2020-01-01', periods=n, freq=freq)
+    return pd.DataFrame({
+        'open': close * (1 + rng.normal(0, 0.002, n)),
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'close': close,
+        'volume': rng.integers(1000, 100000, n)
+    }, index=index)
+
+
+class FixedSignalStrategy:
+    """使用给定信号序列的策略"""
+
+    def __init__(self, signals):
+        self.signals = signals
+
+    def calculate_signals(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = df.copy()
+        df['signal'] = self.signals
+        return df
+
+
+STANDARD_STRATEGIES = [
+    ("MACD趋势策略", {'fast': 12, 'slow': 26, 'signal': 9}),
+    ("双均线策略(SMA)", {'short': 5, 'long': 20}),
+    ("RSI超买超卖", {'period': 14, 'lower': 30, 'upper': 70}),
+    ("布林带突破", {'period': 20, 'std': 2.0}),
+]
+
+
+def assert_same_result(a, b):
+    """断言两次回测结果一致"""
+    assert np.array_equal(a.df['equity'].to_numpy(), b.df['equity'].to_numpy())
+    assert a.trade_log == b.trade_log
+    assert a.total_return == b.total_return
+    assert a.win_rate == b.win_rate
+    assert a.total_trades == b.total_trades
+    assert a.final_equity == b.final_equity
+
+
+def test_array_path_matches_rows():
+    """测试1: 数组路径与逐行路径结果一致"""
+    print("=" * 80)
+    print("测试1: 数组执行路径与逐行回测一致性")
+    print("=" * 80)
+
+    df = make_ohlcv()
+    for allow_fractional, min_trade_value in [(True, 0), (False, 0), (False, 50000)]:
+        for name, params in STANDARD_STRATEGIES:
+            kwargs = dict(initial_cash=100000, allow_fractional=allow_fractional,
+                          min_trade_value=min_trade_value)
+            fast = BacktestEngine(vectorized=True, **kwargs).run(df, StrategyFactory.create_strategy(name, params))
+            slow = BacktestEngine(vectorized=False, **kwargs).run(df, StrategyFactory.create_strategy(name, params))
+            assert_same_result(fast, slow)
+            equity, trades, win_rate, total_trades = BacktestEngine(**kwargs).simulate_signals(
+                df['close'].to_numpy(), fast.df['signal'].to_numpy())
+            assert np.array_equal(equity, fast.equity) and trades.tobytes() == fast.trades.tobytes()
+            assert (win_rate, total_trades) == (fast.win_rate, fast.total_trades)
+            print(f"✅ {name} (小数股={allow_fractional}, 最小金额={min_trade_value}): "
+                  f"{fast.total_trades} 笔交易一致（simulate_signals 相同）")
+
+    # 股数按 np.round 取8位小数：该资金额用 Python round 会得到 ...0549，np.round 得到 ...0548
+    df = pd.DataFrame({'close': [1.0, 1.0, 2.0, 2.0]}, index=pd.date_range('2024-01-01', periods=4))
+    strategy = FixedSignalStrategy([0, 1, 0, -1])
+    for min_trade_value in (0, 1e9):
+        kwargs = dict(initial_cash=90013.249005485, buy_commission=0, sell_commission=0,
+                      allow_fractional=True, min_trade_value=min_trade_value)
+        fast = BacktestEngine(vectorized=True, **kwargs).run(df, strategy)
+        slow = BacktestEngine(vectorized=False, **kwargs).run(df, strategy)
+        assert fast.equity.tobytes() == slow.equity.tobytes()
+        assert fast.trades.tobytes() == slow.trades.tobytes()
+    print("✅ 小数股数量的舍入与逐行版本逐位一致")
+
+    print()
+
+
+def test_non_standard_signal_fallback():
+    """测试2: 非标准信号回退到逐行回测"""
+    print("=" * 80)
+    print("测试2: 非标准信号回退")
+    print("=" * 80)
+
+    signal = pd.Series([0, 1, 0.5, -1])
+    assert BacktestEngine._is_standard_signal(pd.Series([0, 1, -1, 0]))
+    assert not BacktestEngine._is_standard_signal(signal)
+    assert not BacktestEngine._is_standard_signal(pd.Series(['1', '-1']))
+    print("✅ 信号约定检查正确")
+
+    print()
+
+
+WAVE_PARAMS = {
+    'first_position': 80, 'first_add_drop': 5, 'first_profit_target': 20, 'first_profit_ma': 5,
+    'reentry_ma': 5, 'subsequent_position': 80, 'subsequent_add_drop': 5,
+    'subsequent_profit_target': 15, 'subsequent_profit_ma': 5
+}
+
+
+def test_wave_backtest():
+    """测试3: 波段策略状态机"""
+    print("=" * 80)
+    print("测试3: 波段策略回测")
+    print("=" * 80)
+
+    df = make_ohlcv(n=5000, seed=11)
+    strategy = StrategyFactory.create_strategy("波段策略", WAVE_PARAMS)
+
+    t0 = time.perf_counter()
+    result = BacktestEngine().run(df, strategy)
+    elapsed = time.perf_counter() - t0
+
+    trade_log = result.trade_log
+    assert trade_log and trade_log[0]['操作'] == '首次买入80%'
+    assert trade_log[0]['日期'] == df.index[0]
+    assert len(result.df['equity']) == len(df)
+
+    # 止盈之后只能是重新入场，重新入场之前必须先止盈
+    for prev, curr in zip(trade_log, trade_log[1:]):
+        if prev['操作'] == '止盈':
+            assert curr['操作'].startswith('突破MA')
+        if curr['操作'].startswith('突破MA'):
+            assert prev['操作'] == '止盈'
+
+    # 止盈后空仓，资产等于现金
+    for trade in trade_log:
+        if trade['操作'] == '止盈':
+            assert result.df.loc[trade['日期'], 'equity'] == trade['资产']
+
+    print(f"✅ {len(trade_log)} 笔交易，状态转换正确")
+    print(f"   耗时: {elapsed*1000:.1f} ms（5000根K线）")
+
+    # 股数按 np.round 取8位小数（与原逐行版本一致）：Python round 会得到 45673.31189895
+    flat = make_ohlcv(n=10, seed=12)
+    flat[['open', 'high', 'low', 'close']] = 1.0
+    engine = BacktestEngine(initial_cash=57091.63987369374, buy_commission=0, allow_fractional=True)
+    first = engine.run(flat, strategy).trade_log[0]
+    assert first['数量'] == 45673.31189896 == np.round(57091.63987369374 * 0.8, 8)
+    print("✅ 小数股数量的舍入与逐行版本一致")
+
+    print()
+
+
+def test_divergence_helpers():
+    """测试4: 多重底策略的区间最值与止盈查找"""
+    print("=" * 80)
+    print("测试4: 多重底策略区间查询")
+    print("=" * 80)
+
+    rng = np.random.default_rng(3)
+    values = rng.normal(0, 1, 300)
+    values[[5, 6, 100]] = np.nan
+    table = _build_sparse_table(values, np.fmax)
+    for _ in range(500):
+        left, right = sorted(rng.integers(0, len(values), 2))
+        expected = pd.Series(values[left:right + 1]).max()
+        got = _range_max(table, left, right)
+        assert (np.isnan(expected) and np.isnan(got)) or expected == got
+    print("✅ 区间最大值与 pandas 一致")
+
+    close = rng.uniform(90, 110, 300)
+    close_table = _build_sparse_table(close, np.maximum)
+    for start in range(0, 300, 7):
+        target = close[start] * 1.05
+        hits = np.flatnonzero(close[start + 1:] >= target)
+        expected = start + 1 + hits[0] if len(hits) else -1
+        assert _first_at_least(close_table, close, start + 1, target) == expected
+    print("✅ 止盈位置查找与逐根扫描一致")
+
+    df = make_ohlcv(n=17520, freq='h')
+    params = {'fast': 12, 'slow': 26, 'signal': 9, 'lookback': 30, 'divergence_count': 2,
+              'zero_threshold': 0.3, 'profit_pct': 15}
+    t0 = time.perf_counter()
+    signals = StrategyFactory.create_strategy("多重底入场策略", params).calculate_signals(df)
+    elapsed = time.perf_counter() - t0
+    assert signals.loc[signals['signal'] == 1, 'is_macd_trough'].all()
+    print(f"✅ 17520根1小时K线生成信号耗时: {elapsed*1000:.1f} ms")
+
+    print()
+
+
+def test_speed():
+    """测试5: 1小时线规模的性能对比"""
+    print("=" * 80)
+    print("测试5: 性能对比（17520根1小时K线）")
+    print("=" * 80)
+
+    df = make_ohlcv(n=17520, freq='h')
+    strategy = StrategyFactory.create_strategy("RSI超买超卖", {'period': 14, 'lower': 30, 'upper': 70})
+
+    t0 = time.perf_counter()
+    BacktestEngine(vectorized=False).run(df, strategy)
+    t_rows = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    BacktestEngine(vectorized=True).run(df, strategy)
+    t_array = time.perf_counter() - t0
+
+    print(f"   逐行回测: {t_rows*1000:.1f} ms")
+    print(f"   数组回测: {t_array*1000:.1f} ms")
+    print(f"   加速比: {t_rows / t_array:.1f}x")
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试回测引擎...\n")
+
+    test_array_path_matches_rows()
+    test_non_standard_signal_fallback()
+    test_wave_backtest()
+    test_divergence_helpers()
+    test_speed()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
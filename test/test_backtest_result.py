@@ -0,0 +1,137 @@
+"""
+测试列式回测结果
+验证交易事件数组、按需构建的 df / trade_log、summary_only 模式的结果与内存占用（离线，使用随机行情）
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from strategy_backtest import StrategyFactory, BacktestEngine, TRADE_DTYPE
+from test_backtest_engine import make_ohlcv, STANDARD_STRATEGIES, WAVE_PARAMS
+
+
+def test_trade_events():
+    """测试1: 交易事件数组与交易日志"""
+    print("=" * 80)
+    print("测试1: 交易事件数组")
+    print("=" * 80)
+
+    df = make_ohlcv(n=1500, seed=21)
+    for allow_fractional in (True, False):
+        engine = BacktestEngine(initial_cash=100000, allow_fractional=allow_fractional)
+        result = engine.run(df, StrategyFactory.create_strategy(*STANDARD_STRATEGIES[0]))
+        trades = result.trades
+        assert trades.dtype == TRADE_DTYPE and len(trades) > 0
+        assert result._df is None and result._trade_log is None
+
+        log = result.trade_log
+        assert len(log) == len(trades)
+        for record, trade in zip(log, trades):
+            assert record['日期'] == df.index[trade['bar']]
+            assert record['操作'] == result.actions[trade['action']]
+            assert record['价格'] == trade['price'] and record['资产'] == trade['asset']
+            if trade['side'] == 1:
+                assert type(record['数量']) is (float if allow_fractional else int)
+            else:
+                assert '数量' not in record
+        assert result.total_trades == int((trades['side'] == -1).sum())
+    print("✅ 交易日志由交易事件数组按需生成，整股交易时数量为整数，卖出不含数量")
+
+    result = BacktestEngine().run(df, StrategyFactory.create_strategy("波段策略", WAVE_PARAMS))
+    assert len(result.actions) > len(BacktestEngine.STANDARD_ACTIONS)
+    assert [record['操作'] for record in result.trade_log] == [result.actions[i] for i in result.trades['action']]
+    print(f"✅ 波段策略的操作名称按编号保存（{', '.join(result.actions)}）")
+
+    print()
+
+
+def test_lazy_frame():
+    """测试2: df 首次访问时构建"""
+    print("=" * 80)
+    print("测试2: 按需构建 df")
+    print("=" * 80)
+
+    df = make_ohlcv(n=1000, seed=22)
+    result = BacktestEngine().run(df, StrategyFactory.create_strategy(*STANDARD_STRATEGIES[0]))
+    assert result._df is None
+    full = result.df
+    assert full is result.df
+    assert {'close', 'signal', 'dif', 'dea', 'macd_hist', 'equity', 'benchmark'} <= set(full.columns)
+    assert np.array_equal(full['equity'].to_numpy(), result.equity)
+    assert np.array_equal(full['benchmark'].to_numpy(), result.benchmark)
+    assert np.isclose(full['benchmark'].iloc[-1] / result.initial_cash - 1, result.benchmark_return)
+    print("✅ df 包含策略指标列、equity、benchmark，构建后复用")
+
+    print()
+
+
+def test_summary_only():
+    """测试3: summary_only 只保留汇总与数组"""
+    print("=" * 80)
+    print("测试3: summary_only")
+    print("=" * 80)
+
+    df = make_ohlcv(n=5000, seed=23, freq='h')
+    for name, params in STANDARD_STRATEGIES:
+        full = BacktestEngine().run(df, StrategyFactory.create_strategy(name, params))
+        summary = BacktestEngine().run(df, StrategyFactory.create_strategy(name, params), summary_only=True)
+        assert summary.frame is None and summary.closes is None and summary.signals is None
+        assert np.array_equal(summary.equity, full.equity)
+        assert summary.trade_log == full.trade_log
+        for field in ('total_return', 'benchmark_return', 'win_rate', 'total_trades', 'final_equity'):
+            assert getattr(summary, field) == getattr(full, field), field
+        try:
+            summary.df
+            assert False, "summary_only 结果不应提供 df"
+        except ValueError:
+            pass
+
+        summary_bytes = summary.equity.nbytes + summary.positions.nbytes + summary.trades.nbytes
+        full_bytes = full.df.memory_usage(deep=True).sum() + sys.getsizeof(full.trade_log) + sum(
+            sys.getsizeof(record) for record in full.trade_log)
+        assert summary_bytes < full_bytes / 3, (summary_bytes, full_bytes)
+        print(f"✅ {name}: 汇总指标与完整回测一致，内存 {summary_bytes / 1024:.0f}KB（完整 {full_bytes / 1024:.0f}KB）")
+
+    print()
+
+
+def test_win_rate():
+    """测试4: 胜率按卖出后资产与上一次卖出比较"""
+    print("=" * 80)
+    print("测试4: 胜率")
+    print("=" * 80)
+
+    engine = BacktestEngine(initial_cash=100000)
+    trades = np.zeros(6, dtype=TRADE_DTYPE)
+    trades['side'] = [1, -1, 1, -1, 1, -1]
+    trades['asset'] = [100000, 105000, 105000, 103000, 103000, 110000]
+    assert engine._calculate_win_rate(trades) == (2 / 3, 3)
+    assert engine._calculate_win_rate(np.zeros(0, dtype=TRADE_DTYPE)) == (0, 0)
+    print("✅ 3次卖出中2次盈利，无交易时胜率为0")
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试列式回测结果...\n")
+
+    test_trade_events()
+    test_lazy_frame()
+    test_summary_only()
+    test_win_rate()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,122 @@
+"""
+测试批量回测
+验证多进程批量回测与串行结果一致、失败记录正确、最大回撤与夏普比率（离线，使用随机行情）
+"""
+
+import sys
+import time
+import datetime
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from batch_backtest import BatchBacktestRunner
+from parameter_sweep import calculate_max_drawdown
+from strategy_backtest import StrategyFactory, BacktestEngine
+from test_backtest_engine import make_ohlcv
+
+
+def fake_loader(code, start_date, end_date, market, source_type, interval='1d', token=None):
+    """离线取数：代码以 BAD 开头时返回空数据，以 ERR 开头时抛出异常"""
+    if code.startswith('BAD'):
+        return None
+    if code.startswith('ERR'):
+        raise RuntimeError(f"模拟网络错误: {code}")
+    return make_ohlcv(n=1500, seed=int(code))
+
+
+def make_runner(max_workers):
+    return BatchBacktestRunner(
+        strategy_name="MACD趋势策略",
+        params={'fast': 12, 'slow': 26, 'signal': 9},
+        start_date=datetime.date(2020, 1, 1),
+        end_date=datetime.date(2024, 1, 1),
+        engine_kwargs={'initial_cash': 100000, 'buy_commission': 0.0003, 'sell_commission': 0.0003},
+        max_workers=max_workers,
+        data_loader=fake_loader
+    )
+
+
+def test_parallel_matches_serial():
+    """测试1: 多进程与串行结果一致"""
+    print("=" * 80)
+    print("测试1: 多进程与串行结果一致")
+    print("=" * 80)
+
+    codes = ['000001', 'BAD001', '000002', 'ERR001', '600519']
+
+    serial = make_runner(1).run(codes)
+    progress = []
+    parallel = make_runner(4).run(codes, progress_callback=lambda done, total, item: progress.append((done, total)))
+
+    assert [r['code'] for r in parallel.results] == ['000001', '000002', '600519']
+    assert parallel.results == serial.results
+    assert parallel.trades == serial.trades
+    assert parallel.failed_codes == serial.failed_codes
+    assert parallel.failed_codes[0] == ('BAD001', "无法获取数据")
+    assert parallel.failed_codes[1][0] == 'ERR001'
+    assert progress[-1] == (len(codes), len(codes))
+    assert all(trade['股票代码'] in ('000001', '000002', '600519') for trade in parallel.trades)
+
+    engine = BacktestEngine(**make_runner(1).engine_kwargs)
+    single = engine.run(fake_loader('000002', None, None, None, None), StrategyFactory.create_strategy(
+        "MACD趋势策略", {'fast': 12, 'slow': 26, 'signal': 9}))
+    returns = single.df['equity'].pct_change().dropna()
+    years = (single.df.index[-1] - single.df.index[0]).days / 365.25
+    row = parallel.results[1]
+    assert row['max_drawdown'] == calculate_max_drawdown(single.df['equity'].to_numpy()) < 0
+    assert np.isclose(row['sharpe_ratio'], returns.mean() / returns.std() * np.sqrt(len(returns) / years))
+
+    print(f"✅ 成功 {len(parallel.results)} 只，失败 {len(parallel.failed_codes)} 只，结果一致")
+    print(f"✅ 进度回调 {len(progress)} 次")
+
+    duplicated = make_runner(4).run(['000001', '000002', '000001', 'BAD001', 'BAD001'])
+    assert [r['code'] for r in duplicated.results] == ['000001', '000002', '000001']
+    assert duplicated.results[0] == duplicated.results[2] == serial.results[0]
+    assert duplicated.failed_codes == [('BAD001', "无法获取数据")] * 2
+    print("✅ 重复的代码各占一行（与输入一一对应）")
+    print(f"✅ 最大回撤 {row['max_drawdown']:.2%}、夏普比率 {row['sharpe_ratio']:.2f} 由净值计算")
+
+    print()
+
+
+def test_parallel_speed():
+    """测试2: 多进程耗时对比"""
+    print("=" * 80)
+    print("测试2: 多进程耗时对比（40只股票）")
+    print("=" * 80)
+
+    codes = [f"{i:06d}" for i in range(40)]
+
+    t0 = time.perf_counter()
+    make_runner(1).run(codes)
+    t_serial = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    make_runner(4).run(codes)
+    t_parallel = time.perf_counter() - t0
+
+    print(f"   串行: {t_serial:.2f} 秒")
+    print(f"   4进程: {t_parallel:.2f} 秒")
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试批量回测...\n")
+
+    test_parallel_matches_serial()
+    test_parallel_speed()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,131 @@
+"""
+测试缓存淘汰策略
+验证 LRU / LFU / hybrid 的淘汰顺序、清理只释放需要的容量、索引批量写入一次（离线）
+"""
+
+import sys
+import time
+import shutil
+import datetime
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import CachePolicy
+from test_fetch_many import make_cache_manager
+from test_sqlite_index import make_entry
+
+
+def ago(days: float) -> str:
+    return (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat()
+
+
+def make_entries() -> dict:
+    """四个条目：访问时间和次数各不相同，每个100KB"""
+    spec = {
+        'old_rare': (60, 1),      # 60天未访问、访问1次（冷数据）
+        'old_popular': (90, 50),  # 90天未访问、访问50次
+        'recent_rare': (1, 0),    # 1天前访问、访问0次
+        'recent_popular': (0, 20),
+    }
+    entries = {}
+    for key, (days, count) in spec.items():
+        entry = make_entry('000001')
+        entry.update(last_accessed=ago(days), access_count=count, file_size_kb=100)
+        entries[key] = entry
+    return entries
+
+
+def test_strategy_order():
+    """测试1: 各策略的淘汰顺序"""
+    print("=" * 80)
+    print("测试1: 淘汰顺序")
+    print("=" * 80)
+
+    entries = make_entries()
+    expected = {
+        'lru': ['old_popular', 'old_rare', 'recent_rare', 'recent_popular'],
+        'lfu': ['recent_rare', 'old_rare', 'recent_popular', 'old_popular'],
+        'hybrid': ['old_rare', 'old_popular', 'recent_rare', 'recent_popular'],
+    }
+    for strategy, order in expected.items():
+        policy = CachePolicy({'cleanup_policy': {'strategy': strategy, 'unused_days_threshold': 30,
+                                                 'min_access_count': 3}})
+        assert policy.select_evictions(entries, 400) == order, (strategy, policy.select_evictions(entries, 400))
+        assert policy.select_evictions(entries, 150) == order[:2]
+        assert policy.select_evictions(entries, 150, exclude={order[0]}) == order[1:3]
+        assert policy.select_evictions(entries, 0) == []
+        print(f"✅ {strategy}: {' -> '.join(order)}")
+
+    print()
+
+
+def test_large_cleanup():
+    """测试2: 20000个条目的容量清理"""
+    print("=" * 80)
+    print("测试2: 20000个条目的容量清理")
+    print("=" * 80)
+
+    manager = make_cache_manager(layout='range')
+    try:
+        manager.policy = CachePolicy(dict(manager.config, cleanup_policy={'strategy': 'hybrid'}))
+        index = manager.index
+        for i in range(20000):
+            entry = make_entry(f"{i:06d}", '2015-01-01', '2015-12-31')
+            entry.update(last_accessed=ago(i % 400 + 0.5), access_count=i % 7, file_size_kb=50,
+                         file_path=str(manager.data_dir / f"{i:06d}.parquet"))
+            index.data['entries'][f"key_{i}"] = entry
+        index._build_intervals()
+        index._update_statistics()
+        index._save_index()
+        manager.config['cache_settings']['max_size_mb'] = 500  # 当前约977MB
+
+        saves = []
+        original = index._save_index
+        index._save_index = lambda: (saves.append(1), original())
+
+        t0 = time.perf_counter()
+        manager.cleanup_cache()
+        elapsed = time.perf_counter() - t0
+
+        remaining = index.get_all_entries()
+        total_mb = index.get_statistics()['total_size_mb']
+        assert 400 - 0.05 <= total_mb <= 400, total_mb
+        assert len(saves) == 1
+        # hybrid: 冷数据（超过30天未访问且访问次数少于3）全部删除，其余按最久未访问删除
+        deleted = [i for i in range(20000) if f"key_{i}" not in remaining]
+        cold = [i for i in range(20000) if i % 400 >= 30 and i % 7 < 3]
+        assert set(cold) <= set(deleted)
+        warm_deleted = [i % 400 for i in deleted if i not in set(cold)]
+        warm_kept = [i % 400 for i in range(20000) if f"key_{i}" in remaining]
+        assert min(warm_deleted) >= max(warm_kept)
+        print(f"✅ 删除 {len(deleted)} 个条目，剩余 {total_mb} MB（容量 500 MB 的80%），索引写入 {len(saves)} 次")
+        print(f"   清理耗时: {elapsed*1000:.1f} ms")
+        assert elapsed < 2.0
+
+        saves.clear()
+        manager.cleanup_cache()
+        assert len(saves) == 0 and len(index.get_all_entries()) == len(remaining)
+        print("✅ 未超过容量时不淘汰、不写索引")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试缓存淘汰策略...\n")
+
+    test_strategy_order()
+    test_large_cleanup()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
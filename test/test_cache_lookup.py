@@ -0,0 +1,204 @@
+"""
+测试缓存区间查找
+验证按元数据二分查找覆盖缓存、不读取无关文件（离线，使用临时缓存目录）
+"""
+
+import sys
+import time
+import shutil
+import datetime
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import CacheIndex, SQLiteCacheIndex
+from test_backtest_engine import make_ohlcv
+from test_fetch_many import make_cache_manager
+from test_sqlite_index import make_entry
+
+
+def d(text: str) -> datetime.date:
+    return datetime.date.fromisoformat(text)
+
+
+def count_loads(manager) -> list:
+    """记录 storage.load 读取的文件"""
+    loaded = []
+    original = manager.storage.load
+
+    def load(file_path, *args):
+        loaded.append(Path(file_path).name)
+        return original(file_path, *args)
+
+    manager.storage.load = load
+    return loaded
+
+
+def test_covering_lookup():
+    """测试1: 覆盖缓存查找与文件读取次数"""
+    print("=" * 80)
+    print("测试1: 覆盖缓存查找（按范围存储）")
+    print("=" * 80)
+
+    manager = make_cache_manager(layout='range')
+    try:
+        df = make_ohlcv(n=1500, seed=3)
+        ranges = [('2021-03-01', '2021-06-30'), ('2021-01-01', '2021-12-31'), ('2020-01-01', '2023-12-31')]
+        for start, end in ranges:
+            part = df[(df.index.date >= d(start)) & (df.index.date <= d(end))]
+            assert manager.save_data(part, 'akshare', 'a_stock', '000001', d(start), d(end))
+        # 其他资产的缓存不应被读取
+        manager.save_data(df, 'akshare', 'a_stock', '000002', df.index[0].date(), df.index[-1].date())
+        manager.save_data(df, 'akshare', 'a_stock', '000001', df.index[0].date(), df.index[-1].date(), '1h')
+
+        covering = manager.index.find_covering_entries('akshare', 'a_stock', '000001', '1d',
+                                                       d('2021-04-01'), d('2021-05-31'))
+        spans = [(entry['start_date'], entry['end_date']) for _, entry in covering]
+        assert spans == ranges, spans
+        print("✅ 覆盖条目按日期跨度从小到大排列")
+
+        loaded = count_loads(manager)
+        data = manager.get_data('akshare', 'a_stock', '000001', d('2021-04-01'), d('2021-05-31'))
+        assert data is not None and data.index[0].date() == d('2021-04-01')
+        assert data.index[-1].date() == d('2021-05-31')
+        assert loaded == ['000001_20210301_20210630.parquet'], loaded
+        print(f"✅ 命中最小覆盖缓存，只读取1个文件: {loaded[0]}")
+
+        loaded.clear()
+        assert manager.get_data('akshare', 'a_stock', '000001', d('2019-06-01'), d('2021-05-31')) is None
+        assert loaded == []
+        print("✅ 未覆盖查询不读取任何文件")
+
+        loaded.clear()
+        hits = manager.get_data_many('akshare', 'a_stock', ['000001', '000002', '000003'],
+                                     d('2022-01-01'), d('2022-06-30'))
+        assert sorted(hits) == ['000001', '000002'] and len(loaded) == 2
+        print("✅ 批量查询只读取命中的文件")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_index_backends_agree():
+    """测试2: JSON与SQLite索引的查找结果一致"""
+    print("=" * 80)
+    print("测试2: JSON与SQLite索引的查找结果一致")
+    print("=" * 80)
+
+    manager = make_cache_manager()
+    try:
+        json_index = CacheIndex(manager.cache_root / "index.json")
+        sqlite_index = SQLiteCacheIndex(manager.cache_root / "index.db")
+        entries = {}
+        for i in range(60):
+            start = datetime.date(2020, 1, 1) + datetime.timedelta(days=17 * i)
+            end = start + datetime.timedelta(days=30 + 13 * (i % 9))
+            entries[f"k{i}"] = make_entry(f"00000{i % 3}", start.isoformat(), end.isoformat())
+        for index in (json_index, sqlite_index):
+            for key, entry in entries.items():
+                index.add_entry(key, dict(entry))
+            index.remove_entry('k7')
+            index.add_entry('k8', make_entry('000002', '2020-01-01', '2030-01-01'))
+
+        for code in ('000000', '000001', '000002'):
+            for offset in range(0, 1000, 37):
+                start = datetime.date(2020, 1, 1) + datetime.timedelta(days=offset)
+                end = start + datetime.timedelta(days=10)
+                expected = [key for key, entry in json_index.get_all_entries().items()
+                            if entry['code'] == code and
+                            entry['start_date'] <= start.isoformat() and entry['end_date'] >= end.isoformat()]
+                found_json = [key for key, _ in json_index.find_covering_entries('akshare', 'a_stock', code, '1d', start, end)]
+                found_sqlite = [key for key, _ in sqlite_index.find_covering_entries('akshare', 'a_stock', code, '1d', start, end)]
+                assert sorted(found_json) == sorted(expected)
+                assert found_json == found_sqlite
+        sqlite_index.close()
+        print("✅ 两种索引结果一致")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_lookup_speed():
+    """测试3: 大量条目时的查找耗时"""
+    print("=" * 80)
+    print("测试3: 20000个条目的覆盖查找")
+    print("=" * 80)
+
+    manager = make_cache_manager()
+    try:
+        index = CacheIndex(manager.cache_root / "index.json")
+        index.data['entries'] = {
+            f"key_{i}": make_entry(f"{i % 2000:06d}", f"{2000 + i // 2000}-01-01", f"{2000 + i // 2000}-12-31")
+            for i in range(20000)
+        }
+        index._build_intervals()
+
+        t0 = time.perf_counter()
+        for i in range(2000):
+            covering = index.find_covering_entries('akshare', 'a_stock', f"{i:06d}", '1d',
+                                                   d('2005-03-01'), d('2005-04-30'))
+            assert len(covering) == 1
+        elapsed = (time.perf_counter() - t0) / 2000
+        print(f"   每次查找: {elapsed*1e6:.1f} μs")
+        assert elapsed < 0.001
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_single_asset_many_entries():
+    """测试4: 同一资产大量互不重叠的条目时的查找耗时"""
+    print("=" * 80)
+    print("测试4: 单个资产20000个条目的查找")
+    print("=" * 80)
+
+    manager = make_cache_manager()
+    try:
+        index = CacheIndex(manager.cache_root / "index.json")
+        base = datetime.date(1990, 1, 1)
+        index.data['entries'] = {
+            f"key_{i}": make_entry('000001', (base + datetime.timedelta(days=3 * i)).isoformat(),
+                                   (base + datetime.timedelta(days=3 * i + 1)).isoformat())
+            for i in range(20000)
+        }
+        index._build_intervals()
+
+        t0 = time.perf_counter()
+        for i in range(0, 20000, 10):
+            day = base + datetime.timedelta(days=3 * i)
+            covering = index.find_covering_entries('akshare', 'a_stock', '000001', '1d', day, day)
+            overlapping = index.find_overlapping_entries('akshare', 'a_stock', '000001', '1d',
+                                                         day, day + datetime.timedelta(days=4))
+            assert [key for key, _ in covering] == [f"key_{i}"]
+            assert [key for key, _ in overlapping] == [f"key_{i}", f"key_{i + 1}"][:2 if i < 19999 else 1]
+        elapsed = (time.perf_counter() - t0) / 2000
+        print(f"   每次查找: {elapsed*1e6:.1f} μs")
+        assert elapsed < 0.0005
+        print("✅ 前缀最大结束日期使扫描提前停止，耗时与条目数无关")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试缓存区间查找...\n")
+
+    test_covering_lookup()
+    test_index_backends_agree()
+    test_lookup_speed()
+    test_single_asset_many_entries()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
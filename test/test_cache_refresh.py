@@ -0,0 +1,233 @@
+"""
+测试缓存增量刷新
+验证只获取缓存结束日期之后的K线并追加、历史分区不重写、过期条目刷新、索引一次写入、
+Tushare 按交易日截面刷新（离线，使用本地模拟数据源和临时缓存目录）
+"""
+
+import sys
+import shutil
+import datetime
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cached_data_source import CachedDataSourceWrapper
+from test_fetch_many import make_cache_manager
+from test_market_ingest import FakePro, make_source, unlimited
+from test_cache_lookup import d
+
+
+class LocalDataSource:
+    """本地数据源：每个代码一份完整历史，按请求的日期范围返回，记录每次请求"""
+
+    def __init__(self, codes, start='2021-01-01', end='2023-03-31', freq='B', seed=80):
+        rng = np.random.default_rng(seed)
+        dates = pd.date_range(start, end, freq=freq)
+        self.history = {}
+        for code in codes:
+            close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+            self.history[code] = pd.DataFrame({
+                'open': close * 0.99, 'high': close * 1.02, 'low': close * 0.97, 'close': close,
+                'volume': rng.integers(1000, 100000, len(dates)).astype(float)
+            }, index=pd.DatetimeIndex(dates, name='date'))
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def fetch_data(self, code, start_date, end_date, **kwargs):
+        with self.lock:
+            self.calls.append((code, start_date, end_date, kwargs.get('market')))
+        df = self.history.get(code)
+        if df is None:
+            return None
+        return df[(df.index.date >= start_date) & (df.index.date <= end_date)].copy()
+
+
+def seed_cache(manager, source, codes, start, end, market='a_stock'):
+    """把截止到 end 的数据写入缓存，最后一根K线的收盘价与数据源不同（模拟盘中写入的不完整K线）"""
+    for code in codes:
+        df = source.fetch_data(code, start, end)
+        df.iloc[-1, df.columns.get_loc('close')] *= 1.01
+        assert manager.save_data(df, 'unknown', market, code, start, end, '1d')
+    source.calls.clear()
+
+
+def test_refresh_appends_new_bars():
+    """测试1: 只获取结束日期之后的K线，历史分区不变"""
+    print("=" * 80)
+    print("测试1: 增量追加（分区存储）")
+    print("=" * 80)
+
+    codes = ['600000', '600001', '000002']
+    source = LocalDataSource(codes)
+    manager = make_cache_manager(layout='partitioned')
+    try:
+        wrapper = CachedDataSourceWrapper(source, manager)
+        seed_cache(manager, source, codes, d('2021-01-01'), d('2023-03-10'))
+        dataset = manager.storage.dataset_dir('unknown', 'a_stock', '600000', '1d')
+        history_files = {f.name: f.stat().st_mtime_ns for f in manager.storage.partition_files(dataset)
+                         if not f.name.startswith('2023')}
+        assert len(history_files) == 2
+
+        plan = wrapper.refresh(end_date=d('2023-03-31'), dry_run=True)
+        assert sorted(plan['pending']) == sorted(codes) and source.calls == []
+        print("✅ dry_run 只列出待刷新的代码，不请求数据")
+
+        summary = wrapper.refresh(end_date=d('2023-03-31'))
+        assert sorted(summary['refreshed']) == sorted(codes) and not summary['failed']
+        assert sorted(source.calls) == sorted((code, d('2023-03-10'), d('2023-03-31'), 'A股') for code in codes)
+        print(f"✅ 每个代码只请求 2023-03-10 ~ 2023-03-31（{summary['rows']} 行），市场名称映射回 A股")
+
+        entries = manager.index.get_all_entries()
+        assert sorted(entries) == sorted(f"unknown_a_stock_{code}_20210101_20230331_1d" for code in codes)
+        for code in codes:
+            cached = manager.get_data('unknown', 'a_stock', code, d('2021-01-01'), d('2023-03-31'))
+            expected = source.history[code]
+            pd.testing.assert_frame_equal(cached, expected, check_freq=False, check_names=False)
+            assert entries[f"unknown_a_stock_{code}_20210101_20230331_1d"]['rows'] == len(expected)
+        print("✅ 条目范围延长到 2023-03-31，数据与完整历史一致（不完整的最后一根K线被替换）")
+
+        after = {f.name: f.stat().st_mtime_ns for f in manager.storage.partition_files(dataset)
+                 if f.name in history_files}
+        assert after == history_files
+        print("✅ 2021、2022 年分区未重写")
+
+        source.calls.clear()
+        summary = wrapper.refresh(end_date=d('2023-03-31'))
+        assert summary['up_to_date'] == 3 and summary['refreshed'] == [] and source.calls == []
+        print("✅ 再次刷新时全部已是最新，不请求数据")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_refresh_range_layout():
+    """测试2: 按范围存储时合并成新文件并删除旧文件"""
+    print("=" * 80)
+    print("测试2: 增量追加（范围存储）")
+    print("=" * 80)
+
+    source = LocalDataSource(['600000'])
+    manager = make_cache_manager(layout='range')
+    try:
+        wrapper = CachedDataSourceWrapper(source, manager)
+        seed_cache(manager, source, ['600000'], d('2022-01-01'), d('2023-02-28'))
+        # 更早的另一段缓存不受影响
+        assert manager.save_data(source.fetch_data('600000', d('2021-01-01'), d('2021-06-30')),
+                                 'unknown', 'a_stock', '600000', d('2021-01-01'), d('2021-06-30'), '1d')
+        source.calls.clear()
+        old_file = Path(manager.index.get_entry('unknown_a_stock_600000_20220101_20230228_1d')['file_path'])
+
+        summary = wrapper.refresh(end_date=d('2023-03-31'))
+        assert summary['refreshed'] == ['600000'] and source.calls[0][1] == d('2023-02-28')
+        assert sorted(manager.index.get_all_entries()) == ['unknown_a_stock_600000_20210101_20210630_1d',
+                                                           'unknown_a_stock_600000_20220101_20230331_1d']
+        assert not old_file.exists()
+        cached = manager.get_data('unknown', 'a_stock', '600000', d('2022-01-01'), d('2023-03-31'))
+        expected = source.history['600000']
+        expected = expected[expected.index.date >= d('2022-01-01')]
+        pd.testing.assert_frame_equal(cached, expected, check_freq=False, check_names=False)
+        print("✅ 只刷新结束日期最晚的条目，旧文件被替换，早期缓存保留")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_refresh_many_symbols():
+    """测试3: 大量代码刷新时索引只写入一次，过期条目也会刷新"""
+    print("=" * 80)
+    print("测试3: 批量刷新")
+    print("=" * 80)
+
+    today = datetime.date.today()
+    codes = [f"{i:06d}" for i in range(200)]
+    source = LocalDataSource(codes, start=str(today - datetime.timedelta(days=60)), end=str(today), freq='D')
+    manager = make_cache_manager(layout='partitioned')
+    try:
+        wrapper = CachedDataSourceWrapper(source, manager)
+        start = today - datetime.timedelta(days=60)
+        seed_cache(manager, source, codes[:150], start, today - datetime.timedelta(days=5), market='crypto')
+        seed_cache(manager, source, codes[150:], start, today, market='crypto')
+        # 其中10个当天的条目在2小时前写入，已超过30分钟的有效期
+        stale = codes[150:160]
+        created = (datetime.datetime.now() - datetime.timedelta(hours=2)).isoformat()
+        for code in stale:
+            key = f"unknown_crypto_{code}_{start:%Y%m%d}_{today:%Y%m%d}_1d"
+            manager.index.add_entry(key, dict(manager.index.get_entry(key), created_at=created))
+
+        saves = []
+        original = manager.index._save_index
+        manager.index._save_index = lambda: (saves.append(1), original())
+        summary = wrapper.refresh(end_date=today, max_workers=8)
+        assert len(summary['refreshed']) == 160 and summary['up_to_date'] == 40
+        assert sorted(code for code, *_ in source.calls) == sorted(codes[:150] + stale)
+        assert all(market == '加密货币' for *_, market in source.calls)
+        assert len(saves) == 1, len(saves)
+        print(f"✅ 150个落后的代码和10个过期的代码被刷新，40个跳过，索引写入 {len(saves)} 次")
+
+        data, errors = wrapper.fetch_many(codes, start, today, market='加密货币')
+        assert not errors and len(source.calls) == 160
+        for code in codes[:5] + stale[:2]:
+            pd.testing.assert_frame_equal(data[code], source.history[code], check_freq=False, check_names=False)
+        print("✅ 刷新后全部命中缓存，数据与完整历史一致")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+@unlimited
+def test_refresh_tushare_cross_section():
+    """测试4: Tushare 资产数多于天数时按交易日截面刷新"""
+    print("=" * 80)
+    print("测试4: 截面刷新")
+    print("=" * 80)
+
+    pro = FakePro(n_codes=80, days=60)
+    manager = make_cache_manager(layout='partitioned')
+    try:
+        wrapper = CachedDataSourceWrapper(make_source(pro), manager)
+        start, seeded, end = d('2021-01-01'), d('2021-03-10'), d('2021-03-31')
+        wrapper.ingest_market(start, seeded, market='A股')
+
+        pro.calls.clear()
+        summary = wrapper.refresh(end_date=end)
+        trade_days = sum(1 for x in pro.open_dates if '20210310' <= x <= '20210331')
+        assert len(summary['refreshed']) == 80 and not summary['failed']
+        assert len(pro.calls) == 1 + 2 * trade_days, len(pro.calls)
+        print(f"✅ 80个代码刷新 {trade_days} 个交易日，共 {len(pro.calls)} 次请求")
+
+        expected = make_source(pro).fetch_market_daily(start, end)
+        for code in list(expected)[:10]:
+            cached = manager.get_data('tushare', 'a_stock', code, start, end)
+            pd.testing.assert_frame_equal(cached, expected[code], check_freq=False, check_names=False)
+        print("✅ 刷新后的缓存与整段截面获取的结果一致")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试缓存增量刷新...\n")
+
+    test_refresh_appends_new_bars()
+    test_refresh_range_layout()
+    test_refresh_many_symbols()
+    test_refresh_tushare_cross_section()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,180 @@
+"""
+测试缓存预热
+验证按索引一次规划缺失区间（不读文件）、并发获取只请求缺失部分、进度与失败列表、预热后全部命中、
+批量回测预热失败时返回原因（离线，使用本地模拟数据源）
+"""
+
+import sys
+import time
+import shutil
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from batch_backtest import BatchBacktestRunner
+from cache_manager import CacheManager
+from cached_data_source import SOURCE_CONCURRENCY
+from test_fetch_many import make_cache_manager
+from test_cache_refresh import LocalDataSource
+from test_cache_lookup import d
+
+
+class SlowLocalDataSource(LocalDataSource):
+    """带网络延迟的本地数据源，记录最大并发数；代码以 BAD 开头时无数据，以 ERR 开头时抛出异常"""
+
+    def __init__(self, codes, delay=0.05, **kwargs):
+        super().__init__(codes, **kwargs)
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+
+    def fetch_data(self, code, start_date, end_date, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if code.startswith('ERR'):
+                with self.lock:
+                    self.calls.append((code, start_date, end_date, kwargs.get('market')))
+                raise ConnectionError("RemoteDisconnected")
+            return super().fetch_data(code, start_date, end_date, **kwargs)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def seed(manager, source, code, start, end):
+    assert manager.save_data(source.history[code][str(start):str(end)], 'unknown', 'a_stock', code, start, end, '1d')
+
+
+def test_plan_missing():
+    """测试1: 只根据索引元数据规划缺失区间"""
+    print("=" * 80)
+    print("测试1: 规划缺失区间")
+    print("=" * 80)
+
+    codes = ['000001', '000002', '000003', '000004']
+    source = LocalDataSource(codes)
+    manager = make_cache_manager(layout='range')
+    try:
+        seed(manager, source, '000001', d('2021-01-01'), d('2022-12-31'))
+        seed(manager, source, '000002', d('2021-01-01'), d('2021-12-31'))
+        seed(manager, source, '000003', d('2021-06-01'), d('2021-09-30'))
+
+        loads = []
+        original = manager.storage.load
+        manager.storage.load = lambda *args, **kwargs: loads.append(args) or original(*args, **kwargs)
+        plan = manager.plan_missing('unknown', 'a_stock', codes + ['000001'], d('2021-01-01'), d('2022-06-30'))
+        assert plan == {
+            '000002': [(d('2022-01-01'), d('2022-06-30'))],
+            '000003': [(d('2021-01-01'), d('2021-05-31')), (d('2021-10-01'), d('2022-06-30'))],
+            '000004': [(d('2021-01-01'), d('2022-06-30'))]
+        }, plan
+        assert loads == []
+        print("✅ 完整缓存的代码不在计划中，部分缓存只列出缺口，未读取任何数据文件")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_warm_universe():
+    """测试2: 并发获取缺失部分，汇报进度和失败"""
+    print("=" * 80)
+    print("测试2: 预热代码池")
+    print("=" * 80)
+
+    codes = [f"{i:06d}" for i in range(1, 31)] + ['BAD001', 'ERR001']
+    source = SlowLocalDataSource(codes[:30], delay=0.05)
+    manager = make_cache_manager(layout='partitioned')
+    start, end = d('2021-01-01'), d('2022-12-31')
+    try:
+        for code in codes[:10]:
+            seed(manager, source, code, start, end)
+        for code in codes[10:15]:
+            seed(manager, source, code, start, d('2022-06-30'))
+        source.calls.clear()
+
+        progress = []
+        summary = manager.warm(codes, start, end, source=source, market='A股',
+                               progress_callback=lambda done, total, code: progress.append((done, total)))
+        assert summary['planned'] == 22 and summary['cached'] == 10
+        assert sorted(summary['fetched']) == codes[10:30]
+        assert summary['failed'] == {'BAD001': "无法获取数据", 'ERR001': "RemoteDisconnected"}
+        assert progress[-1] == (22, 22) and len(progress) == 22
+        partial_calls = [call for call in source.calls if call[0] in codes[10:15]]
+        assert all(call[1:] == (d('2022-07-01'), end, 'A股') for call in partial_calls)
+        assert 1 < source.max_active <= SOURCE_CONCURRENCY['unknown']
+        print(f"✅ 22个请求（5个只补缺口），最大并发 {source.max_active}，失败列表包含 BAD001 / ERR001")
+
+        source.calls.clear()
+        hits = manager.get_data_many('unknown', 'a_stock', codes, start, end)
+        assert sorted(hits) == codes[:30] and source.calls == []
+        for code in codes[10:12] + codes[20:22]:
+            expected = source.history[code][str(start):str(end)]
+            pd.testing.assert_frame_equal(hits[code], expected, check_freq=False, check_names=False)
+        print("✅ 预热后全部代码完整命中缓存，数据与数据源一致")
+
+        summary = manager.warm(codes[:30], start, end, source=source, market='A股')
+        assert summary['planned'] == 0 and summary['cached'] == 30 and source.calls == []
+        print("✅ 再次预热不发出请求")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_runner_warm_failure():
+    """测试3: 批量回测预热失败时返回原因，非预期异常直接抛出"""
+    print("=" * 80)
+    print("测试3: 预热失败")
+    print("=" * 80)
+
+    runner = BatchBacktestRunner("MACD趋势策略", {'fast': 12, 'slow': 26, 'signal': 9},
+                                 d('2021-01-01'), d('2021-12-31'), source_type='akshare')
+    original = CacheManager.warm
+    try:
+        def unreachable(self, *args, **kwargs):
+            raise ConnectionError("RemoteDisconnected")
+
+        CacheManager.warm = unreachable
+        assert runner.warm_cache(['000001']) == {'error': "ConnectionError: RemoteDisconnected"}
+        print("✅ 网络错误时返回失败原因，供界面显示")
+
+        def broken(self, *args, **kwargs):
+            raise KeyError('start_date')
+
+        CacheManager.warm = broken
+        try:
+            runner.warm_cache(['000001'])
+            assert False, "非预期异常应直接抛出"
+        except KeyError:
+            pass
+        print("✅ 其他异常不被吞掉")
+    finally:
+        CacheManager.warm = original
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试缓存预热...\n")
+
+    test_plan_missing()
+    test_warm_universe()
+    test_runner_warm_failure()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,174 @@
+"""
+测试缓存校验和模式
+验证 off 不计算、lazy 后台计算、verify_on_load 读取时校验并删除损坏文件（离线）
+"""
+
+import os
+import sys
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import CacheManager, CHECKSUM_ALGORITHM
+from test_backtest_engine import make_ohlcv
+from test_fetch_many import make_cache_manager
+from test_partitioned_storage import slice_dates
+from test_cache_lookup import d
+
+
+def make_manager(checksum_mode: str, **storage_format) -> CacheManager:
+    """在临时目录创建指定校验和模式的缓存管理器"""
+    manager = make_cache_manager(**storage_format)
+    manager.checksum_mode = checksum_mode
+    return manager
+
+
+def count_checksums(manager: CacheManager) -> list:
+    """记录计算校验和的文件"""
+    hashed = []
+    original = manager._calculate_checksum
+
+    def calculate_checksum(file_path, *args):
+        hashed.append(Path(file_path).name)
+        return original(file_path, *args)
+
+    manager._calculate_checksum = calculate_checksum
+    return hashed
+
+
+def corrupt(file_path: Path):
+    """翻转文件中间的一个字节（文件大小不变）"""
+    raw = bytearray(file_path.read_bytes())
+    raw[len(raw) // 2] ^= 0xFF
+    file_path.write_bytes(bytes(raw))
+
+
+def test_off_and_lazy():
+    """测试1: off 不计算，lazy 保存后在后台计算"""
+    print("=" * 80)
+    print("测试1: off 与 lazy")
+    print("=" * 80)
+
+    df = make_ohlcv(n=800, seed=31)
+    start, end = df.index[0].date(), df.index[-1].date()
+
+    manager = make_manager('off', layout='range')
+    try:
+        hashed = count_checksums(manager)
+        manager.save_data(df, 'akshare', 'a_stock', '000001', start, end)
+        manager.get_data('akshare', 'a_stock', '000001', start, end)
+        entry = next(iter(manager.index.get_all_entries().values()))
+        assert hashed == [] and entry['checksum'] is None
+        print("✅ off: 保存和读取都不计算校验和")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    for layout in ('range', 'partitioned'):
+        manager = make_manager('lazy', layout=layout)
+        try:
+            manager.save_data(df, 'akshare', 'a_stock', '000001', start, end)
+            manager.wait_for_checksums()
+            entry = next(iter(manager.index.get_all_entries().values()))
+            file_path = Path(entry['file_path'])
+            if layout == 'range':
+                assert entry['checksum'] == manager._calculate_checksum(file_path)
+            else:
+                files = sorted(file_path.iterdir())
+                assert entry['checksum'] == {f.name: manager._calculate_checksum(f) for f in files}
+            assert str(entry['checksum']).count(CHECKSUM_ALGORITHM) >= 1
+            print(f"✅ lazy ({layout}): 后台计算 {CHECKSUM_ALGORITHM} 校验和并写回索引")
+        finally:
+            shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_verify_on_load():
+    """测试2: verify_on_load 读取时校验，每个文件版本只校验一次"""
+    print("=" * 80)
+    print("测试2: verify_on_load")
+    print("=" * 80)
+
+    df = make_ohlcv(n=1200, seed=32)
+    for layout in ('range', 'partitioned'):
+        manager = make_manager('verify_on_load', layout=layout)
+        try:
+            manager.save_data(slice_dates(df, '2020-01-01', '2022-12-31'), 'akshare', 'a_stock', '000001',
+                              d('2020-01-01'), d('2022-12-31'))
+            manager.wait_for_checksums()
+
+            hashed = count_checksums(manager)
+            for _ in range(3):
+                data = manager.get_data('akshare', 'a_stock', '000001', d('2021-02-01'), d('2021-03-31'))
+                pd.testing.assert_frame_equal(data, slice_dates(df, '2021-02-01', '2021-03-31'), check_freq=False)
+            assert len(hashed) == 1, hashed
+            print(f"✅ {layout}: 3次读取只校验 {hashed[0]} 一次")
+
+            entry = next(iter(manager.index.get_all_entries().values()))
+            file_path = Path(entry['file_path'])
+            target = file_path / '2021.parquet' if file_path.is_dir() else file_path
+            corrupt(target)
+            assert manager.get_data('akshare', 'a_stock', '000001', d('2021-02-01'), d('2021-03-31')) is None
+            assert not target.exists() and manager.index.get_all_entries() == {}
+            print(f"✅ {layout}: 文件损坏时校验失败，删除文件和索引条目，按未命中处理")
+        finally:
+            shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_shared_partition_rewrite():
+    """测试3: 共用分区被其他条目重写后不会误判为损坏"""
+    print("=" * 80)
+    print("测试3: 共用分区重写")
+    print("=" * 80)
+
+    manager = make_manager('verify_on_load', layout='partitioned')
+    try:
+        df = make_ohlcv(n=600, seed=33)
+        for start, end in [('2020-01-01', '2020-03-31'), ('2020-06-01', '2020-08-31')]:
+            manager.save_data(slice_dates(df, start, end), 'akshare', 'a_stock', '000001', d(start), d(end))
+            manager.wait_for_checksums()
+        assert len(manager.index.get_all_entries()) == 2
+
+        partition = manager.storage.dataset_dir('akshare', 'a_stock', '000001', '1d') / '2020.parquet'
+        expected = manager._calculate_checksum(partition)
+        for entry in manager.index.get_all_entries().values():
+            assert entry['checksum'] == {'2020.parquet': expected}
+        data = manager.get_data('akshare', 'a_stock', '000001', d('2020-02-01'), d('2020-02-28'))
+        pd.testing.assert_frame_equal(data, slice_dates(df, '2020-02-01', '2020-02-28'), check_freq=False)
+        print("✅ 两个条目共用的分区重写后，两个条目的校验和都已更新")
+
+        # 删除其中一个条目会重写分区，另一个条目仍可通过校验
+        key = next(k for k, e in manager.index.get_all_entries().items() if e['start_date'] == '2020-06-01')
+        manager.delete_cache(key)
+        manager.wait_for_checksums()
+        data = manager.get_data('akshare', 'a_stock', '000001', d('2020-01-01'), d('2020-03-31'))
+        pd.testing.assert_frame_equal(data, slice_dates(df, '2020-01-01', '2020-03-31'), check_freq=False)
+        print("✅ 删除共用分区中的条目后，剩余条目仍通过校验")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试缓存校验和模式...\n")
+
+    test_off_and_lazy()
+    test_verify_on_load()
+    test_shared_partition_rewrite()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
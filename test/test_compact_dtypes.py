@@ -0,0 +1,157 @@
+"""
+测试紧凑数据类型
+验证 compact_ohlcv 的类型转换、int32 tick 编码往返、compact 模式下各存储格式的读写与内存/文件大小（离线，使用临时缓存目录）
+"""
+
+import sys
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import (compact_ohlcv, encode_price_ticks, decode_price_ticks, is_compact,
+                           COMPACT_TICKS_ATTR)
+from test_fetch_many import make_cache_manager
+from test_backtest_engine import make_ohlcv
+from test_cache_lookup import d
+
+
+def make_hourly(n: int = 4000, seed: int = 90) -> pd.DataFrame:
+    """按 0.01 最小变动单位报价的小时线，带一个额外列"""
+    df = make_ohlcv(n=n, seed=seed)
+    df.index = pd.date_range('2021-01-04 09:00', periods=n, freq='h', name='date')
+    df[['open', 'high', 'low', 'close']] = df[['open', 'high', 'low', 'close']].round(2)
+    df['amount'] = df['close'] * df['volume']
+    return df
+
+
+def test_compact_ohlcv():
+    """测试1: 类型转换与 tick 编码"""
+    print("=" * 80)
+    print("测试1: compact_ohlcv")
+    print("=" * 80)
+
+    df = make_hourly(n=500)
+    compact = compact_ohlcv(df[['volume', 'close', 'amount', 'open', 'high', 'low']])
+    assert list(compact.columns) == ['open', 'high', 'low', 'close', 'volume'] and is_compact(compact)
+    assert np.allclose(compact['close'], df['close'], rtol=1e-7, atol=0)
+    assert (compact['volume'].to_numpy() == df['volume'].to_numpy()).all()
+    print("✅ 只保留 OHLCV 列，价格 float32、成交量 uint64，值在 float32 精度内不变")
+
+    encoded = encode_price_ticks(compact)
+    assert encoded['close'].dtype == np.int32 and encoded.attrs[COMPACT_TICKS_ATTR]['close'] == 0.01
+    decoded = decode_price_ticks(encoded)
+    pd.testing.assert_frame_equal(decoded, compact)
+    assert COMPACT_TICKS_ATTR not in decoded.attrs
+    print("✅ 0.01 整数倍的价格编码为 int32 tick 数，解码后与 float32 价格完全一致")
+
+    adjusted = compact_ohlcv(make_ohlcv(n=200, seed=91))
+    assert adjusted['close'].dtype == np.float32
+    assert encode_price_ticks(adjusted)['close'].dtype == np.float32
+    print("✅ 复权价格不在最小变动单位上，保持 float32")
+
+    crypto = pd.DataFrame({'close': [1e-5, 65000.123456789], 'volume': [0.5, 12.25]},
+                          index=pd.date_range('2024-01-01', periods=2, name='date'))
+    kept = compact_ohlcv(crypto)
+    assert kept['close'].dtype == np.float64 and kept['volume'].dtype == np.float64
+    print("✅ float32 精度不够的价格、有小数的成交量保持 float64")
+
+    print()
+
+
+def test_compact_storage():
+    """测试2: compact 模式下各格式读写往返"""
+    print("=" * 80)
+    print("测试2: 存储往返")
+    print("=" * 80)
+
+    df = make_hourly()
+    start, end = df.index[0].date(), df.index[-1].date()
+    sizes = {}
+    for fmt in ('parquet', 'arrow_ipc', 'csv'):
+        for dtypes in ('float64', 'compact'):
+            manager = make_cache_manager(layout='partitioned', format=fmt, dtypes=dtypes)
+            try:
+                assert manager.save_data(df, 'akshare', 'a_stock', '600000', start, end, '1h')
+                manager.storage.memory.clear()
+                loaded = manager.get_data('akshare', 'a_stock', '600000', start, end, '1h')
+                dataset = manager.storage.dataset_dir('akshare', 'a_stock', '600000', '1h')
+                files = manager.storage.partition_files(dataset)
+                sizes[fmt, dtypes] = (sum(f.stat().st_size for f in files), loaded.memory_usage(deep=True).sum())
+
+                if dtypes == 'float64':
+                    pd.testing.assert_frame_equal(loaded, df, check_freq=False, check_names=False)
+                    continue
+
+                assert is_compact(loaded)
+                expected = compact_ohlcv(df)
+                pd.testing.assert_frame_equal(loaded, expected, check_freq=False, check_names=False)
+                if fmt == 'parquet':
+                    schema = pq.read_schema(files[0])
+                    assert str(schema.field('close').type) == 'int32' and str(schema.field('volume').type) == 'uint64'
+
+                # 按日期范围读取（跳过行组）与追加合并后仍为紧凑类型
+                part = manager.storage.load(dataset, d('2021-03-01'), d('2021-03-31'))
+                assert is_compact(part) and len(part) == len(df['2021-03-01':'2021-03-31'])
+                more = make_hourly(n=100, seed=92)
+                more.index = pd.date_range(df.index[-1] + pd.Timedelta(hours=1), periods=100, freq='h', name='date')
+                assert manager.save_data(more, 'akshare', 'a_stock', '600000', more.index[0].date(),
+                                         more.index[-1].date(), '1h')
+                merged = manager.storage.load(dataset)
+                assert is_compact(merged) and len(merged) == len(df) + 100
+            finally:
+                shutil.rmtree(manager.cache_root, ignore_errors=True)
+        file_ratio = sizes[fmt, 'compact'][0] / sizes[fmt, 'float64'][0]
+        memory_ratio = sizes[fmt, 'compact'][1] / sizes[fmt, 'float64'][1]
+        assert memory_ratio < 0.6, memory_ratio
+        if fmt != 'csv':
+            assert file_ratio < 0.8, file_ratio
+        print(f"✅ {fmt}: 读取结果为紧凑类型，内存 {memory_ratio:.0%}、文件 {file_ratio:.0%}（相对 float64）")
+
+    print()
+
+
+def test_existing_float64_files():
+    """测试3: 切换到 compact 前写入的文件读取时转换"""
+    print("=" * 80)
+    print("测试3: 兼容已有文件")
+    print("=" * 80)
+
+    df = make_hourly(n=300)
+    start, end = df.index[0].date(), df.index[-1].date()
+    manager = make_cache_manager(layout='partitioned')
+    try:
+        assert manager.save_data(df, 'akshare', 'a_stock', '600000', start, end, '1h')
+        manager.storage.dtypes = 'compact'
+        manager.storage.memory.clear()
+        loaded = manager.get_data('akshare', 'a_stock', '600000', start, end, '1h')
+        assert is_compact(loaded)
+        pd.testing.assert_frame_equal(loaded, compact_ohlcv(df), check_freq=False, check_names=False)
+        print("✅ float64 文件在 compact 模式下读取为紧凑类型")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试紧凑数据类型...\n")
+
+    test_compact_ohlcv()
+    test_compact_storage()
+    test_existing_float64_files()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,113 @@
+"""
+测试多进程共享缓存目录
+验证多个进程同时保存时索引条目不丢失、同一资产的分区数据不互相覆盖（离线）
+"""
+
+import sys
+import json
+import shutil
+import datetime
+import subprocess
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import CacheManager
+from test_backtest_engine import make_ohlcv
+from test_fetch_many import make_cache_manager
+from test_partitioned_storage import slice_dates
+
+PROJECT_ROOT = Path(__file__).parent.parent
+WORKERS = 4
+CODES_PER_WORKER = 8
+
+# 子进程：保存若干独立代码，以及共享资产 000001 中属于自己的月份
+WORKER_SCRIPT = """
+import sys, datetime
+sys.path.insert(0, sys.argv[1]); sys.path.insert(0, sys.argv[1] + '/test')
+from cache_manager import CacheManager
+from test_backtest_engine import make_ohlcv
+from test_partitioned_storage import slice_dates
+
+worker, codes = int(sys.argv[3]), int(sys.argv[4])
+manager = CacheManager(sys.argv[2])
+df = make_ohlcv(n=400, seed=40)
+for i in range(codes):
+    part = slice_dates(df, '2020-01-01', '2020-06-30')
+    assert manager.save_data(part, 'akshare', 'a_stock', f"6{worker}{i:04d}",
+                             datetime.date(2020, 1, 1), datetime.date(2020, 6, 30))
+    month = 1 + worker + 4 * (i % 3)
+    start = datetime.date(2020, month, 1)
+    end = (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)
+    assert manager.save_data(slice_dates(df, str(start), str(end)), 'akshare', 'a_stock', '000001', start, end)
+"""
+
+
+def run_workers(cache_root: Path):
+    """同时启动多个子进程写入同一缓存目录"""
+    processes = [
+        subprocess.Popen([sys.executable, "-c", WORKER_SCRIPT, str(PROJECT_ROOT), str(cache_root),
+                          str(worker), str(CODES_PER_WORKER)],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        for worker in range(WORKERS)
+    ]
+    for process in processes:
+        _, stderr = process.communicate()
+        assert process.returncode == 0, stderr.decode(errors='replace')[-2000:]
+
+
+def test_parallel_writers():
+    """测试1: 多个进程同时写入"""
+    print("=" * 80)
+    print(f"测试1: {WORKERS} 个进程同时写入同一缓存目录")
+    print("=" * 80)
+
+    df = make_ohlcv(n=400, seed=40)
+    for backend in ('json', 'sqlite'):
+        manager = make_cache_manager(layout='partitioned')
+        try:
+            config_path = manager.cache_root / "config.json"
+            config = json.loads(config_path.read_text(encoding='utf-8'))
+            config['cache_settings']['index_backend'] = backend
+            config_path.write_text(json.dumps(config), encoding='utf-8')
+
+            run_workers(manager.cache_root)
+
+            manager = CacheManager(str(manager.cache_root))
+            entries = manager.index.get_all_entries()
+            codes = {entry['code'] for entry in entries.values()}
+            assert len(codes) == WORKERS * CODES_PER_WORKER + 1, len(codes)
+
+            shared = [e for e in entries.values() if e['code'] == '000001']
+            assert [(e['start_date'], e['end_date']) for e in shared] == [('2020-01-01', '2020-12-31')], shared
+            data = manager.get_data('akshare', 'a_stock', '000001', datetime.date(2020, 1, 1),
+                                    datetime.date(2020, 12, 31))
+            pd.testing.assert_frame_equal(data, slice_dates(df, '2020-01-01', '2020-12-31'), check_freq=False)
+            assert shared[0]['rows'] == len(data)
+
+            leftovers = [f for f in manager.cache_root.rglob('*.tmp')]
+            assert not leftovers, leftovers
+            print(f"✅ {backend}: {len(entries)} 个条目全部保留，共享资产12个月数据完整，无临时文件残留")
+        finally:
+            shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试多进程共享缓存...\n")
+
+    test_parallel_writers()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,161 @@
+"""
+测试日期范围下推
+验证按日期过滤与逐日比较一致（含时区）、文件按月/年切分行组、范围查询只读取相交的行组（离线）
+"""
+
+import sys
+import time
+import shutil
+import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import filter_date_range
+from test_backtest_engine import make_ohlcv
+from test_fetch_many import make_cache_manager
+from test_cache_lookup import d
+
+
+def by_python_dates(df: pd.DataFrame, start: datetime.date, end: datetime.date) -> pd.DataFrame:
+    """逐行转换为 Python date 后过滤（旧实现，作为对照）"""
+    return df[(df.index.date >= start) & (df.index.date <= end)]
+
+
+def spy_range_reads(manager) -> list:
+    """记录每次按范围读取文件时实际读出的行数"""
+    rows = []
+    original = manager.storage._read_range
+
+    def read_range(file_path, start_date, end_date):
+        df = original(file_path, start_date, end_date)
+        rows.append(None if df is None else len(df))
+        return df
+
+    manager.storage._read_range = read_range
+    return rows
+
+
+def test_filter_matches_python_dates():
+    """测试1: datetime64 过滤与逐日比较结果一致"""
+    print("=" * 80)
+    print("测试1: 日期过滤结果一致")
+    print("=" * 80)
+
+    hourly = make_ohlcv(n=24 * 400, seed=21, freq='h')
+    shanghai = hourly.tz_localize('UTC').tz_convert('Asia/Shanghai')
+    shuffled = hourly.sample(frac=1.0, random_state=0)
+    for name, df in [('无时区', hourly), ('Asia/Shanghai', shanghai), ('无序索引', shuffled)]:
+        for start, end in [('2020-03-01', '2020-03-31'), ('2019-01-01', '2020-01-01'),
+                           ('2020-12-31', '2021-02-03'), ('2020-05-10', '2020-05-09')]:
+            expected = by_python_dates(df, d(start), d(end))
+            pd.testing.assert_frame_equal(filter_date_range(df, d(start), d(end)), expected)
+        pd.testing.assert_frame_equal(filter_date_range(df, None, d('2020-02-01')),
+                                      df[df.index.date <= d('2020-02-01')])
+        print(f"✅ {name}: 结果与逐日比较一致")
+
+    t0 = time.perf_counter()
+    for _ in range(20):
+        by_python_dates(hourly, d('2020-03-01'), d('2020-03-31'))
+    t1 = time.perf_counter()
+    for _ in range(20):
+        filter_date_range(hourly, d('2020-03-01'), d('2020-03-31'))
+    t2 = time.perf_counter()
+    print(f"   耗时: 逐日比较 {(t1 - t0) * 50:.2f} ms，datetime64 {(t2 - t1) * 50:.3f} ms")
+
+    print()
+
+
+def test_month_query_reads_one_month():
+    """测试2: 十年小时线只读取查询月份的行组"""
+    print("=" * 80)
+    print("测试2: 十年小时线查询一个月")
+    print("=" * 80)
+
+    df = make_ohlcv(n=24 * 3653, seed=22, freq='h')
+    start, end = df.index[0].date(), df.index[-1].date()
+    for storage_format in ('parquet', 'arrow_ipc'):
+        manager = make_cache_manager(format=storage_format, layout='range')
+        try:
+            manager.save_data(df, 'yfinance', 'crypto', 'BTC-USD', start, end, '1h')
+            file_path = Path(next(iter(manager.index.get_all_entries().values()))['file_path'])
+            if storage_format == 'parquet':
+                groups = pq.ParquetFile(file_path).num_row_groups
+            else:
+                groups = pyarrow.ipc.open_file(str(file_path)).num_record_batches
+            assert groups == 120, groups
+
+            manager.storage.memory.clear()
+            rows = spy_range_reads(manager)
+            data = manager.get_data('yfinance', 'crypto', 'BTC-USD', d('2025-03-01'), d('2025-03-31'), '1h')
+            pd.testing.assert_frame_equal(data, by_python_dates(df, d('2025-03-01'), d('2025-03-31')),
+                                          check_freq=False)
+            assert rows == [31 * 24], rows
+            print(f"✅ {storage_format}: {groups} 个行组，查询3月只读取 {rows[0]} 行（共 {len(df)} 行）")
+
+            # 相同查询再次执行命中内存缓存
+            rows.clear()
+            again = manager.get_data('yfinance', 'crypto', 'BTC-USD', d('2025-03-01'), d('2025-03-31'), '1h')
+            pd.testing.assert_frame_equal(again, data)
+            assert rows == []
+
+            # 跨月查询读取两个行组
+            data = manager.get_data('yfinance', 'crypto', 'BTC-USD', d('2022-06-20'), d('2022-07-10'), '1h')
+            pd.testing.assert_frame_equal(data, by_python_dates(df, d('2022-06-20'), d('2022-07-10')),
+                                          check_freq=False)
+            assert rows == [61 * 24], rows
+        finally:
+            shutil.rmtree(manager.cache_root, ignore_errors=True)
+    print("✅ 重复查询命中内存缓存，跨月查询只读取相交的两个月")
+
+    print()
+
+
+def test_partitioned_boundaries():
+    """测试3: 分区存储只在边界分区按范围读取"""
+    print("=" * 80)
+    print("测试3: 分区存储的边界分区")
+    print("=" * 80)
+
+    manager = make_cache_manager(layout='partitioned', partition_by='year')
+    try:
+        df = make_ohlcv(n=24 * 1100, seed=23, freq='h').tz_localize('UTC')
+        start, end = df.index[0].date(), df.index[-1].date()
+        manager.save_data(df, 'yfinance', 'crypto', 'ETH-USD', start, end, '1h')
+
+        rows = spy_range_reads(manager)
+        data = manager.get_data('yfinance', 'crypto', 'ETH-USD', d('2020-11-15'), d('2022-01-20'), '1h')
+        pd.testing.assert_frame_equal(data, by_python_dates(df, d('2020-11-15'), d('2022-01-20')),
+                                      check_freq=False)
+        # 2020 读取11、12月，2021 整年读取，2022 只读取1月
+        assert rows == [61 * 24, 31 * 24], rows
+        assert np.all(np.diff(data.index.asi8) > 0)
+        print(f"✅ 边界分区按行组读取 {rows} 行，中间分区整个读取")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试日期范围下推...\n")
+
+    test_filter_matches_python_dates()
+    test_month_query_reads_one_month()
+    test_partitioned_boundaries()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,177 @@
+"""
+测试批量取数
+验证 fetch_many 的缓存命中、并发请求和错误收集（离线，使用模拟数据源和临时缓存目录）
+"""
+
+import sys
+import json
+import time
+import shutil
+import datetime
+import tempfile
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import rate_limiter
+from cache_manager import CacheManager
+from cached_data_source import CachedDataSourceWrapper, SOURCE_CONCURRENCY
+from data_source import DataSource
+from test_backtest_engine import make_ohlcv
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+class SlowDataSource:
+    """模拟网络延迟的数据源，记录调用次数和最大并发数"""
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def fetch_data(self, code, start_date, end_date, **kwargs):
+        with self.lock:
+            self.calls.append(code)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if code.startswith('BAD'):
+                return None
+            if code.startswith('ERR'):
+                raise ConnectionError("RemoteDisconnected")
+            df = make_ohlcv(n=400, seed=int(code))
+            df.index = df.index + (pd.Timestamp(start_date) - df.index[0])
+            return df[df.index.date <= end_date]
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class LimitedAKShareSource(DataSource):
+    """经 akshare 限流器请求的模拟数据源（类名含 AKShare，包装器按 akshare 并发上限取数）"""
+
+    provider = 'akshare'
+
+    def __init__(self, delay: float = 0.2):
+        self.source = SlowDataSource(delay)
+
+    def fetch_data(self, code, start_date, end_date, **kwargs):
+        return self._request(self.source.fetch_data, code, start_date, end_date, **kwargs)
+
+
+def make_cache_manager(**storage_format) -> CacheManager:
+    """在临时目录创建缓存管理器（关键字参数覆盖 storage_format 配置，如 layout='range'）"""
+    cache_root = Path(tempfile.mkdtemp(prefix="cache_test_"))
+    config = json.loads((PROJECT_ROOT / "cache" / "config.json").read_text(encoding='utf-8'))
+    config['storage_format'].update(storage_format)
+    (cache_root / "config.json").write_text(json.dumps(config), encoding='utf-8')
+    return CacheManager(str(cache_root))
+
+
+def test_fetch_many():
+    """测试1: 并发取数、缓存命中与错误收集"""
+    print("=" * 80)
+    print("测试1: fetch_many 并发取数")
+    print("=" * 80)
+
+    cache_manager = make_cache_manager()
+    source = SlowDataSource(delay=0.2)
+    wrapper = CachedDataSourceWrapper(source, cache_manager)
+
+    start_date = datetime.date(2020, 1, 1)
+    end_date = datetime.date(2020, 12, 31)
+    codes = [f"{i:06d}" for i in range(1, 13)] + ['BAD001', 'ERR001']
+
+    try:
+        t0 = time.perf_counter()
+        data, errors = wrapper.fetch_many(codes, start_date, end_date, market='A股')
+        elapsed = time.perf_counter() - t0
+
+        assert list(data.keys()) == codes[:12]
+        assert set(errors.keys()) == {'BAD001', 'ERR001'}
+        assert errors['BAD001'] == "无法获取数据"
+        assert source.max_active <= SOURCE_CONCURRENCY['unknown']
+        # 14个请求、并发4：约4轮，远小于串行的 14 * 0.2 秒
+        assert elapsed < len(codes) * source.delay / 2
+        print(f"✅ 首次取数: {len(data)} 成功, {len(errors)} 失败, 耗时 {elapsed:.2f} 秒, 最大并发 {source.max_active}")
+
+        source.calls.clear()
+        data2, errors2 = wrapper.fetch_many(codes[:12], start_date, end_date, market='A股')
+        assert source.calls == []
+        assert all(data2[code].equals(data[code]) for code in codes[:12])
+        print("✅ 再次取数全部命中缓存，未请求API")
+
+        # 子区间也能从已缓存的大范围数据中取出
+        source.calls.clear()
+        data3, _ = wrapper.fetch_many(codes[:3], datetime.date(2020, 3, 1), datetime.date(2020, 6, 30), market='A股')
+        assert source.calls == [] and len(data3) == 3
+        print("✅ 子区间查询命中覆盖缓存")
+    finally:
+        shutil.rmtree(cache_manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_fetch_many_rate_limited():
+    """测试2: 默认限流下并发上限内的请求同时发出"""
+    print("=" * 80)
+    print("测试2: fetch_many 与默认限流")
+    print("=" * 80)
+
+    cache_manager = make_cache_manager()
+    source = LimitedAKShareSource(delay=0.2)
+    wrapper = CachedDataSourceWrapper(source, cache_manager)
+    original = rate_limiter._limiters.pop('akshare', None)
+    limiter = rate_limiter.get_rate_limiter('akshare')
+    spacing = 60.0 / limiter.requests_per_minute
+
+    start_date = datetime.date(2020, 1, 1)
+    end_date = datetime.date(2020, 12, 31)
+    codes = [f"{i:06d}" for i in range(1, SOURCE_CONCURRENCY['akshare'] + 1)]
+
+    try:
+        t0 = time.perf_counter()
+        data, errors = wrapper.fetch_many(codes, start_date, end_date, market='A股')
+        elapsed = time.perf_counter() - t0
+
+        assert list(data.keys()) == codes and not errors
+        assert limiter.burst >= SOURCE_CONCURRENCY['akshare']
+        assert source.source.max_active == len(codes)
+        # 逐个放行至少需要 (N-1) * spacing 秒
+        assert elapsed < (len(codes) - 1) * spacing / 3, elapsed
+        print(f"✅ {len(codes)} 个未命中请求耗时 {elapsed:.2f} 秒（逐个放行需 {(len(codes) - 1) * spacing:.0f} 秒）")
+
+        # 突发用完后仍按每分钟请求数放行
+        assert limiter.acquire() > spacing / 2
+        print(f"✅ 突发请求用完后按每分钟 {limiter.requests_per_minute:.0f} 次限流")
+    finally:
+        if original is not None:
+            rate_limiter._limiters['akshare'] = original
+        shutil.rmtree(cache_manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试批量取数...\n")
+
+    test_fetch_many()
+    test_fetch_many_rate_limited()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
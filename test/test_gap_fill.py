@@ -0,0 +1,161 @@
+"""
+测试缓存缺口补取
+验证部分命中时只请求缺失区间、合并为一个缓存条目（离线，使用模拟数据源和临时缓存目录）
+"""
+
+import sys
+import shutil
+import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import CacheManager
+from cached_data_source import CachedDataSourceWrapper
+from test_backtest_engine import make_ohlcv
+from test_fetch_many import make_cache_manager
+from test_cache_lookup import d, count_loads
+
+
+class RecordingDataSource:
+    """从固定行情中切片返回，记录每次请求的日期区间"""
+
+    def __init__(self, last_date: str = '2099-12-31'):
+        self.full = make_ohlcv(n=1500, seed=11)
+        self.last_date = d(last_date)
+        self.calls = []
+
+    def fetch_data(self, code, start_date, end_date, **kwargs):
+        self.calls.append((start_date, end_date))
+        end_date = min(end_date, self.last_date)
+        return self.truth(start_date, end_date)
+
+    def truth(self, start_date, end_date):
+        df = self.full
+        return df[(df.index.date >= start_date) & (df.index.date <= end_date)]
+
+
+def entry_ranges(manager: CacheManager) -> list:
+    """当前缓存条目的日期范围"""
+    return sorted((entry['start_date'], entry['end_date']) for entry in manager.index.get_all_entries().values())
+
+
+def test_extend_range():
+    """测试1: 延长查询范围只补取新增部分"""
+    print("=" * 80)
+    print("测试1: 延长查询范围只补取新增部分")
+    print("=" * 80)
+
+    manager = make_cache_manager()
+    try:
+        source = RecordingDataSource()
+        wrapper = CachedDataSourceWrapper(source, manager)
+
+        wrapper.fetch_data('000001', d('2021-01-01'), d('2021-06-30'))
+        source.calls.clear()
+
+        data = wrapper.fetch_data('000001', d('2021-01-01'), d('2021-07-10'))
+        assert source.calls == [(d('2021-07-01'), d('2021-07-10'))]
+        pd.testing.assert_frame_equal(data, source.truth(d('2021-01-01'), d('2021-07-10')), check_freq=False)
+        assert entry_ranges(manager) == [('2021-01-01', '2021-07-10')]
+        print("✅ 只请求 2021-07-01 ~ 2021-07-10，合并为一个缓存条目")
+
+        source.calls.clear()
+        data = wrapper.fetch_data('000001', d('2021-03-01'), d('2021-07-10'))
+        assert source.calls == [] and len(data) == len(source.truth(d('2021-03-01'), d('2021-07-10')))
+        print("✅ 合并后的缓存完全命中")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_multiple_gaps():
+    """测试2: 多个缺口与多缓存拼接"""
+    print("=" * 80)
+    print("测试2: 多个缺口与多缓存拼接")
+    print("=" * 80)
+
+    manager = make_cache_manager()
+    try:
+        source = RecordingDataSource()
+        wrapper = CachedDataSourceWrapper(source, manager)
+        wrapper.fetch_data('000001', d('2021-01-01'), d('2021-03-31'))
+        wrapper.fetch_data('000001', d('2021-05-01'), d('2021-06-30'))
+
+        # 两个缓存之间和之后各有一个缺口
+        source.calls.clear()
+        data = wrapper.fetch_data('000001', d('2020-12-01'), d('2021-07-31'))
+        assert source.calls == [(d('2020-12-01'), d('2020-12-31')),
+                                (d('2021-04-01'), d('2021-04-30')),
+                                (d('2021-07-01'), d('2021-07-31'))]
+        pd.testing.assert_frame_equal(data, source.truth(d('2020-12-01'), d('2021-07-31')), check_freq=False)
+        assert entry_ranges(manager) == [('2020-12-01', '2021-07-31')]
+        print("✅ 3个缺口分别补取，合并为一个缓存条目")
+
+        # 相邻的两个缓存拼接后完整覆盖，不请求API
+        wrapper.fetch_data('000002', d('2021-01-01'), d('2021-03-31'))
+        wrapper.fetch_data('000002', d('2021-04-01'), d('2021-06-30'))
+        source.calls.clear()
+        data = wrapper.fetch_data('000002', d('2021-02-01'), d('2021-05-31'))
+        assert source.calls == []
+        pd.testing.assert_frame_equal(data, source.truth(d('2021-02-01'), d('2021-05-31')), check_freq=False)
+        print("✅ 相邻缓存拼接后完全命中")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_empty_gap_and_plain_get():
+    """测试3: 缺口无数据、get_data不读取部分命中的文件"""
+    print("=" * 80)
+    print("测试3: 缺口无数据与get_data行为")
+    print("=" * 80)
+
+    manager = make_cache_manager()
+    try:
+        source = RecordingDataSource(last_date='2021-06-30')
+        wrapper = CachedDataSourceWrapper(source, manager)
+        wrapper.fetch_data('000001', d('2021-01-01'), d('2021-06-30'))
+
+        # 缺口没有数据（如尚未到来的交易日）：返回已有数据，不扩展缓存范围
+        data = wrapper.fetch_data('000001', d('2021-01-01'), d('2021-07-10'))
+        assert len(data) == len(source.truth(d('2021-01-01'), d('2021-06-30')))
+        assert entry_ranges(manager) == [('2021-01-01', '2021-06-30')]
+        print("✅ 空缺口不写入缓存")
+
+        loaded = count_loads(manager)
+        assert manager.get_data('unknown', 'a_stock', '000001', d('2021-01-01'), d('2021-07-10')) is None
+        assert loaded == []
+        print("✅ get_data 部分命中返回None且不读取文件")
+
+        assert CacheManager._missing_ranges(d('2021-01-01'), d('2021-01-31'), [
+            (d('2021-01-05'), d('2021-01-10')), (d('2021-01-08'), d('2021-01-12')), (d('2021-01-20'), d('2021-02-10'))
+        ]) == [(d('2021-01-01'), d('2021-01-04')), (d('2021-01-13'), d('2021-01-19'))]
+        print("✅ 缺失区间计算正确")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试缓存缺口补取...\n")
+
+    test_extend_range()
+    test_multiple_gaps()
+    test_empty_gap_and_plain_get()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,96 @@
+"""
+测试模块导入耗时
+验证核心模块导入时不加载 streamlit / matplotlib / akshare / yfinance / tushare / openpyxl，
+且在 pandas 之外的导入耗时保持在较低水平（离线，每个模块在新进程中测量）
+"""
+
+import ast
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+HEAVY_MODULES = ('streamlit', 'matplotlib', 'akshare', 'yfinance', 'tushare', 'openpyxl')
+CORE_MODULES = ('strategy_backtest', 'cache_manager', 'data_source', 'cached_data_source',
+                'batch_backtest', 'parameter_sweep', 'tools')
+# 除 pandas/numpy 外的导入耗时上限（秒），实测约为 0.01-0.05 秒
+MAX_IMPORT_SECONDS = {'strategy_backtest': 0.15, 'cache_manager': 0.15}
+DEFAULT_MAX_SECONDS = 0.3
+
+MEASURE_SCRIPT = """
+import sys, json, time, importlib
+sys.path.insert(0, sys.argv[1])
+import numpy, pandas
+t0 = time.perf_counter()
+importlib.import_module(sys.argv[2])
+elapsed = time.perf_counter() - t0
+heavy = sorted({name.split('.')[0] for name in sys.modules} & set(sys.argv[3].split(',')))
+print(json.dumps({'seconds': elapsed, 'heavy': heavy}))
+"""
+
+
+def measure_import(module: str) -> dict:
+    """在新进程中导入模块，返回耗时和已加载的重量级依赖"""
+    result = subprocess.run([sys.executable, "-c", MEASURE_SCRIPT, str(PROJECT_ROOT), module,
+                             ','.join(HEAVY_MODULES)],
+                            capture_output=True, text=True, check=True, cwd=str(PROJECT_ROOT))
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_core_imports():
+    """测试1: 核心模块导入耗时与依赖"""
+    print("=" * 80)
+    print("测试1: 核心模块导入")
+    print("=" * 80)
+
+    for module in CORE_MODULES:
+        # 取两次中较快的一次，排除首次编译 .pyc 的耗时
+        runs = [measure_import(module) for _ in range(2)]
+        seconds = min(run['seconds'] for run in runs)
+        assert runs[-1]['heavy'] == [], (module, runs[-1]['heavy'])
+        limit = MAX_IMPORT_SECONDS.get(module, DEFAULT_MAX_SECONDS)
+        assert seconds < limit, (module, seconds)
+        print(f"✅ import {module}: {seconds*1000:.1f} ms（pandas 之外），未加载重量级依赖")
+
+    print()
+
+
+def test_run_main_top_level_imports():
+    """测试2: run_main 顶层只导入 streamlit，其他重量级依赖在使用时导入"""
+    print("=" * 80)
+    print("测试2: run_main 顶层导入")
+    print("=" * 80)
+
+    tree = ast.parse((PROJECT_ROOT / "run_main.py").read_text(encoding='utf-8'))
+    top_level = set()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            top_level.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            top_level.add(node.module.split('.')[0])
+    eager = sorted(top_level & set(HEAVY_MODULES) - {'streamlit'})
+    assert eager == [], eager
+    print(f"✅ run_main 顶层导入: {', '.join(sorted(top_level))}")
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试模块导入耗时...\n")
+
+    test_core_imports()
+    test_run_main_top_level_imports()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
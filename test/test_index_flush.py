@@ -0,0 +1,218 @@
+"""
+测试索引访问记录延迟写入
+验证访问记录按次数/定时/进程退出写入、写入中途失败不损坏索引文件（离线）
+"""
+
+import sys
+import json
+import math
+import time
+import shutil
+import datetime
+import tempfile
+import subprocess
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import cache_manager
+from cache_manager import CacheIndex, CacheManager
+from cached_data_source import CachedDataSourceWrapper
+from test_sqlite_index import make_entry
+from test_fetch_many import SlowDataSource
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def count_saves(index: CacheIndex) -> list:
+    """记录索引文件写入次数"""
+    saves = []
+    original = index._save_index
+
+    def save_index():
+        saves.append(index._pending_access)
+        original()
+
+    index._save_index = save_index
+    return saves
+
+
+def read_access_count(index_file: Path, key: str) -> int:
+    entries = json.loads(index_file.read_text(encoding='utf-8'))['entries']
+    return entries[key].get('access_count', 0)
+
+
+def test_batched_flush():
+    """测试1: 访问记录按次数批量写入"""
+    print("=" * 80)
+    print("测试1: 按次数批量写入")
+    print("=" * 80)
+
+    tmp = Path(tempfile.mkdtemp(prefix="index_flush_test_"))
+    try:
+        index_file = tmp / "cache_index.json"
+        index = CacheIndex(index_file, flush_interval=0, flush_every=100)
+        for i in range(500):
+            index.add_entry(f"k{i}", make_entry(f"{i:06d}"))
+
+        saves = count_saves(index)
+        t0 = time.perf_counter()
+        for i in range(500):
+            index.update_access(f"k{i % 50}")
+        elapsed = time.perf_counter() - t0
+        assert len(saves) == 5, saves
+        assert index.get_entry('k0')['access_count'] == 10
+        assert read_access_count(index_file, 'k0') == 10
+        print(f"✅ 500次缓存命中只写入索引 {len(saves)} 次，耗时 {elapsed*1000:.1f} ms")
+
+        for _ in range(3):
+            index.update_access('k1')
+        assert read_access_count(index_file, 'k1') == 10
+        index.flush()
+        index.flush()
+        assert read_access_count(index_file, 'k1') == 13 and len(saves) == 6
+        print("✅ flush() 写入未保存的访问记录，没有新记录时不写入")
+
+        # 新增条目时一并写入累积的访问记录
+        index.update_access('k2')
+        index.add_entry('extra', make_entry('999999'))
+        assert read_access_count(index_file, 'k2') == 11 and index._pending_access == 0
+        print("✅ 新增条目时一并写入访问记录")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print()
+
+
+def test_timer_and_exit_flush():
+    """测试2: 定时写入与进程退出时写入"""
+    print("=" * 80)
+    print("测试2: 定时写入与退出时写入")
+    print("=" * 80)
+
+    tmp = Path(tempfile.mkdtemp(prefix="index_flush_test_"))
+    try:
+        index_file = tmp / "cache_index.json"
+        index = CacheIndex(index_file, flush_interval=0.2, flush_every=1000)
+        index.add_entry('k1', make_entry('000001'))
+        index.update_access('k1')
+        index.update_access('k1')
+        assert read_access_count(index_file, 'k1') == 0
+        time.sleep(0.6)
+        assert read_access_count(index_file, 'k1') == 2
+        print("✅ 超过 flush_interval 后自动写入")
+
+        script = (
+            "import sys; sys.path.insert(0, sys.argv[1]);"
+            "from pathlib import Path; from cache_manager import CacheIndex;"
+            "index = CacheIndex(Path(sys.argv[2]), flush_interval=3600, flush_every=1000);"
+            "[index.update_access('k1') for _ in range(5)]"
+        )
+        subprocess.run([sys.executable, "-c", script, str(PROJECT_ROOT), str(index_file)], check=True)
+        assert read_access_count(index_file, 'k1') == 7
+        print("✅ 进程退出时写入未保存的访问记录")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print()
+
+
+def test_atomic_replace():
+    """测试3: 写入中途失败不损坏索引文件"""
+    print("=" * 80)
+    print("测试3: 原子替换")
+    print("=" * 80)
+
+    tmp = Path(tempfile.mkdtemp(prefix="index_flush_test_"))
+    original_fsync = cache_manager.os.fsync
+    try:
+        index_file = tmp / "cache_index.json"
+        index = CacheIndex(index_file, flush_interval=0, flush_every=1)
+        index.add_entry('k1', make_entry('000001'))
+        before = index_file.read_text(encoding='utf-8')
+
+        def broken_fsync(fd):
+            raise OSError("磁盘已满")
+
+        # 临时文件已写入、尚未替换时失败
+        cache_manager.os.fsync = broken_fsync
+        index.update_access('k1')
+        cache_manager.os.fsync = original_fsync
+
+        assert index_file.read_text(encoding='utf-8') == before
+        assert not [f.name for f in tmp.iterdir() if f.suffix == '.tmp']
+        assert CacheIndex(index_file).get_entry('k1') is not None
+        print("✅ 写入失败时保留原索引文件，不留下临时文件")
+    finally:
+        cache_manager.os.fsync = original_fsync
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print()
+
+
+def test_shared_index():
+    """测试4: 每个代码各自创建 CacheManager 时共享索引"""
+    print("=" * 80)
+    print("测试4: 多个 CacheManager 共享索引")
+    print("=" * 80)
+
+    cache_root = Path(tempfile.mkdtemp(prefix="index_flush_test_"))
+    original_save = CacheIndex._save_index
+    try:
+        config = json.loads((PROJECT_ROOT / "cache" / "config.json").read_text(encoding='utf-8'))
+        config['cache_settings'].update(index_flush_interval_seconds=0, index_flush_every=10)
+        (cache_root / "config.json").write_text(json.dumps(config), encoding='utf-8')
+
+        start_date = datetime.date(2020, 1, 1)
+        end_date = datetime.date(2020, 12, 31)
+        source = SlowDataSource(delay=0)
+        CachedDataSourceWrapper(source, CacheManager(str(cache_root))).fetch_data(
+            '000001', start_date, end_date, market='A股')
+
+        saves = []
+
+        def save_index(index):
+            saves.append(index)
+            original_save(index)
+
+        CacheIndex._save_index = save_index
+        n = 50
+        managers = []
+        for _ in range(n):
+            manager = CacheManager(str(cache_root))
+            df = CachedDataSourceWrapper(source, manager).fetch_data('000001', start_date, end_date, market='A股')
+            assert df is not None
+            managers.append(manager)
+        cache_manager._flush_pending_indexes()
+
+        assert len(source.calls) == 1
+        assert len(saves) <= math.ceil(n / 10), len(saves)
+        assert all(manager.index is managers[0].index for manager in managers)
+        entries = json.loads((cache_root / "metadata" / "cache_index.json").read_text(encoding='utf-8'))['entries']
+        assert sum(entry.get('access_count', 0) for entry in entries.values()) == n
+        print(f"✅ {n} 个 CacheManager 各命中一次，共享同一索引，写入 {len(saves)} 次")
+    finally:
+        CacheIndex._save_index = original_save
+        shutil.rmtree(cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试索引延迟写入...\n")
+
+    test_batched_flush()
+    test_timer_and_exit_flush()
+    test_atomic_replace()
+    test_shared_index()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
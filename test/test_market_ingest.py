@@ -0,0 +1,173 @@
+"""
+测试 Tushare 截面批量获取
+验证按交易日获取的结果与逐个代码获取一致、请求次数只与交易日数量有关、一次写入缓存（离线，使用模拟 Tushare 接口）
+"""
+
+import sys
+import shutil
+import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from data_source import TushareDataSource
+from rate_limiter import configure_rate_limit, get_rate_limiter
+from cached_data_source import CachedDataSourceWrapper
+from test_fetch_many import make_cache_manager
+from test_cache_lookup import d
+
+
+class FakePro:
+    """模拟 Tushare pro 接口：daily / adj_factor 支持按 ts_code 或按 trade_date 查询"""
+
+    def __init__(self, n_codes: int, start: str = '2021-01-01', days: int = 120, seed: int = 70):
+        rng = np.random.default_rng(seed)
+        dates = pd.bdate_range(start, periods=days)
+        # 每隔15个工作日休市一天，验证交易日历
+        self.open_dates = [x.strftime('%Y%m%d') for i, x in enumerate(dates) if i % 15 != 7]
+        rows = []
+        for i in range(n_codes):
+            ts_code = f"{600000 + i}.SH" if i % 2 == 0 else f"{i:06d}.SZ"
+            # 部分代码在区间中途上市
+            listed = self.open_dates[(i * 7) % 30:]
+            close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(listed))))
+            factor = np.where(np.arange(len(listed)) < len(listed) // 2, 1.0, 1.25)
+            rows.append(pd.DataFrame({
+                'ts_code': ts_code, 'trade_date': listed,
+                'open': close * 0.99, 'high': close * 1.02, 'low': close * 0.97, 'close': close,
+                'vol': rng.integers(100, 10000, len(listed)).astype(float), 'adj_factor': factor
+            }))
+        self.table = pd.concat(rows, ignore_index=True)
+        self.calls = []
+
+    def _select(self, ts_code=None, trade_date=None, start_date=None, end_date=None):
+        df = self.table
+        if ts_code is not None:
+            df = df[df['ts_code'] == ts_code]
+        if trade_date is not None:
+            df = df[df['trade_date'] == trade_date]
+        if start_date is not None:
+            df = df[(df['trade_date'] >= start_date) & (df['trade_date'] <= end_date)]
+        # Tushare 按日期倒序返回
+        return df.sort_values('trade_date', ascending=False).reset_index(drop=True)
+
+    def daily(self, **kwargs):
+        self.calls.append(('daily', kwargs))
+        return self._select(**kwargs).drop(columns='adj_factor')
+
+    def adj_factor(self, **kwargs):
+        self.calls.append(('adj_factor', kwargs))
+        return self._select(**kwargs)[['ts_code', 'trade_date', 'adj_factor']]
+
+    def trade_cal(self, exchange, start_date, end_date, is_open):
+        self.calls.append(('trade_cal', {}))
+        return pd.DataFrame({'cal_date': [x for x in self.open_dates if start_date <= x <= end_date]})
+
+
+def unlimited(func):
+    """测试期间取消 Tushare 限流（模拟接口无需限速），结束后恢复"""
+    def wrapper():
+        original = get_rate_limiter('tushare').requests_per_minute
+        configure_rate_limit('tushare', 10 ** 7)
+        try:
+            func()
+        finally:
+            configure_rate_limit('tushare', original)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def make_source(pro: FakePro) -> TushareDataSource:
+    source = TushareDataSource(token='x')
+    source.ts, source.pro = object(), pro
+    return source
+
+
+@unlimited
+def test_matches_per_code_fetch():
+    """测试1: 截面获取与逐个代码获取结果一致"""
+    print("=" * 80)
+    print("测试1: 与逐个代码获取一致")
+    print("=" * 80)
+
+    pro = FakePro(n_codes=40)
+    source = make_source(pro)
+    start, end = d('2021-01-01'), d('2021-06-30')
+    frames = source.fetch_market_daily(start, end)
+    trade_days = len(pro.open_dates)
+    assert len(frames) == 40
+    assert len(pro.calls) == 1 + 2 * trade_days, len(pro.calls)
+    print(f"✅ 40个代码 {trade_days} 个交易日，共 {len(pro.calls)} 次请求（逐个代码需要 80 次以上且随代码数增长）")
+
+    TushareDataSource.fetch_data.cache_clear()
+    for code, df in frames.items():
+        expected = source.fetch_data(code, start, end, market='A股')
+        pd.testing.assert_frame_equal(df, expected, check_freq=False)
+    TushareDataSource.fetch_data.cache_clear()
+    print("✅ 每个代码的复权价格、成交量与 fetch_data 结果一致（含中途上市的代码）")
+
+    pro.calls.clear()
+    subset = source.fetch_market_daily(start, end, codes=['600000', '000003', '999999'])
+    assert sorted(subset) == ['000003', '600000']
+    pd.testing.assert_frame_equal(subset['600000'], frames['600000'])
+    print("✅ codes 参数只保留指定代码")
+
+    assert source.fetch_market_daily(start, end, market='港股') == {}
+
+    print()
+
+
+@unlimited
+def test_ingest_into_cache():
+    """测试2: 截面数据一次写入缓存，之后批量取数全部命中"""
+    print("=" * 80)
+    print("测试2: 写入缓存")
+    print("=" * 80)
+
+    pro = FakePro(n_codes=300, days=60)
+    manager = make_cache_manager(layout='partitioned')
+    try:
+        wrapper = CachedDataSourceWrapper(make_source(pro), manager)
+        saves = []
+        original = manager.index._save_index
+        manager.index._save_index = lambda: (saves.append(1), original())
+
+        start, end = d('2021-01-01'), d('2021-03-31')
+        frames = wrapper.ingest_market(start, end, market='A股')
+        assert len(frames) == 300 and len(manager.index.get_all_entries()) == 300
+        assert len(saves) == 1, len(saves)
+        print(f"✅ 300个代码写入缓存，索引只写入 {len(saves)} 次")
+
+        pro.calls.clear()
+        codes = list(frames)[:50]
+        data, errors = wrapper.fetch_many(codes, start, end, market='A股')
+        assert not errors and pro.calls == []
+        for code in codes:
+            pd.testing.assert_frame_equal(data[code], frames[code], check_freq=False)
+        print("✅ 之后按代码批量取数全部命中缓存，不再请求接口")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试 Tushare 截面批量获取...\n")
+
+    test_matches_per_code_fetch()
+    test_ingest_into_cache()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
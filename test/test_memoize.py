@@ -0,0 +1,150 @@
+"""
+测试数据源记忆化缓存
+验证 data_source 不依赖 Streamlit 即可导入、fetch_data 按参数缓存、过期与容量淘汰（离线）
+"""
+
+import sys
+import time
+import subprocess
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from data_source import AKShareDataSource, TushareDataSource, TTLMemoCache, memoize
+from test_backtest_engine import make_ohlcv
+from test_cache_lookup import d
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+class CountingSource:
+    """记录实际调用次数的数据源"""
+
+    def __init__(self):
+        self.calls = 0
+
+    @memoize(ttl=0.3, maxsize=2)
+    def fetch_data(self, code, start_date, end_date, **kwargs):
+        self.calls += 1
+        if code == 'missing':
+            return None
+        return make_ohlcv(n=50, seed=len(code))
+
+
+def test_import_without_streamlit():
+    """测试1: 导入 data_source 不加载 Streamlit"""
+    print("=" * 80)
+    print("测试1: 不依赖 Streamlit")
+    print("=" * 80)
+
+    script = "import sys; sys.path.insert(0, sys.argv[1]); import data_source; print('streamlit' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", script, str(PROJECT_ROOT)],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False', result.stdout + result.stderr
+    print("✅ import data_source 未导入 streamlit")
+
+    print()
+
+
+def test_memoize_hits_and_copies():
+    """测试2: 相同参数命中缓存，返回副本，失败结果不缓存"""
+    print("=" * 80)
+    print("测试2: 命中与副本")
+    print("=" * 80)
+
+    CountingSource.fetch_data.cache_clear()
+    source = CountingSource()
+    first = source.fetch_data('000001', d('2020-01-01'), d('2020-12-31'), market='A股')
+    first['close'] = 0.0
+    second = CountingSource().fetch_data('000001', d('2020-01-01'), d('2020-12-31'), market='A股')
+    assert source.calls == 1
+    assert (second['close'] != 0.0).all()
+    print("✅ 相同参数（不同实例）只调用一次，修改返回值不影响缓存")
+
+    source.fetch_data('000001', d('2020-01-01'), d('2020-12-31'), market='港股')
+    assert source.calls == 2
+    assert source.fetch_data('missing', d('2020-01-01'), d('2020-12-31')) is None
+    assert source.fetch_data('missing', d('2020-01-01'), d('2020-12-31')) is None
+    assert source.calls == 4
+    print("✅ 参数不同时重新获取，返回 None 时不缓存")
+
+    source.fetch_data('000001', d('2020-01-01'), d('2020-12-31'), market=['A股'])
+    source.fetch_data('000001', d('2020-01-01'), d('2020-12-31'), market=['A股'])
+    assert source.calls == 6
+    print("✅ 参数不可哈希时直接调用")
+
+    print()
+
+
+def test_ttl_and_maxsize():
+    """测试3: 过期与容量淘汰"""
+    print("=" * 80)
+    print("测试3: 过期与容量淘汰")
+    print("=" * 80)
+
+    cache = TTLMemoCache(ttl=0.2, maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is TTLMemoCache.MISSING and cache.get('a') == 1 and len(cache) == 2
+    print("✅ 超过 maxsize 时淘汰最久未使用的条目")
+
+    time.sleep(0.3)
+    assert cache.get('a') is TTLMemoCache.MISSING and len(cache) == 1
+    print("✅ 超过 ttl 后条目失效")
+
+    CountingSource.fetch_data.cache_clear()
+    source = CountingSource()
+    source.fetch_data('000001', d('2020-01-01'), d('2020-12-31'))
+    time.sleep(0.4)
+    source.fetch_data('000001', d('2020-01-01'), d('2020-12-31'))
+    assert source.calls == 2
+    print("✅ 装饰器缓存过期后重新获取")
+
+    print()
+
+
+def test_data_sources_memoized():
+    """测试4: AKShare / Tushare 的 fetch_data 使用记忆化缓存"""
+    print("=" * 80)
+    print("测试4: 数据源方法")
+    print("=" * 80)
+
+    df = make_ohlcv(n=100, seed=50)
+    calls = []
+
+    source = AKShareDataSource()
+    source._fetch_a_stock = lambda code, start, end: calls.append(code) or df
+    AKShareDataSource.fetch_data.cache_clear()
+    for _ in range(3):
+        result = source.fetch_data('600000', d('2020-01-01'), d('2020-06-30'), market='A股')
+    assert calls == ['600000'] and result.equals(df)
+    assert AKShareDataSource.fetch_data.cache.hits == 2
+    AKShareDataSource.fetch_data.cache_clear()
+    print("✅ AKShareDataSource.fetch_data 重复请求命中缓存")
+
+    assert TushareDataSource.fetch_data.cache is not AKShareDataSource.fetch_data.cache
+    print("✅ 各数据源的缓存相互独立")
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试数据源记忆化缓存...\n")
+
+    test_import_without_streamlit()
+    test_memoize_hits_and_copies()
+    test_ttl_and_maxsize()
+    test_data_sources_memoized()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
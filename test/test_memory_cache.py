@@ -0,0 +1,177 @@
+"""
+测试内存缓存层
+验证重复读取不访问磁盘、返回的数据修改不影响缓存、文件变化失效、按字节LRU淘汰和范围读取的命中统计（离线）
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import MemoryCache
+from test_backtest_engine import make_ohlcv
+from test_fetch_many import make_cache_manager
+
+
+class CountingReader:
+    """统计 pd.read_parquet 调用次数"""
+
+    def __enter__(self):
+        self.count = 0
+        self.original = pd.read_parquet
+
+        def read_parquet(*args, **kwargs):
+            self.count += 1
+            return self.original(*args, **kwargs)
+
+        pd.read_parquet = read_parquet
+        return self
+
+    def __exit__(self, *exc):
+        pd.read_parquet = self.original
+
+
+def test_repeated_reads():
+    """测试1: 重复查询不读磁盘，修改返回值不影响缓存"""
+    print("=" * 80)
+    print("测试1: 重复查询不读磁盘")
+    print("=" * 80)
+
+    manager = make_cache_manager()
+    manager.storage.memory.clear()
+    try:
+        df = make_ohlcv(n=2000, seed=4)
+        start, end = df.index[0].date(), df.index[-1].date()
+        manager.save_data(df, 'akshare', 'a_stock', '000001', start, end)
+
+        with CountingReader() as reader:
+            first = manager.get_data('akshare', 'a_stock', '000001', start, end)
+            first_reads = reader.count
+            first['close'] = 0.0
+            first.iloc[0, 0] = -1.0
+            t0 = time.perf_counter()
+            for _ in range(20):
+                again = manager.get_data('akshare', 'a_stock', '000001', start, end)
+            elapsed = (time.perf_counter() - t0) / 20
+        assert first_reads > 0 and reader.count == first_reads, reader.count
+        pd.testing.assert_frame_equal(again, df, check_freq=False)
+        print(f"✅ 21次查询只在第一次读取文件（{first_reads}个），内存命中平均 {elapsed*1000:.2f} ms")
+        print("✅ 修改返回的DataFrame不影响缓存")
+
+        stats = manager.storage.memory.get_statistics()
+        assert stats['entries'] == first_reads and stats['hits'] >= 20 * first_reads
+        print(f"   内存缓存统计: {stats}")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_invalidation_and_eviction():
+    """测试2: 文件变化失效与按字节LRU淘汰"""
+    print("=" * 80)
+    print("测试2: 文件变化失效与LRU淘汰")
+    print("=" * 80)
+
+    tmp = Path(tempfile.mkdtemp(prefix="memory_test_"))
+    try:
+        frames = [make_ohlcv(n=500, seed=i) for i in range(3)]
+        frame_bytes = int(frames[0].memory_usage(index=True, deep=True).sum())
+        memory = MemoryCache(max_bytes=int(frame_bytes * 2.5))
+
+        paths = []
+        for i, frame in enumerate(frames):
+            path = tmp / f"{i}.parquet"
+            frame.to_parquet(path)
+            memory.put(path, frame)
+            paths.append(path)
+            if i == 1:
+                # 访问第一个，使第二个成为最久未使用
+                assert memory.get(paths[0]) is not None
+
+        assert memory.get(paths[1]) is None
+        assert memory.get(paths[0]) is not None and memory.get(paths[2]) is not None
+        assert memory.current_bytes <= memory.max_bytes
+        print("✅ 超出容量时淘汰最久未使用的条目")
+
+        # 重写文件后缓存失效
+        time.sleep(0.01)
+        frames[0].iloc[:10].to_parquet(paths[0])
+        assert memory.get(paths[0]) is None
+        print("✅ 文件重写后缓存自动失效")
+
+        big = MemoryCache(max_bytes=frame_bytes // 2)
+        big.put(paths[2], frames[2])
+        assert big.get(paths[2]) is None
+        assert MemoryCache(max_bytes=0).get(paths[2]) is None
+        print("✅ 超过容量的单个文件和禁用时不缓存")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print()
+
+
+def test_ranged_read_statistics():
+    """测试3: 按日期范围读取只计一次命中/未命中"""
+    print("=" * 80)
+    print("测试3: 范围读取的命中统计")
+    print("=" * 80)
+
+    manager = make_cache_manager(layout='range')
+    memory = manager.storage.memory
+    memory.clear()
+    try:
+        df = make_ohlcv(n=1500, seed=5)
+        start, end = df.index[0].date(), df.index[-1].date()
+        manager.save_data(df, 'akshare', 'a_stock', '000001', start, end)
+        path = Path(next(iter(manager.index.get_all_entries().values()))['file_path'])
+        part = (df.index[100].date(), df.index[200].date())
+
+        def counts():
+            stats = memory.get_statistics()
+            return stats['hits'], stats['misses']
+
+        before = counts()
+        manager.storage._read_file(path, *part)
+        after_cold = counts()
+        assert (after_cold[0] - before[0], after_cold[1] - before[1]) == (0, 1), (before, after_cold)
+        data = manager.storage._read_file(path, *part)
+        after_warm = counts()
+        assert (after_warm[0] - after_cold[0], after_warm[1] - after_cold[1]) == (1, 0)
+        assert len(data) == 101
+        print("✅ 冷读取记1次未命中，再次读取记1次命中")
+
+        manager.storage._read_file(path)
+        before = counts()
+        data = manager.storage._read_file(path, df.index[300].date(), df.index[310].date())
+        after = counts()
+        assert (after[0] - before[0], after[1] - before[1]) == (1, 0) and len(data) == 11
+        print("✅ 已缓存整个文件时从中过滤，记1次命中")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试内存缓存层...\n")
+
+    test_repeated_reads()
+    test_invalidation_and_eviction()
+    test_ranged_read_statistics()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,115 @@
+"""
+测试参数扫描
+验证网格扫描结果与逐个回测一致，共享指标只计算一次（离线，使用随机行情）
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from strategy_backtest import StrategyFactory, BacktestEngine
+from parameter_sweep import ParameterSweep, calculate_max_drawdown
+from test_backtest_engine import make_ohlcv
+
+
+GRIDS = {
+    "MACD趋势策略": {'fast': [5, 12], 'slow': [10, 26], 'signal': [5, 9]},
+    "双均线策略(SMA)": {'short': [3, 5, 25], 'long': [10, 20]},
+    "RSI超买超卖": {'period': [6, 14], 'lower': [20, 30], 'upper': [70, 80]},
+    "布林带突破": {'period': [10, 20], 'std': [1.5, 2.0]},
+}
+
+
+def test_sweep_matches_single_backtests():
+    """测试1: 扫描结果与逐个回测一致"""
+    print("=" * 80)
+    print("测试1: 扫描结果与单次回测一致性")
+    print("=" * 80)
+
+    df = make_ohlcv(n=1500, seed=5)
+    engine = BacktestEngine(initial_cash=50000, buy_commission=0.001, allow_fractional=False)
+
+    for name, grid in GRIDS.items():
+        sweep = ParameterSweep(name, grid, df, engine)
+        results = sweep.run()
+        assert len(results) == len(sweep.combinations())
+
+        for params, (_, row) in zip(sweep.combinations(), results.iterrows()):
+            single = engine.run(df, StrategyFactory.create_strategy(name, params))
+            assert single.total_return == row['total_return']
+            assert single.benchmark_return == row['benchmark_return']
+            assert single.win_rate == row['win_rate']
+            assert single.total_trades == row['total_trades']
+            assert row['max_drawdown'] == calculate_max_drawdown(single.df['equity'].to_numpy())
+        print(f"✅ {name}: {len(results)} 个组合结果一致")
+
+    print()
+
+
+def test_constraints_and_shared_indicators():
+    """测试2: 参数约束与指标共享"""
+    print("=" * 80)
+    print("测试2: 参数约束与指标共享")
+    print("=" * 80)
+
+    df = make_ohlcv(n=500, seed=2)
+    sweep = ParameterSweep("双均线策略(SMA)", {'short': [5, 10, 20], 'long': [10, 20, 60]}, df)
+    combos = sweep.combinations()
+    assert all(p['short'] < p['long'] for p in combos)
+    assert len(combos) == 6
+    print(f"✅ 过滤无效组合后剩余 {len(combos)} 个")
+
+    sweep.run()
+    # 5/10/20/60 四个窗口，每个只计算一次
+    assert len(sweep.indicators) == 4
+    print(f"✅ 共计算 {len(sweep.indicators)} 条均线")
+
+    assert calculate_max_drawdown(np.array([100.0, 120.0, 90.0, 130.0])) == 90.0 / 120.0 - 1
+    print("✅ 最大回撤计算正确")
+
+    print()
+
+
+def test_large_sweep_speed():
+    """测试3: 大规模扫描耗时"""
+    print("=" * 80)
+    print("测试3: 大规模扫描耗时")
+    print("=" * 80)
+
+    df = make_ohlcv(n=750, seed=1)
+    grid = {'short': range(2, 62), 'long': range(10, 210)}
+
+    t0 = time.perf_counter()
+    results = ParameterSweep("双均线策略(SMA)", grid, df).run(sort_by='total_return')
+    elapsed = time.perf_counter() - t0
+
+    assert results['total_return'].is_monotonic_decreasing
+    print(f"   {len(results)} 个组合耗时: {elapsed:.2f} 秒")
+    best = results.iloc[0]
+    print(f"   最佳参数: short={int(best['short'])}, long={int(best['long'])}, "
+          f"收益率={best['total_return']*100:.2f}%")
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试参数扫描...\n")
+
+    test_sweep_matches_single_backtests()
+    test_constraints_and_shared_indicators()
+    test_large_sweep_speed()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
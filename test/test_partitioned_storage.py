@@ -0,0 +1,238 @@
+"""
+测试分区存储
+验证每个资产一个按年/月分区的数据集、范围查询只读取相交分区、旧版文件迁移和按范围删除、过期条目数据不被读出（离线）
+"""
+
+import sys
+import json
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import CacheManager
+from test_backtest_engine import make_ohlcv
+from test_fetch_many import make_cache_manager
+from test_cache_lookup import d
+
+
+def slice_dates(df: pd.DataFrame, start: str, end: str) -> pd.DataFrame:
+    return df[(df.index.date >= d(start)) & (df.index.date <= d(end))]
+
+
+def spy_reads(manager: CacheManager) -> list:
+    """记录实际读取的分区文件"""
+    manager.storage.memory.clear()
+    read = []
+    original = manager.storage._read_file
+
+    def read_file(file_path, *args):
+        read.append(file_path.name)
+        return original(file_path, *args)
+
+    manager.storage._read_file = read_file
+    return read
+
+
+def test_single_dataset_per_asset():
+    """测试1: 重叠范围写入同一个数据集，查询只读取相交分区"""
+    print("=" * 80)
+    print("测试1: 每个资产一个分区数据集")
+    print("=" * 80)
+
+    manager = make_cache_manager(layout='partitioned')
+    try:
+        df = make_ohlcv(n=1500, seed=8)
+        for start, end in [('2020-01-01', '2020-12-31'), ('2020-06-01', '2021-08-31'), ('2021-09-01', '2023-06-30')]:
+            assert manager.save_data(slice_dates(df, start, end), 'akshare', 'a_stock', '000001', d(start), d(end))
+
+        entries = manager.index.get_all_entries()
+        assert len(entries) == 1
+        entry = next(iter(entries.values()))
+        assert (entry['start_date'], entry['end_date']) == ('2020-01-01', '2023-06-30')
+        assert entry['rows'] == len(slice_dates(df, '2020-01-01', '2023-06-30'))
+
+        dataset_dir = Path(entry['file_path'])
+        files = sorted(f.name for f in dataset_dir.iterdir())
+        assert files == ['2020.parquet', '2021.parquet', '2022.parquet', '2023.parquet'], files
+        data_files = [f for f in manager.data_dir.rglob('*') if f.is_file()]
+        assert len(data_files) == 4
+        print(f"✅ 3次重叠写入 -> 1个缓存条目、{len(files)} 个年度分区")
+
+        read = spy_reads(manager)
+        data = manager.get_data('akshare', 'a_stock', '000001', d('2021-03-01'), d('2021-05-31'))
+        pd.testing.assert_frame_equal(data, slice_dates(df, '2021-03-01', '2021-05-31'), check_freq=False)
+        assert read == ['2021.parquet'], read
+        print("✅ 查询只读取相交的分区: 2021.parquet")
+
+        read.clear()
+        data = manager.get_data('akshare', 'a_stock', '000001', d('2020-01-01'), d('2023-06-30'))
+        assert len(data) == entry['rows'] and not data.index.duplicated().any()
+        print("✅ 全范围查询无重复行")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_legacy_migration_and_delete():
+    """测试2: 旧版范围文件迁移与按范围删除"""
+    print("=" * 80)
+    print("测试2: 旧版文件迁移与删除")
+    print("=" * 80)
+
+    manager = make_cache_manager(layout='range')
+    try:
+        df = make_ohlcv(n=1500, seed=9)
+        manager.save_data(slice_dates(df, '2020-01-01', '2020-12-31'), 'akshare', 'a_stock', '000001',
+                          d('2020-01-01'), d('2020-12-31'))
+
+        config_path = manager.cache_root / "config.json"
+        config = json.loads(config_path.read_text(encoding='utf-8'))
+        config['storage_format']['layout'] = 'partitioned'
+        config_path.write_text(json.dumps(config), encoding='utf-8')
+        manager = CacheManager(str(manager.cache_root))
+
+        # 旧版文件仍可读取
+        assert manager.get_data('akshare', 'a_stock', '000001', d('2020-02-01'), d('2020-03-31')) is not None
+
+        # 相邻范围写入时并入数据集，旧文件删除
+        manager.save_data(slice_dates(df, '2021-01-01', '2021-06-30'), 'akshare', 'a_stock', '000001',
+                          d('2021-01-01'), d('2021-06-30'))
+        assert not list((manager.data_dir / 'akshare' / 'a_stock').glob('*.parquet'))
+        entries = list(manager.index.get_all_entries().values())
+        assert [(e['start_date'], e['end_date']) for e in entries] == [('2020-01-01', '2021-06-30')]
+        data = manager.get_data('akshare', 'a_stock', '000001', d('2020-01-01'), d('2021-06-30'))
+        pd.testing.assert_frame_equal(data, slice_dates(df, '2020-01-01', '2021-06-30'), check_freq=False)
+        print("✅ 旧版文件并入分区数据集")
+
+        # 不相邻的范围为单独条目，删除时只删除自己的数据
+        manager.save_data(slice_dates(df, '2021-09-01', '2021-12-31'), 'akshare', 'a_stock', '000001',
+                          d('2021-09-01'), d('2021-12-31'))
+        keys = {e['start_date']: k for k, e in manager.index.get_all_entries().items()}
+        assert manager.delete_cache(keys['2021-09-01'])
+        data = manager.get_data('akshare', 'a_stock', '000001', d('2020-01-01'), d('2021-06-30'))
+        assert len(data) == len(slice_dates(df, '2020-01-01', '2021-06-30'))
+        dataset = manager.storage.load(manager.storage.dataset_dir('akshare', 'a_stock', '000001', '1d'))
+        assert dataset.index.max().date() == d('2021-06-30')
+        print("✅ 删除条目只删除其日期范围内的数据")
+
+        manager.clear_all_cache()
+        assert not manager.storage.dataset_dir('akshare', 'a_stock', '000001', '1d').exists()
+        print("✅ 清空后数据集目录被删除")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_month_partitions():
+    """测试3: 按月分区"""
+    print("=" * 80)
+    print("测试3: 按月分区（小时线）")
+    print("=" * 80)
+
+    manager = make_cache_manager(layout='partitioned', partition_by='month')
+    try:
+        df = make_ohlcv(n=24 * 90, seed=10, freq='h')
+        start, end = df.index[0].date(), df.index[-1].date()
+        manager.save_data(df, 'yfinance', 'crypto', 'BTC-USD', start, end, '1h')
+
+        dataset_dir = manager.storage.dataset_dir('yfinance', 'crypto', 'BTC-USD', '1h')
+        assert sorted(f.name for f in dataset_dir.iterdir()) == ['2020-01.parquet', '2020-02.parquet', '2020-03.parquet']
+
+        read = spy_reads(manager)
+        data = manager.get_data('yfinance', 'crypto', 'BTC-USD', d('2020-02-10'), d('2020-02-20'), '1h')
+        assert read == ['2020-02.parquet'] and len(data) == 11 * 24
+        print("✅ 按月分区，查询只读取一个月的分区")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_expired_neighbour():
+    """测试4: 过期条目的数据不会被相邻条目带出"""
+    print("=" * 80)
+    print("测试4: 过期条目")
+    print("=" * 80)
+
+    manager = make_cache_manager(layout='partitioned')
+    try:
+        df = make_ohlcv(n=400, seed=11)
+        df.index = pd.date_range('2023-01-01', periods=400, freq='D')
+        stale = slice_dates(df, '2023-01-01', '2023-03-31').copy()
+        stale['close'] = 1.0
+        manager.save_data(stale, 'akshare', 'a_stock', '000001', d('2023-01-01'), d('2023-03-31'))
+        manager.save_data(slice_dates(df, '2023-06-01', '2023-06-30'), 'akshare', 'a_stock', '000001',
+                          d('2023-06-01'), d('2023-06-30'))
+
+        # 1-3月条目过期
+        original = manager.policy.is_expired
+        manager.policy.is_expired = lambda entry: entry['start_date'] == '2023-01-01' or original(entry)
+        manager.save_data(slice_dates(df, '2023-04-01', '2023-05-31'), 'akshare', 'a_stock', '000001',
+                          d('2023-04-01'), d('2023-05-31'))
+        entries = list(manager.index.get_all_entries().values())
+        assert [(e['start_date'], e['end_date']) for e in entries] == [('2023-04-01', '2023-06-30')]
+
+        result = manager._query_partial('akshare', 'a_stock', '000001', d('2023-01-01'), d('2023-06-30'),
+                                        '1d', load_partial=True)
+        assert result['missing_ranges'] == [(d('2023-01-01'), d('2023-03-31'))]
+        pd.testing.assert_frame_equal(result['data'], slice_dates(df, '2023-04-01', '2023-06-30'), check_freq=False)
+        dataset = manager.storage.load(manager.storage.dataset_dir('akshare', 'a_stock', '000001', '1d'))
+        assert dataset.index.min().date() == d('2023-04-01')
+        print("✅ 过期条目的数据从数据集中删除，部分命中只返回有效条目范围内的数据")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_shared_partition_size():
+    """测试5: 共用分区的条目大小按行数分摊"""
+    print("=" * 80)
+    print("测试5: 条目大小")
+    print("=" * 80)
+
+    manager = make_cache_manager(layout='partitioned')
+    try:
+        df = make_ohlcv(n=365, seed=12)
+        df.index = pd.date_range('2023-01-01', periods=365, freq='D')
+        manager.save_data(slice_dates(df, '2023-01-01', '2023-03-31'), 'akshare', 'a_stock', '000001',
+                          d('2023-01-01'), d('2023-03-31'))
+        manager.save_data(slice_dates(df, '2023-06-01', '2023-06-30'), 'akshare', 'a_stock', '000001',
+                          d('2023-06-01'), d('2023-06-30'))
+
+        sizes = {e['start_date']: e['file_size_kb'] for e in manager.index.get_all_entries().values()}
+        partition_kb = (manager.storage.dataset_dir('akshare', 'a_stock', '000001', '1d') / '2023.parquet').stat().st_size / 1024
+        assert abs(sizes['2023-06-01'] * 3 - sizes['2023-01-01']) < 0.05 * sizes['2023-01-01'], sizes
+        assert abs(sum(sizes.values()) - partition_kb) < 0.05 * partition_kb, (sizes, partition_kb)
+        assert abs(manager.get_statistics()['total_size_mb'] * 1024 - partition_kb) < 0.05 * partition_kb
+        print(f"✅ 90行和30行的条目共用 {partition_kb:.2f} KB 的分区，记录 {sizes['2023-01-01']} KB / {sizes['2023-06-01']} KB")
+    finally:
+        shutil.rmtree(manager.cache_root, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试分区存储...\n")
+
+    test_single_dataset_per_asset()
+    test_legacy_migration_and_delete()
+    test_month_partitions()
+    test_expired_neighbour()
+    test_shared_partition_size()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,239 @@
+"""
+测试数据源限流与重试
+验证令牌桶限速（多线程共享）、Tushare 积分对应的速率、指数退避重试、被限流时全体暂停（离线，使用模拟接口）
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import rate_limiter
+from rate_limiter import (TokenBucket, call_with_retry, configure_rate_limit, get_rate_limiter,
+                          tushare_requests_per_minute, backoff_delay, is_retryable, is_throttled)
+from data_source import AKShareDataSource, TushareDataSource, DataSourceFactory
+from test_backtest_engine import make_ohlcv
+from test_cache_lookup import d
+
+
+class FlakyApi:
+    """前 failures 次调用抛出指定错误，之后返回结果"""
+
+    def __init__(self, error: Exception, failures: int, result=None):
+        self.error = error
+        self.failures = failures
+        self.result = result
+        self.calls = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append(time.monotonic())
+        if len(self.calls) <= self.failures:
+            raise self.error
+        return self.result
+
+
+def fast_retries(func):
+    """缩短重试等待，测试结束后恢复"""
+    def wrapper():
+        original = rate_limiter.BASE_DELAY, rate_limiter.MAX_DELAY
+        rate_limiter.BASE_DELAY, rate_limiter.MAX_DELAY = 0.05, 0.2
+        try:
+            func()
+        finally:
+            rate_limiter.BASE_DELAY, rate_limiter.MAX_DELAY = original
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def test_token_bucket():
+    """测试1: 令牌桶在多线程间共享速率"""
+    print("=" * 80)
+    print("测试1: 令牌桶限速")
+    print("=" * 80)
+
+    bucket = TokenBucket(requests_per_minute=1200, burst=5)  # 每秒20个
+    timestamps = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(10):
+            bucket.acquire()
+            with lock:
+                timestamps.append(time.monotonic())
+
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - t0
+
+    # 40个请求：5个突发，其余35个按每秒20个发放
+    assert 1.6 <= elapsed < 3.0, elapsed
+    assert sum(1 for t in timestamps if t - t0 < 0.05) <= 6
+    print(f"✅ 4个线程共40个请求耗时 {elapsed:.2f} 秒（突发5个，之后每秒20个）")
+
+    bucket.pause(0.3)
+    t0 = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - t0 >= 0.3
+    print("✅ pause() 期间所有请求等待")
+
+    print()
+
+
+def test_tushare_points():
+    """测试2: Tushare 积分决定每分钟请求上限"""
+    print("=" * 80)
+    print("测试2: Tushare 积分")
+    print("=" * 80)
+
+    assert [tushare_requests_per_minute(p) for p in (0, 120, 1999, 2000, 5000, 10000)] == [10, 50, 50, 200, 500, 500]
+    original = get_rate_limiter('tushare').requests_per_minute
+    try:
+        DataSourceFactory.create_data_source('tushare', token='x', points=5000)
+        assert get_rate_limiter('tushare').requests_per_minute == 500
+        TushareDataSource(token='x')
+        assert get_rate_limiter('tushare').requests_per_minute == 500
+        print("✅ 5000积分每分钟500次，未指定积分时保持当前设置")
+    finally:
+        configure_rate_limit('tushare', original)
+
+    print()
+
+
+@fast_retries
+def test_retry_and_backoff():
+    """测试3: 临时故障重试、不可重试错误直接抛出"""
+    print("=" * 80)
+    print("测试3: 重试与退避")
+    print("=" * 80)
+
+    for attempt, cap in enumerate([1, 2, 4, 8, 16, 30, 30]):
+        delays = [backoff_delay(attempt, 1.0, 30.0) for _ in range(200)]
+        assert cap / 2 <= min(delays) and max(delays) <= cap
+    print("✅ 退避时间按 1, 2, 4, 8... 秒翻倍（上限30秒），在上限的一半到全部之间随机抖动")
+
+    assert is_retryable(ConnectionError()) and is_retryable(Exception("502 Bad Gateway"))
+    assert is_throttled(Exception("抱歉，您每分钟最多访问该接口200次")) and is_throttled(Exception("Too Many Requests"))
+    assert not is_retryable(ValueError("股票代码不存在"))
+
+    configure_rate_limit('test_api', 6000, burst=10)
+    api = FlakyApi(ConnectionError("Connection aborted"), failures=2, result='ok')
+    assert call_with_retry('test_api', api, 'a', b=1) == 'ok' and len(api.calls) == 3
+    # 第一次等待 0.025-0.05 秒，第二次 0.05-0.1 秒
+    assert api.calls[2] - api.calls[1] >= api.calls[1] - api.calls[0]
+    print("✅ 网络故障重试2次后成功，等待时间逐次翻倍")
+
+    api = FlakyApi(ValueError("股票代码不存在"), failures=5)
+    try:
+        call_with_retry('test_api', api)
+        assert False, "应抛出异常"
+    except ValueError:
+        pass
+    assert len(api.calls) == 1
+    api = FlakyApi(TimeoutError("timed out"), failures=10)
+    try:
+        call_with_retry('test_api', api)
+        assert False, "应抛出异常"
+    except TimeoutError:
+        pass
+    assert len(api.calls) == rate_limiter.MAX_RETRIES + 1
+    print(f"✅ 不可重试的错误直接抛出，重试 {rate_limiter.MAX_RETRIES} 次后抛出最后的错误")
+
+    print()
+
+
+@fast_retries
+def test_throttle_pauses_all_threads():
+    """测试4: 被限流时同一数据源的其他线程一起暂停"""
+    print("=" * 80)
+    print("测试4: 限流暂停")
+    print("=" * 80)
+
+    configure_rate_limit('throttled_api', 6000, burst=10)
+    api = FlakyApi(Exception("Too Many Requests. Rate limited."), failures=1, result='ok')
+    other_calls = []
+
+    def other():
+        time.sleep(0.01)
+        call_with_retry('throttled_api', lambda: other_calls.append(time.monotonic()))
+
+    thread = threading.Thread(target=other)
+    t0 = time.monotonic()
+    thread.start()
+    assert call_with_retry('throttled_api', api) == 'ok'
+    thread.join()
+    # 首次重试暂停 0.025-0.05 秒，其他线程的请求在暂停结束后才发出
+    assert other_calls[0] - api.calls[0] >= 0.025, other_calls[0] - api.calls[0]
+    print(f"✅ 被限流后其他线程等待 {(other_calls[0] - api.calls[0]) * 1000:.0f} ms")
+
+    print()
+
+
+@fast_retries
+def test_data_sources_use_limiter():
+    """测试5: 数据源接口调用经过限流与重试"""
+    print("=" * 80)
+    print("测试5: 数据源接入")
+    print("=" * 80)
+
+    raw = make_ohlcv(n=30, seed=60).reset_index()
+    raw.columns = ['日期', '开盘', '最高', '最低', '收盘', '成交量']
+
+    class FakeAkshare:
+        stock_zh_a_hist = FlakyApi(ConnectionError("RemoteDisconnected"), failures=1, result=raw)
+
+    AKShareDataSource.fetch_data.cache_clear()
+    source = AKShareDataSource()
+    source.ak = FakeAkshare()
+    df = source.fetch_data('600000', d('2020-01-01'), d('2020-02-28'), market='A股')
+    assert len(FakeAkshare.stock_zh_a_hist.calls) == 2 and len(df) == 30
+    assert list(df.columns) == ['open', 'high', 'low', 'close', 'volume']
+    AKShareDataSource.fetch_data.cache_clear()
+    print("✅ AKShare A股接口连接断开后重试成功")
+
+    daily_rows = pd.DataFrame({'trade_date': ['20200103', '20200102'], 'open': [10.0, 9.0], 'high': [11.0, 10.0],
+                               'low': [9.5, 8.5], 'close': [10.5, 9.5], 'vol': [100.0, 200.0]})
+
+    class FakePro:
+        daily = FlakyApi(Exception("抱歉，您每分钟最多访问该接口200次"), failures=1, result=daily_rows)
+        adj_factor = FlakyApi(Exception(), failures=0, result=None)
+
+    TushareDataSource.fetch_data.cache_clear()
+    source = TushareDataSource(token='x')
+    source.ts, source.pro = object(), FakePro()
+    df = source.fetch_data('600000', d('2020-01-01'), d('2020-01-10'), market='A股')
+    assert len(FakePro.daily.calls) == 2 and len(FakePro.adj_factor.calls) == 1
+    assert df['volume'].tolist() == [20000.0, 10000.0]  # 按日期排序，成交量由手转换为股
+    TushareDataSource.fetch_data.cache_clear()
+    print("✅ Tushare 被限流后暂停并重试，daily / adj_factor 各自经过限流器")
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试数据源限流与重试...\n")
+
+    test_token_bucket()
+    test_tushare_points()
+    test_retry_and_backoff()
+    test_throttle_pauses_all_threads()
+    test_data_sources_use_limiter()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
@@ -0,0 +1,181 @@
+"""
+测试SQLite缓存索引
+验证与JSON索引接口一致、JSON迁移、CacheManager集成（离线，使用临时缓存目录）
+"""
+
+import sys
+import json
+import time
+import shutil
+import datetime
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_manager import CacheManager, CacheIndex, SQLiteCacheIndex
+from test_backtest_engine import make_ohlcv
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def make_entry(code: str, start: str = '2024-01-01', end: str = '2024-06-30', interval: str = '1d') -> dict:
+    """构造缓存条目"""
+    return {
+        'file_path': f'cache/data/akshare/a_stock/{code}.parquet',
+        'data_source': 'akshare',
+        'market': 'a_stock',
+        'code': code,
+        'start_date': start,
+        'end_date': end,
+        'interval': interval,
+        'rows': 120,
+        'columns': ['open', 'high', 'low', 'close', 'volume'],
+        'created_at': datetime.datetime.now().isoformat(),
+        'last_accessed': datetime.datetime.now().isoformat(),
+        'access_count': 0,
+        'file_size_kb': 10.5,
+        'checksum': 'md5:unknown',
+        'is_complete': True
+    }
+
+
+def without_access_time(entries: dict) -> dict:
+    """去掉访问时间（两个索引更新时刻不同）"""
+    return {key: {k: v for k, v in entry.items() if k != 'last_accessed'} for key, entry in entries.items()}
+
+
+def test_interface_parity():
+    """测试1: 与JSON索引行为一致"""
+    print("=" * 80)
+    print("测试1: SQLite索引与JSON索引行为一致")
+    print("=" * 80)
+
+    tmp = Path(tempfile.mkdtemp(prefix="index_test_"))
+    try:
+        json_index = CacheIndex(tmp / "cache_index.json")
+        sqlite_index = SQLiteCacheIndex(tmp / "cache_index.db")
+
+        entries = {
+            'k1': make_entry('000001'),
+            'k2': make_entry('000002', interval='1h'),
+            'k3': make_entry('000001', start='2023-01-01', end='2023-12-31')
+        }
+        for index in (json_index, sqlite_index):
+            for key, entry in entries.items():
+                index.add_entry(key, dict(entry))
+            index.update_access('k1')
+            index.update_access('k1')
+            index.remove_entry('k2')
+            index.remove_entry('missing')
+
+        assert sqlite_index.get_entry('k3') == json_index.get_entry('k3')
+        assert not sqlite_index.has_entry('k2') and sqlite_index.get_entry('k2') is None
+        assert sqlite_index.get_entry('k1')['access_count'] == 2
+        assert without_access_time(sqlite_index.get_all_entries()) == without_access_time(json_index.get_all_entries())
+        assert list(sqlite_index.find_entries('akshare', 'a_stock', '000001', '1d')) == ['k3', 'k1']
+        assert set(json_index.find_entries('akshare', 'a_stock', '000001', '1d')) == {'k1', 'k3'}
+
+        stats_sqlite = sqlite_index.get_statistics()
+        stats_json = json_index.get_statistics()
+        assert stats_sqlite == stats_json
+        print(f"✅ 增删改查与统计一致: {stats_sqlite}")
+        sqlite_index.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print()
+
+
+def test_migration_and_manager():
+    """测试2: JSON迁移与CacheManager集成"""
+    print("=" * 80)
+    print("测试2: JSON迁移与CacheManager集成")
+    print("=" * 80)
+
+    cache_root = Path(tempfile.mkdtemp(prefix="cache_test_"))
+    try:
+        config = json.loads((PROJECT_ROOT / "cache" / "config.json").read_text(encoding='utf-8'))
+        (cache_root / "config.json").write_text(json.dumps(config), encoding='utf-8')
+
+        # 先用JSON后端写入缓存
+        json_manager = CacheManager(str(cache_root))
+        df = make_ohlcv(n=300, seed=1)
+        start, end = df.index[0].date(), df.index[-1].date()
+        assert json_manager.save_data(df, 'akshare', 'a_stock', '000001', start, end)
+
+        # 切换到SQLite后端，自动迁移
+        config['cache_settings']['index_backend'] = 'sqlite'
+        (cache_root / "config.json").write_text(json.dumps(config), encoding='utf-8')
+        sqlite_manager = CacheManager(str(cache_root))
+        assert isinstance(sqlite_manager.index, SQLiteCacheIndex)
+        assert sqlite_manager.index.get_all_entries() == json_manager.index.get_all_entries()
+        print("✅ JSON索引已迁移")
+
+        data = sqlite_manager.get_data('akshare', 'a_stock', '000001', start, end)
+        assert data is not None and len(data) == len(df)
+        assert sqlite_manager.get_statistics()['total_entries'] == 1
+        print("✅ SQLite后端缓存命中")
+
+        # 迁移只执行一次：再次打开不会恢复已删除的条目
+        sqlite_manager.clear_all_cache()
+        sqlite_manager.index.close()
+        reopened = CacheManager(str(cache_root))
+        assert reopened.get_statistics()['total_entries'] == 0
+        reopened.index.close()
+        print("✅ 迁移只执行一次")
+    finally:
+        shutil.rmtree(cache_root, ignore_errors=True)
+
+    print()
+
+
+def test_large_index():
+    """测试3: 大量条目时的索引操作耗时"""
+    print("=" * 80)
+    print("测试3: 20000个条目的索引操作")
+    print("=" * 80)
+
+    tmp = Path(tempfile.mkdtemp(prefix="index_test_"))
+    try:
+        index = SQLiteCacheIndex(tmp / "cache_index.db")
+        with index._conn:
+            index._conn.executemany(index._UPSERT_SQL, [
+                index._to_row(f"key_{i}", make_entry(f"{i:06d}")) for i in range(20000)
+            ])
+
+        t0 = time.perf_counter()
+        for i in range(0, 20000, 100):
+            index.update_access(f"key_{i}")
+            index.get_entry(f"key_{i}")
+            index.find_entries('akshare', 'a_stock', f"{i:06d}", '1d')
+        elapsed = (time.perf_counter() - t0) / 200
+
+        index.add_entry('new', make_entry('999999'))
+        index.remove_entry('new')
+        print(f"   每组操作（更新访问+读取+按资产查询）: {elapsed*1000:.3f} ms")
+        assert elapsed < 0.05
+        index.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print()
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始测试SQLite缓存索引...\n")
+
+    test_interface_parity()
+    test_migration_and_manager()
+    test_large_index()
+
+    print("=" * 80)
+    print("✅ 所有测试完成！")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    run_all_tests()
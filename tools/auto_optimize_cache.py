@@ -104,6 +104,9 @@ class CacheAutoOptimizer:
         
         # 遍历所有 parquet 文件
         for file_path in self.data_dir.rglob("*.parquet"):
+            # 分区存储的数据集（数据源/市场/代码/粒度/分区）本身无重叠，跳过
+            if len(file_path.relative_to(self.data_dir).parts) != 3:
+                continue
             info = self._parse_cache_file(file_path)
             if info:
                 # 资产分组键（不包含日期）
@@ -11,6 +11,8 @@ import json
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from cache_manager import decode_price_ticks
+
 
 class CacheMergeTool:
     """缓存合并工具"""
@@ -279,9 +281,9 @@ class CacheMergeTool:
             first_info = plan['first_info']
             second_info = plan['second_info']
             
-            # 读取数据
-            df1 = pd.read_parquet(first_info['full_path'])
-            df2 = pd.read_parquet(second_info['full_path'])
+            # 读取数据（还原紧凑存储的 tick 编码）
+            df1 = decode_price_ticks(pd.read_parquet(first_info['full_path']))
+            df2 = decode_price_ticks(pd.read_parquet(second_info['full_path']))
             
             print(f"   读取缓存A: {len(df1)} 条记录")
             print(f"   读取缓存B: {len(df2)} 条记录")
@@ -0,0 +1,109 @@
+"""
+工具4：缓存增量刷新工具
+对缓存中的每个资产，只获取最新缓存条目结束日期之后的K线并追加（适合每日收盘后定时运行）
+"""
+
+import os
+import sys
+from pathlib import Path
+from datetime import date
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cache_manager import CacheManager
+from cached_data_source import CachedDataSourceWrapper
+from data_source import DataSourceFactory
+
+
+class CacheRefreshTool:
+    """缓存增量刷新工具"""
+
+    def __init__(self, cache_root: str = "cache"):
+        """
+        初始化刷新工具
+
+        Args:
+            cache_root: 缓存根目录
+        """
+        self.cache_manager = CacheManager(cache_root)
+
+    def cached_sources(self) -> List[str]:
+        """缓存中出现的数据源"""
+        return sorted({entry['data_source'] for entry in self.cache_manager.index.get_all_entries().values()})
+
+    def refresh_all(self, sources: Optional[List[str]] = None, end_date: Optional[date] = None,
+                    dry_run: bool = True, **source_kwargs) -> Dict[str, dict]:
+        """
+        增量刷新所有数据源的缓存
+
+        Args:
+            sources: 要刷新的数据源，None 表示缓存中出现的全部数据源
+            end_date: 刷新到的日期，默认今天
+            dry_run: 是否只预览不执行
+            **source_kwargs: 创建数据源的参数（token, points）
+
+        Returns:
+            {数据源: CachedDataSourceWrapper.refresh 的结果}
+        """
+        print("=" * 80)
+        print("🔄 缓存增量刷新工具")
+        print("=" * 80)
+
+        if dry_run:
+            print("\n🔍 预览模式：只列出待刷新的资产，不请求数据")
+            print("   使用 --execute 参数执行实际刷新\n")
+
+        results = {}
+        for source in sources or self.cached_sources():
+            if source == 'tushare' and not source_kwargs.get('token'):
+                print(f"⚠️  跳过 {source}: 未提供 Tushare Token（--token 或环境变量 TUSHARE_TOKEN）")
+                continue
+
+            print(f"\n【{source}】")
+            print("-" * 80)
+            try:
+                data_source = DataSourceFactory.create_data_source(source, **source_kwargs)
+            except Exception as e:
+                print(f"❌ 无法创建数据源 {source}: {e}")
+                continue
+
+            wrapper = CachedDataSourceWrapper(data_source, self.cache_manager)
+            result = wrapper.refresh(end_date=end_date, dry_run=dry_run)
+            results[source] = result
+
+            if dry_run:
+                print(f"待刷新: {len(result['pending'])} 个资产，已是最新: {result['up_to_date']} 个")
+                for code in result['pending'][:20]:
+                    print(f"  - {code}")
+                if len(result['pending']) > 20:
+                    print(f"  ... 等 {len(result['pending'])} 个")
+            else:
+                for code, error in list(result['failed'].items())[:20]:
+                    print(f"  ❌ {code}: {error}")
+
+        print("\n" + "=" * 80)
+        return results
+
+
+def main():
+    """命令行入口"""
+    import sys
+
+    print("\n")
+
+    # 解析参数
+    dry_run = '--execute' not in sys.argv
+    sources = [sys.argv[i + 1] for i, arg in enumerate(sys.argv[:-1]) if arg == '--source']
+    token = os.environ.get('TUSHARE_TOKEN')
+    if '--token' in sys.argv[:-1]:
+        token = sys.argv[sys.argv.index('--token') + 1]
+
+    tool = CacheRefreshTool()
+    tool.refresh_all(sources=sources or None, dry_run=dry_run, token=token)
+
+    print()
+
+
+if __name__ == '__main__':
+    main()